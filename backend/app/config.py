@@ -7,29 +7,103 @@
 # ------------------------------------------------------------------------
 
 from pathlib import Path
+from typing import List, Dict, Union
+from pydantic import model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
 
     BASE_PATH: Path = Path('./backend')
     KUZU_DB_PATH: Path = BASE_PATH / "data" / "kuzu"
+    NUMPY_DB_PATH: Path = BASE_PATH / "data" / "numpy"
+    STORY_DB_PATH: Path = KUZU_DB_PATH / "story.kuzu"
     ASSET_PATH: Path = BASE_PATH / "data" / "assets"
+    EMBEDDING_CACHE_PATH: Path = BASE_PATH / "data" / "cache"
 
     DEVICE: str = "cpu"
 
+    # deployment
+    SERVICES: List[str] = ["story", "asset"] # routers to serve, e.g. ["story"] never loads the image model
+    WARMUP: bool = True # load models/db in the background on startup, rather than on first request
+
+    # vector database
+    DB_TYPE: str = "kuzu" # "kuzu" or "numpy"
+    NUMPY_EXACT_MAX_ROWS: int = 50000 # numpy backend searches exactly up to this many rows
+    NUMPY_INDEX_TYPE: str = "hnsw" # faiss index above that, "hnsw" or "ivf"
+    # compact precisions are meant for FAISS-indexed search: exact search upcasts every row,
+    # ~2x slower than float32 for int8 and ~10x for float16, so lower NUMPY_EXACT_MAX_ROWS with them
+    EMBEDDING_PRECISION: str = "float32" # "float32", or "float16"/"int8" to halve/quarter searched embeddings, DB_TYPE=numpy only
+    RERANK_OVERSAMPLE: int = 4 # float16/int8 searches re-rank k * this many candidates against the float32 rows
+    HNSW_EFS: int = 550 # search-time candidate list size, see app/services/index_tuner.py
+    HNSW_MAX_EFS: int = 4096 # largest efs an asset request may ask for
+    VECTOR_INDEX_PARAMS: Dict[str, Union[int, float]] = {} # construction params, e.g. {"mu": 30, "ml": 60, "efc": 200} (kuzu) or {"M": 32, "efc": 200} (faiss)
+
+    # asset indexing
+    WATCH_ASSETS: bool = False # reindex automatically when ASSET_PATH changes
+    WATCH_INTERVAL: float = 2.0 # seconds between directory scans
+    CAPTION_CONCURRENCY: int = 4 # max in-flight VLM caption requests
+
     # llm settings
     LLM_API: str = "ollama"
+    VALIDATE_STREAM: bool = True # check Dialogic syntax as tokens stream, regenerate invalid output
+    VALIDATION_MAX_RETRIES: int = 2 # regenerations before streaming unchecked output
+    PROMPT_TOKEN_BUDGET: int = 3072 # estimated prompt tokens, history is trimmed to fit
+    LLM_OPTIONS: Dict[str, Union[int, float, str]] = {} # Ollama options for story generation, e.g. {"temperature": 0} or {"seed": 42}
+
+    # story graph
+    STORY_CONTEXT_DEPTH: int = 8 # scenes of history retrieved per generation
+    STORY_CONTEXT_CACHE_SIZE: int = 100000 # scenes whose ancestor context is memoized
+    STORY_MEMORY: bool = False # embed scenes for long-term retrieval, loads the text embedder
+    STORY_MEMORY_K: int = 4 # relevant older scenes retrieved per generation
+    STORY_IMPORTANT_MAX: int = 8 # scenes marked important retrieved per generation
+    STORY_EMBED_BATCH_SIZE: int = 32 # scenes per background embedding pass
+    STORY_EMBED_INTERVAL: float = 0.5 # seconds to wait for a batch to fill
+    STORY_MEMORY_STORIES: int = 64 # stories whose memory index is kept in memory
+
+    # speculative generation
+    SPECULATE: bool = False # pre-generate the next scene for each offered choice while the player reads
+    SPECULATE_CONCURRENCY: int = 1 # speculative generations in flight, only while no player is waiting
+    SPECULATE_MAX_CHOICES: int = 4 # choices speculated per scene
+    SPECULATE_CACHE_SIZE: int = 1024 # finished speculative scenes kept
+
+    # generation store
+    GENERATION_STORE: bool = False # persist generations, replays of the same prompt are served from disk
+    GENERATION_STORE_PATH: Path = EMBEDDING_CACHE_PATH / "generations.sqlite"
+    GENERATION_STORE_SIZE: int = 100000 # generations kept, least recently used are evicted
+
+    # llm scheduling, story and asset requests share one Ollama
+    LLM_SCHEDULER: bool = True # queue requests by priority: interactive > rewrite > speculative > caption
+    LLM_MAX_IN_FLIGHT: int = 4 # requests sent to Ollama at once, match its OLLAMA_NUM_PARALLEL (summed over OLLAMA_URLS)
+    LLM_RESERVED_SLOTS: int = 1 # of those, only interactive requests may use
+    LLM_CLASS_CONCURRENCY: Dict[str, int] = {"rewrite": 2, "speculative": 1, "caption": 2} # in flight per class
+    LLM_CLASS_MAX_QUEUED: Dict[str, int] = {"interactive": 256, "rewrite": 16, "speculative": 8} # waiting per class before new requests are rejected
 
     # ollama settings
     OLLAMA_URL: str = "http://localhost:11434"
     OLLAMA_LLM_MODEL: str = "gemma3"
     OLLAMA_VLM_MODEL: str = "gemma3"
+    OLLAMA_TIMEOUT: float = 120.0 # seconds to wait on a read
+    OLLAMA_CONNECT_TIMEOUT: float = 5.0
+    OLLAMA_MAX_RETRIES: int = 2
+    OLLAMA_MAX_CONNECTIONS: int = 32 # pooled keep-alive connections per worker
+    OLLAMA_URLS: List[str] = [] # several endpoints serving the story model, replaces OLLAMA_URL for story generation
+    OLLAMA_HEALTH_INTERVAL: float = 5.0 # seconds between health checks of OLLAMA_URLS
+    OLLAMA_RETRY_AFTER: float = 5.0 # seconds a failed endpoint is skipped
+    OLLAMA_AFFINITY_SLACK: int = 2 # extra requests outstanding a story's endpoint may have before it moves
+    OLLAMA_SESSIONS: int = 4096 # stories whose endpoint is remembered
 
     # embedding models
     IMAGE_TEXT_MODEL_ID: str = "google/siglip2-so400m-patch16-naflex"
     IMAGE_TEXT_DIM: int = 1152 # siglip2-large-patch16-256
     AUDIO_TEXT_MODEL_ID: str = ""
     AUDIO_TEXT_DIM: int = 0
+    IMAGE_EMBED_BATCH_SIZE: int = 16 # images per forward pass when indexing
+    QUERY_ENCODER: str = "full" # "full" reuses the image-text model, "text" loads only its text tower
+    QUERY_ENCODER_QUANTIZE: Union[str, None] = None # "int8" dynamic quantization, "text" encoder only
+    QUERY_EMBEDDING_CACHE_SIZE: int = 4096 # cached query embeddings
+    SEARCH_CACHE_SIZE: int = 4096 # cached search results, cleared on reindex
+    REWRITE_CACHE_SIZE: int = 4096 # cached VLM rewrites of scene lines into asset queries
+    REWRITE_DEADLINE: float = 0.5 # seconds to wait on a rewrite before serving raw-query results
 
     # override defaults if .env provided
     model_config = SettingsConfigDict(
@@ -38,6 +112,13 @@ class Settings(BaseSettings):
             extra="ignore"
         )
 
+    @model_validator(mode="after")
+    def _check_precision(self):
+        # kuzu's vector index only takes FLOAT/DOUBLE columns
+        if self.DB_TYPE == "kuzu" and self.EMBEDDING_PRECISION != "float32":
+            raise ValueError(f"EMBEDDING_PRECISION={self.EMBEDDING_PRECISION} needs DB_TYPE=numpy, kuzu only stores float32 embeddings")
+        return self
+
     def _ensure_dirs(self):
         self.KUZU_DB_PATH.mkdir(exist_ok=True)
         self.ASSET_PATH.mkdir(exist_ok=True)
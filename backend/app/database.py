@@ -10,11 +10,25 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
 
+import re
+import json
+import hashlib
+import shutil
+import sqlite3
+import threading
 from pathlib import Path
+from typing import Union
 import kuzu
+import numpy as np
+import pyarrow as pa
 from app.config import settings
 from abc import ABC, abstractmethod
 
+try:
+    import faiss
+except ImportError: # optional, only needed for hnsw/ivf indexes in NumpyDB
+    faiss = None
+
 # kuzu is discontinued, so defining interface to allow for easy switching in case
 # of a different vector database
 class DB(ABC):
@@ -28,6 +42,108 @@ class DB(ABC):
         """
         pass
 
+    @abstractmethod
+    def bulk_insert(self, table_name: str, rows: list):
+        """
+        Insert many rows into a table in as few operations as possible.
+        """
+        pass
+
+    @abstractmethod
+    def count(self, table_name: str):
+        """
+        Return the number of rows in a table.
+        """
+        pass
+
+    @abstractmethod
+    def get_column(self, table_name: str, column: str):
+        """
+        Return all values of a column.
+        """
+        pass
+
+    @abstractmethod
+    def get_rows(self, table_name: str, columns: list):
+        """
+        Return all rows of a table as dicts of the given columns.
+        """
+        pass
+
+    @abstractmethod
+    def delete_rows(self, table_name: str, key_column: str, keys: list):
+        """
+        Delete rows whose key_column value is in keys.
+        """
+        pass
+
+    @abstractmethod
+    def update_rows(self, table_name: str, key_column: str, rows: list):
+        """
+        Update rows in place. Each row dict holds the current key under "key"
+        and the new values for any other columns.
+        """
+        pass
+
+    @abstractmethod
+    def create_vector_index(self, table_name: str, index_name: str, column: str, metric: str = "cosine", **params):
+        """
+        Build a vector index over an embedding column, with backend-specific
+        construction params (see VECTOR_INDEX_PARAMS).
+        """
+        pass
+
+    @abstractmethod
+    def drop_vector_index(self, table_name: str, index_name: str):
+        """
+        Drop a vector index, if it exists.
+        """
+        pass
+
+    @abstractmethod
+    def query_vector_index(self, table_name: str, index_name: str, embedding: list, k: int, columns: list, efs: int = 200, filters: Union[dict, None] = None):
+        """
+        Return the k nearest rows to embedding as dicts of the given columns
+        plus "distance", ordered by distance.
+
+        filters maps columns to required values. They're applied during the
+        search, so k matching rows come back even when most rows don't match.
+        """
+        pass
+
+    def query_vector_index_batch(self, table_name: str, index_name: str, embeddings: list, k: int, columns: list, efs: int = 200, filters: Union[list, None] = None):
+        """
+        Run query_vector_index for each embedding (with the matching entry of
+        filters), returning one result list per embedding. Backends override
+        this when they can search several queries at once.
+        """
+        filters = filters or [None] * len(embeddings)
+        return [
+            self.query_vector_index(table_name, index_name, embedding, k, columns, efs=efs, filters=query_filters)
+            for embedding, query_filters in zip(embeddings, filters)
+        ]
+
+    @abstractmethod
+    def get_checkpoint(self, name: str):
+        """
+        Return the stored checkpoint dict for a long-running job, or None.
+        """
+        pass
+
+    @abstractmethod
+    def set_checkpoint(self, name: str, status: str, n_done: int):
+        """
+        Persist progress of a long-running job so it can be resumed.
+        """
+        pass
+
+    def flush(self):
+        """
+        Persist indexes kept in memory between writes, e.g. after a bulk
+        load. No-op for backends that write through.
+        """
+        pass
+
 class KuzuDB(DB):
     """
     Kuzu Database Connection Manager
@@ -44,16 +160,28 @@ class KuzuDB(DB):
     #     return cls._instance
 
     def __init__(self, db_path: Path = settings.KUZU_DB_PATH / "vdb.kuzu"):
+        self.db_path = db_path
         self.db = kuzu.Database(db_path)
         self.conn = kuzu.Connection(self.db)
+        self._projected_graphs = set()
 
         # install vectordb extension
         self.conn.execute("INSTALL vector; LOAD vector;")
 
+        self.create_schema({
+            "table_name": "Checkpoint",
+            "name": "STRING PRIMARY KEY",
+            "status": "STRING",
+            "n_done": "INT64"
+        })
+
     def create_schema(self, schema: dict):
         """
         Create schema for the database.
         """
+        for column_type in schema.values():
+            if re.fullmatch(r"(FLOAT16|INT8)\[\d+\]", column_type):
+                raise NotImplementedError("kuzu vector indexes only support FLOAT/DOUBLE columns, use DB_TYPE=numpy for float16/int8 embeddings")
 
         columns = ""
         for column in schema:
@@ -67,16 +195,806 @@ class KuzuDB(DB):
         # print(q)
         self.conn.execute(q)
 
+    def bulk_insert(self, table_name: str, rows: list, chunk_size: int = 10000):
+        """
+        Insert rows with COPY FROM an in-memory Arrow table, rather than one
+        CREATE per row.
+
+        Args:
+            table_name: Node table to insert into
+            rows: List of dicts sharing the same keys (column names)
+            chunk_size: Max rows per COPY, bounds the size of the Arrow table
+        """
+        if not rows:
+            return
+        columns = list(rows[0].keys())
+        for i in range(0, len(rows), chunk_size):
+            table = _to_arrow(rows[i:i + chunk_size], columns)
+            self.conn.execute(
+                f"COPY {table_name}({', '.join(columns)}) FROM $rows",
+                {"rows": table}
+            )
+
+    def count(self, table_name: str):
+        response = self.conn.execute(f"MATCH (n:{table_name}) RETURN COUNT(*)")
+        return response.get_next()[0]
+
+    def get_column(self, table_name: str, column: str):
+        response = self.conn.execute(f"MATCH (n:{table_name}) RETURN n.{column}")
+        return [row[0] for row in response]
+
+    def get_rows(self, table_name: str, columns: list):
+        response = self.conn.execute(
+            f"MATCH (n:{table_name}) RETURN {', '.join(f'n.{column} AS {column}' for column in columns)}"
+        )
+        return list(response.rows_as_dict())
+
+    def delete_rows(self, table_name: str, key_column: str, keys: list):
+        if not keys:
+            return
+        self.conn.execute(
+            f"MATCH (n:{table_name}) WHERE n.{key_column} IN $keys DELETE n",
+            {"keys": list(keys)}
+        )
+
+    def update_rows(self, table_name: str, key_column: str, rows: list):
+        """
+        Vector indexes are kept in sync by kuzu, so they don't need rebuilding.
+        """
+        if not rows:
+            return
+        columns = [column for column in rows[0] if column != "key"]
+        assignments = ", ".join(f"n.{column} = row.{column}" for column in columns)
+        self.conn.execute(
+            f"""
+            UNWIND $rows AS row
+            MATCH (n:{table_name}) WHERE n.{key_column} = row.key
+            SET {assignments}
+            """,
+            {"rows": rows}
+        )
+
+    def create_vector_index(self, table_name: str, index_name: str, column: str, metric: str = "cosine", **params):
+        """
+        Args:
+            params: HNSW construction parameters, i.e. mu/ml (max degree of
+                the upper/lower layer), pu, efc and alpha
+        """
+        options = "".join(f", {name} := {value}" for name, value in params.items())
+        self.conn.execute(
+            f"""
+            CALL CREATE_VECTOR_INDEX(
+                '{table_name}',
+                '{index_name}',
+                '{column}',
+                metric := '{metric}'{options}
+            );
+            """
+        )
+
+    def drop_vector_index(self, table_name: str, index_name: str):
+        """
+        Kuzu (as of 0.11) leaves a dropped index's internal tables in the open
+        catalog, so creating another index on the table fails until the
+        database is reopened. The dropped name can't be reused either way.
+        """
+        indexes = self.conn.execute("CALL SHOW_INDEXES() RETURN table_name, index_name").get_all()
+        if [table_name, index_name] in indexes:
+            self.conn.execute(f"CALL DROP_VECTOR_INDEX('{table_name}', '{index_name}')")
+            self._reopen()
+
+    def _reopen(self):
+        self.conn.close()
+        self.db.close()
+        self.db = kuzu.Database(self.db_path)
+        self.conn = kuzu.Connection(self.db)
+        self.conn.execute("LOAD vector;")
+        self._projected_graphs.clear()
+
+    def query_vector_index(self, table_name: str, index_name: str, embedding: list, k: int, columns: list, efs: int = 200, filters: Union[dict, None] = None):
+        """
+        Filters run as a filtered HNSW search over a projected graph.
+        """
+        return self.query_vector_index_batch(table_name, index_name, [embedding], k, columns, efs=efs, filters=[filters])[0]
+
+    def query_vector_index_batch(self, table_name: str, index_name: str, embeddings: list, k: int, columns: list, efs: int = 200, filters: Union[list, None] = None):
+        """
+        Kuzu has no multi-query vector search, so queries run back to back
+        on one connection.
+        """
+        filters = filters or [None] * len(embeddings)
+        res = []
+        for embedding, query_filters in zip(embeddings, filters):
+            graph_name = self._projected_graph(table_name, query_filters) if query_filters else table_name
+            response = self.conn.execute(
+                f"""
+                CALL QUERY_VECTOR_INDEX(
+                    '{graph_name}',
+                    '{index_name}',
+                    $embedding,
+                    $k,
+                    efs:=$efs
+                )
+                RETURN {', '.join(f'node.{column} AS {column}' for column in columns)}, distance
+                ORDER BY distance;
+                """,
+                {"embedding": list(embedding), "k": k, "efs": efs}
+            )
+            res.append(list(response.rows_as_dict()))
+        return res
+
+    def _projected_graph(self, table_name: str, filters: dict):
+        """
+        Return the name of a projected graph of the rows matching filters,
+        creating it on first use. Projected graphs are evaluated lazily, so
+        later inserts and updates are picked up.
+        """
+        predicate = " AND ".join(f'n.{column} = {_cypher_literal(value)}' for column, value in sorted(filters.items()))
+        graph_name = f"{table_name}_{hashlib.sha1(predicate.encode('utf-8')).hexdigest()[:12]}"
+        if graph_name not in self._projected_graphs:
+            self.conn.execute(f"CALL PROJECT_GRAPH('{graph_name}', {{'{table_name}': '{_escape(predicate)}'}}, [])")
+            self._projected_graphs.add(graph_name)
+        return graph_name
+
+    def get_checkpoint(self, name: str):
+        response = self.conn.execute(
+            "MATCH (c:Checkpoint {name: $name}) RETURN c.status, c.n_done",
+            {"name": name}
+        )
+        if not response.has_next():
+            return None
+        status, n_done = response.get_next()
+        return {"status": status, "n_done": n_done}
+
+    def set_checkpoint(self, name: str, status: str, n_done: int):
+        self.conn.execute(
+            """
+            MERGE (c:Checkpoint {name: $name})
+            SET c.status = $status, c.n_done = $n_done
+            """,
+            {"name": name, "status": status, "n_done": n_done}
+        )
+
+# vector column type -> storage precision (DOUBLE is stored as float32 too)
+VECTOR_PRECISIONS = {
+    "DOUBLE": "float32",
+    "FLOAT": "float32",
+    "FLOAT16": "float16",
+    "INT8": "int8"
+}
+
+class NumpyDB(DB):
+    """
+    In-process vector database, for when kuzu is unavailable or overkill.
+
+    - embeddings live in memory-mapped float32 matrices, one file per column
+    - all other columns live in a sqlite sidecar, with a _row column pointing
+      at the embedding's row in the matrix
+    - vector indexes are exact (one matrix-vector product) for small tables,
+      or FAISS HNSW/IVF for large ones, if faiss is installed. Inserts update
+      FAISS indexes in memory, flush() writes them to disk
+    - FLOAT16[n]/INT8[n] columns are searched in compact form, candidates are
+      re-ranked against a float32 copy on disk (see _VectorColumn)
+
+    Deleted rows leave a hole in the matrix, which is masked out of searches.
+    """
+    def __init__(self, db_path: Path = settings.NUMPY_DB_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(self.db_path / "meta.sqlite", check_same_thread=False)
+
+        self._schema_path = self.db_path / "schema.json"
+        self._schema = {}
+        if self._schema_path.exists():
+            with open(self._schema_path, 'r') as f:
+                self._schema = json.load(f)
+
+        # per-table matrices and validity masks, per-index faiss objects,
+        # and the rows matching each filter (cleared when a table changes)
+        self._vectors = {}
+        self._valid = {}
+        self._faiss = {}
+        self._dirty = set() # faiss indexes with inserts not yet written
+        self._filtered = {}
+        for table_name in self._schema:
+            self._open_table(table_name)
+
+        self.create_schema({
+            "table_name": "Checkpoint",
+            "name": "STRING PRIMARY KEY",
+            "status": "STRING",
+            "n_done": "INT64"
+        })
+
+    def create_schema(self, schema: dict):
+        """
+        Create schema for the database. Columns typed FLOAT[n]/DOUBLE[n] are
+        stored as float32 matrices, FLOAT16[n]/INT8[n] also as float16/int8
+        ones (see _VectorColumn), everything else goes to sqlite.
+        """
+        table_name = schema["table_name"]
+        with self._lock:
+            if table_name in self._schema:
+                return
+            columns, vectors = {}, {}
+            for column, column_type in schema.items():
+                if column == "table_name":
+                    continue
+                match = re.fullmatch(r"(FLOAT|DOUBLE|FLOAT16|INT8)\[(\d+)\]", column_type)
+                if match:
+                    vectors[column] = {"dim": int(match.group(2)), "precision": VECTOR_PRECISIONS[match.group(1)]}
+                else:
+                    columns[column] = column_type
+
+            sql_columns = ", ".join(f"{column} {_sqlite_type(column_type)}" for column, column_type in columns.items())
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name}({sql_columns}, _row INTEGER)")
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table_name}__row ON {table_name}(_row)")
+            self.conn.commit()
+
+            self._schema[table_name] = {"columns": columns, "vectors": vectors, "indexes": {}, "n_rows": 0}
+            self._save_schema()
+            self._open_table(table_name)
+
+    def bulk_insert(self, table_name: str, rows: list):
+        """
+        Append vectors to the table's matrices, then the other columns to
+        sqlite in one executemany, then to any FAISS indexes (in memory,
+        until flush()).
+        """
+        if not rows:
+            return
+        with self._lock:
+            table = self._schema[table_name]
+            start = self._n_rows(table_name)
+            rows_index = np.arange(start, start + len(rows))
+            for column in table["vectors"]:
+                matrix = np.asarray([row[column] for row in rows], dtype=np.float32)
+                self._vectors[table_name][column].append(matrix)
+
+            columns = [column for column in rows[0] if column in table["columns"]]
+            self.conn.executemany(
+                f"INSERT INTO {table_name}({', '.join(columns + ['_row'])}) VALUES ({', '.join('?' * (len(columns) + 1))})",
+                [[row[column] for column in columns] + [int(i)] for row, i in zip(rows, rows_index)]
+            )
+            self.conn.commit()
+
+            self._valid[table_name] = np.concatenate([self._valid[table_name][:start], np.ones(len(rows), dtype=bool)])
+            self._filtered.pop(table_name, None)
+            table["n_rows"] = start + len(rows)
+            self._save_schema()
+            for index_name, index in table["indexes"].items():
+                if (table_name, index_name) in self._faiss:
+                    vectors = self._vectors[table_name][index["column"]].dequantized(slice(start, start + len(rows)))
+                    self._faiss_add(table_name, index_name, vectors, rows_index)
+
+    def count(self, table_name: str):
+        with self._lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+
+    def get_column(self, table_name: str, column: str):
+        return [row[column] for row in self.get_rows(table_name, [column])]
+
+    def get_rows(self, table_name: str, columns: list):
+        with self._lock:
+            table = self._schema[table_name]
+            sql_columns = [column for column in columns if column in table["columns"]]
+            cursor = self.conn.execute(f"SELECT {', '.join(sql_columns + ['_row'])} FROM {table_name} ORDER BY _row")
+            rows = []
+            for values in cursor:
+                row = dict(zip(sql_columns, values[:-1]))
+                for column in columns:
+                    if column in table["vectors"]:
+                        row[column] = self._vectors[table_name][column].vectors(values[-1]).tolist()
+                rows.append({column: row[column] for column in columns})
+            return rows
+
+    def delete_rows(self, table_name: str, key_column: str, keys: list):
+        if not keys:
+            return
+        with self._lock:
+            placeholders = ", ".join("?" * len(keys))
+            deleted = self.conn.execute(f"SELECT _row FROM {table_name} WHERE {key_column} IN ({placeholders})", list(keys)).fetchall()
+            self.conn.execute(f"DELETE FROM {table_name} WHERE {key_column} IN ({placeholders})", list(keys))
+            self.conn.commit()
+            self._valid[table_name][[row[0] for row in deleted]] = False
+            self._filtered.pop(table_name, None)
+
+    def update_rows(self, table_name: str, key_column: str, rows: list):
+        if not rows:
+            return
+        with self._lock:
+            columns = [column for column in rows[0] if column != "key"]
+            if any(column in self._schema[table_name]["vectors"] for column in columns):
+                raise NotImplementedError("Updating vector columns in place is not supported, delete and re-insert instead")
+            self.conn.executemany(
+                f"UPDATE {table_name} SET {', '.join(f'{column} = ?' for column in columns)} WHERE {key_column} = ?",
+                [[row[column] for column in columns] + [row["key"]] for row in rows]
+            )
+            self.conn.commit()
+            self._filtered.pop(table_name, None)
+
+    def create_vector_index(self, table_name: str, index_name: str, column: str, metric: str = "cosine", index_type: Union[str, None] = None, **params):
+        """
+        Args:
+            index_type: "exact", "hnsw" or "ivf". Defaults to exact below
+                NUMPY_EXACT_MAX_ROWS rows (or without faiss), else NUMPY_INDEX_TYPE
+            params: FAISS construction parameters, i.e. M/efc for HNSW, nlist for IVF
+        """
+        if metric != "cosine":
+            raise NotImplementedError(f"Unsupported metric: {metric}")
+        with self._lock:
+            if index_type is None:
+                use_faiss = faiss is not None and self.count(table_name) > settings.NUMPY_EXACT_MAX_ROWS
+                index_type = settings.NUMPY_INDEX_TYPE if use_faiss else "exact"
+            self._schema[table_name]["indexes"][index_name] = {
+                "column": column, "metric": metric, "type": index_type, "params": params
+            }
+            self._save_schema()
+            if index_type != "exact":
+                self._build_faiss(table_name, index_name)
+
+    def drop_vector_index(self, table_name: str, index_name: str):
+        with self._lock:
+            if self._schema[table_name]["indexes"].pop(index_name, None) is None:
+                return
+            self._save_schema()
+            self._faiss.pop((table_name, index_name), None)
+            self._dirty.discard((table_name, index_name))
+            self._faiss_path(table_name, index_name).unlink(missing_ok=True)
+
+    def query_vector_index(self, table_name: str, index_name: str, embedding: list, k: int, columns: list, efs: int = 200, filters: Union[dict, None] = None):
+        """
+        Cosine distance (1 - cosine similarity), matching kuzu's metric.
+
+        Searches over compact (float16/int8) columns, exact or FAISS, fetch
+        k * RERANK_OVERSAMPLE candidates and re-rank them against the
+        float32 rows. With filters,
+        exact search only scans the matching rows, and FAISS restricts its
+        search to their ids.
+        """
+        return self.query_vector_index_batch(table_name, index_name, [embedding], k, columns, efs=efs, filters=[filters])[0]
+
+    def query_vector_index_batch(self, table_name: str, index_name: str, embeddings: list, k: int, columns: list, efs: int = 200, filters: Union[list, None] = None):
+        """
+        Queries sharing the same filters are searched together: one
+        matrix-matrix product for exact search, one multi-query search call
+        for FAISS.
+        """
+        filters = filters or [None] * len(embeddings)
+        with self._lock:
+            index = self._schema[table_name]["indexes"][index_name]
+            column = self._vectors[table_name][index["column"]]
+            queries = _normalized(np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1))
+            valid = self._valid[table_name]
+            # compact and scalar-quantized scores are coarser than the float32 rows
+            rerank = column.compact is not None
+            n_candidates = k * settings.RERANK_OVERSAMPLE if rerank else k
+
+            groups = {}
+            for i, query_filters in enumerate(filters):
+                groups.setdefault(tuple(sorted(query_filters.items())) if query_filters else None, []).append(i)
+
+            hits = [None] * len(embeddings)
+            for key, group in groups.items():
+                rows = self._filtered_rows(table_name, dict(key)) if key else None
+                if index["type"] == "exact":
+                    if rows is None:
+                        scores = column.scores(queries[group], slice(0, len(valid)))
+                        scores[:, ~valid] = -np.inf
+                        rows, n_live = np.arange(len(valid)), int(valid.sum())
+                    else:
+                        scores = column.scores(queries[group], rows)
+                        n_live = len(rows)
+                    n_group = min(n_candidates, n_live)
+                    top = np.argpartition(-scores, n_group - 1, axis=1)[:, :n_group] if n_group > 0 else np.empty((len(group), 0), dtype=int)
+                    for i, query_top, query_scores in zip(group, top, scores):
+                        hits[i] = list(zip(rows[query_top].tolist(), query_scores[query_top].tolist()))
+                else:
+                    for i, query_hits in zip(group, self._faiss_search(table_name, index_name, queries[group], n_candidates, efs, rows=rows)):
+                        hits[i] = query_hits
+
+            res = []
+            for query, query_hits in zip(queries, hits):
+                if rerank:
+                    query_hits = column.rerank([row for row, _ in query_hits], query)
+                query_hits = sorted(query_hits, key=lambda hit: -hit[1])[:k]
+                res.append(self._fetch_hits(table_name, query_hits, columns))
+            return res
+
+    def get_checkpoint(self, name: str):
+        with self._lock:
+            row = self.conn.execute("SELECT status, n_done FROM Checkpoint WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return {"status": row[0], "n_done": row[1]}
+
+    def set_checkpoint(self, name: str, status: str, n_done: int):
+        with self._lock:
+            self.conn.execute(
+                """
+                INSERT INTO Checkpoint(name, status, n_done) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET status = excluded.status, n_done = excluded.n_done
+                """,
+                (name, status, n_done)
+            )
+            self.conn.commit()
+
+    def _fetch_hits(self, table_name: str, hits: list, columns: list):
+        """
+        Join (row, cosine similarity) hits with the requested columns.
+        """
+        if not hits:
+            return []
+        table = self._schema[table_name]
+        sql_columns = [column for column in columns if column in table["columns"]]
+        rows_index = [row for row, _ in hits]
+        cursor = self.conn.execute(
+            f"SELECT {', '.join(sql_columns + ['_row'])} FROM {table_name} WHERE _row IN ({', '.join('?' * len(rows_index))})",
+            rows_index
+        )
+        by_row = {values[-1]: dict(zip(sql_columns, values[:-1])) for values in cursor}
+        res = []
+        for row, score in hits:
+            values = by_row[row]
+            for column in columns:
+                if column in table["vectors"]:
+                    values[column] = self._vectors[table_name][column].vectors(row).tolist()
+            res.append({**{column: values[column] for column in columns}, "distance": 1.0 - score})
+        return res
+
+    def _filtered_rows(self, table_name: str, filters: dict):
+        """
+        Return the sorted matrix rows of live rows matching filters. Filter
+        columns get a sqlite index, so this is a partition lookup rather than
+        a table scan.
+        """
+        key = tuple(sorted(filters.items()))
+        cached = self._filtered.setdefault(table_name, {})
+        if key not in cached:
+            for column, _ in key:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table_name}_{column} ON {table_name}({column})")
+            cursor = self.conn.execute(
+                f"SELECT _row FROM {table_name} WHERE {' AND '.join(f'{column} = ?' for column, _ in key)} ORDER BY _row",
+                [value for _, value in key]
+            )
+            cached[key] = np.fromiter((row[0] for row in cursor), dtype=np.int64)
+        return cached[key]
+
+    def _n_rows(self, table_name: str):
+        """
+        Number of matrix rows in use, including deleted ones.
+        """
+        return len(self._valid[table_name])
+
+    def _open_table(self, table_name: str):
+        """
+        Memory-map a table's vectors and rebuild its validity mask from sqlite.
+        """
+        table = self._schema[table_name]
+        live = [row[0] for row in self.conn.execute(f"SELECT _row FROM {table_name} WHERE _row IS NOT NULL")]
+        n_rows = table["n_rows"]
+        valid = np.zeros(n_rows, dtype=bool)
+        valid[live] = True
+        self._valid[table_name] = valid
+        self._vectors[table_name] = {
+            column: _VectorColumn(self.db_path / f"{table_name}.{column}", vector["dim"], vector["precision"], n_rows)
+            for column, vector in table["vectors"].items()
+        }
+        for index_name, index in table["indexes"].items():
+            if index["type"] != "exact":
+                self._load_faiss(table_name, index_name)
+
+    def _save_schema(self):
+        tmp_path = self._schema_path.with_suffix(".json.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self._schema, f)
+        os.replace(tmp_path, self._schema_path)
+
+    def _faiss_path(self, table_name: str, index_name: str):
+        return self.db_path / f"{table_name}.{index_name}.faiss"
+
+    def _build_faiss(self, table_name: str, index_name: str):
+        if faiss is None:
+            raise ImportError("faiss is required for hnsw/ivf indexes, pip install faiss-cpu")
+        index = self._schema[table_name]["indexes"][index_name]
+        column = self._vectors[table_name][index["column"]]
+        valid_rows = np.flatnonzero(self._valid[table_name])
+        vectors = _normalized(column.dequantized(valid_rows))
+        params = index["params"]
+        dim = column.dim
+
+        # compact columns get a scalar-quantized index of the same precision
+        quantizer = {"float16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}.get(column.precision)
+        if index["type"] == "hnsw":
+            if quantizer is None:
+                base = faiss.IndexHNSWFlat(dim, params.get("M", 32), faiss.METRIC_INNER_PRODUCT)
+            else:
+                base = faiss.IndexHNSWSQ(dim, quantizer, params.get("M", 32), faiss.METRIC_INNER_PRODUCT)
+            base.hnsw.efConstruction = params.get("efc", 200)
+        elif index["type"] == "ivf":
+            nlist = params.get("nlist", max(1, int(np.sqrt(len(valid_rows)))))
+            if quantizer is None:
+                base = faiss.IndexIVFFlat(faiss.IndexFlatIP(dim), dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            else:
+                base = faiss.IndexIVFScalarQuantizer(faiss.IndexFlatIP(dim), dim, nlist, quantizer, faiss.METRIC_INNER_PRODUCT)
+        else:
+            raise NotImplementedError(f"Unknown index type: {index['type']}")
+        if not base.is_trained:
+            base.train(vectors)
+
+        self._faiss[(table_name, index_name)] = faiss.IndexIDMap2(base)
+        self._faiss_add(table_name, index_name, vectors, valid_rows)
+        self._save_faiss(table_name, index_name)
+
+    def _faiss_add(self, table_name: str, index_name: str, vectors, rows_index):
+        index = self._faiss[(table_name, index_name)]
+        index.add_with_ids(_normalized(vectors), np.asarray(rows_index, dtype=np.int64))
+        self._dirty.add((table_name, index_name))
+
+    def flush(self):
+        """
+        Write FAISS indexes changed since they were last written. Each write
+        is the whole index, so it's done once per load rather than per batch.
+        """
+        with self._lock:
+            for table_name, index_name in list(self._dirty):
+                self._save_faiss(table_name, index_name)
+
+    def _save_faiss(self, table_name: str, index_name: str):
+        faiss.write_index(self._faiss[(table_name, index_name)], str(self._faiss_path(table_name, index_name)))
+        # rows the file covers, so a load after a crash adds the rest
+        self._schema[table_name]["indexes"][index_name]["n_rows"] = self._n_rows(table_name)
+        self._save_schema()
+        self._dirty.discard((table_name, index_name))
+
+    def _load_faiss(self, table_name: str, index_name: str):
+        path = self._faiss_path(table_name, index_name)
+        if faiss is None or not path.exists():
+            self._build_faiss(table_name, index_name)
+            return
+        self._faiss[(table_name, index_name)] = faiss.read_index(str(path))
+        index = self._schema[table_name]["indexes"][index_name]
+        start = index.get("n_rows", self._n_rows(table_name))
+        missing = start + np.flatnonzero(self._valid[table_name][start:])
+        if len(missing):
+            self._faiss_add(table_name, index_name, self._vectors[table_name][index["column"]].dequantized(missing), missing)
+
+    def _faiss_search(self, table_name: str, index_name: str, queries, k: int, efs: int, rows=None):
+        """
+        Return a list of (row, similarity) hits per query.
+
+        Deleted rows can't be removed from an HNSW graph, so oversample by the
+        number of deleted rows and filter them out. If rows is given, only
+        those ids are searched (and none of them are deleted).
+        """
+        index = self._faiss[(table_name, index_name)]
+        valid = self._valid[table_name]
+        n_deleted = len(valid) - int(valid.sum()) if rows is None else 0
+        selector = faiss.IDSelectorBatch(rows) if rows is not None else None
+        base = faiss.downcast_index(index.index)
+        if isinstance(base, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(efSearch=max(efs, k + n_deleted), sel=selector)
+        else:
+            params = faiss.SearchParametersIVF(nprobe=max(1, min(base.nlist, efs // 10)), sel=selector)
+        scores, ids = index.search(queries, k + n_deleted, params=params)
+        return [
+            [(int(row), float(score)) for row, score in zip(query_ids, query_scores) if row >= 0 and valid[row]][:k]
+            for query_ids, query_scores in zip(ids, scores)
+        ]
+
+class _VectorColumn:
+    """
+    A vector column's rows: float32, or for float16/int8 columns, compact
+    rows that searches scan, taking 1/2 or 1/4 of the memory, plus the
+    float32 rows in a second file, read only for the candidates a search
+    re-ranks and the vectors it returns.
+
+    Compact rows are stored with float32 factors, so that
+    factor * (query @ compact row) is the row's cosine similarity:
+    - float16: factor = 1 / norm
+    - int8: each row is scaled to [-127, 127], factor = scale / norm, and
+      the scale is kept to dequantize the row
+
+    Compact scores carry the precision's rounding error (~1e-3 relative for
+    float16, ~scale / 2 per value for int8), so searches fetch
+    k * RERANK_OVERSAMPLE candidates and re-rank them with the float32 rows.
+    On disk, a compact column takes the float32 rows plus 1/2 or 1/4 of
+    that. Exact search upcasts the compact rows chunk by chunk, slower than
+    scanning float32 (numpy has no fast float16 conversion): compact
+    columns are meant for FAISS-indexed search (NUMPY_INDEX_TYPE).
+    """
+    def __init__(self, path: Path, dim: int, precision: str, n_rows: int):
+        self.dim = dim
+        self.precision = precision
+        self.compact = None
+        self.factors = None
+        # norms of the float32 rows would read all of them, compact columns keep theirs in factors
+        self.full = _MemmapMatrix(Path(f"{path}.f32"), dim, n_rows, track_norms=precision == "float32")
+        if precision != "float32":
+            dtype = {"float16": np.float16, "int8": np.int8}[precision]
+            self.compact = _MemmapMatrix(Path(f"{path}.{precision}"), dim, n_rows, dtype=dtype)
+            self.factors = _MemmapMatrix(Path(f"{path}.factors.f32"), 2 if precision == "int8" else 1, n_rows)
+
+    @property
+    def nbytes(self):
+        """
+        Bytes scanned by an exact search.
+        """
+        if self.compact is None:
+            return self.full.matrix.nbytes
+        return self.compact.matrix.nbytes + self.factors.matrix.nbytes
+
+    def append(self, vectors):
+        self.full.append(vectors)
+        if self.compact is None:
+            return
+        norms = np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+        if self.precision == "int8":
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+            self.compact.append(np.round(vectors / scales[:, None]).astype(np.int8))
+            self.factors.append(np.stack([scales / norms, scales], axis=1))
+        else:
+            self.compact.append(vectors.astype(np.float16))
+            self.factors.append((1 / norms)[:, None])
+
+    def vectors(self, rows):
+        """
+        float32 rows (an index, index array or slice), as inserted.
+        """
+        return self.full.matrix[rows]
+
+    def dequantized(self, rows):
+        """
+        float32 rows dequantized from the compact rows, so that building a
+        FAISS index doesn't read all of the float32 rows.
+        """
+        if self.compact is None:
+            return self.full.matrix[rows]
+        vectors = self.compact.matrix[rows].astype(np.float32)
+        if self.precision == "int8":
+            vectors *= self.factors.matrix[rows, 1:]
+        return vectors
+
+    def scores(self, queries, rows, chunk_size: int = 512):
+        """
+        (n_queries, n_rows) cosine similarities of normalized queries with
+        the given rows (a sorted index array, or a slice to scan a range
+        without copying it), approximate for compact columns.
+        """
+        if self.compact is None:
+            return queries @ self.full.matrix[rows].T / np.maximum(self.full.norms[rows], 1e-12)
+        # upcast in cache-sized chunks, rather than materializing a float32 copy of the matrix
+        factors = self.factors.matrix[rows, 0]
+        scores = np.empty((len(queries), len(factors)), dtype=np.float32)
+        for start in range(0, len(factors), chunk_size):
+            if isinstance(rows, slice):
+                chunk = slice(rows.start + start, rows.start + min(start + chunk_size, len(factors)))
+            else:
+                chunk = rows[start:start + chunk_size]
+            scores[:, start:start + chunk_size] = queries @ self.compact.matrix[chunk].astype(np.float32).T
+        return scores * factors
+
+    def rerank(self, rows: list, query):
+        """
+        Return (row, cosine similarity with the float32 row) for candidate rows.
+        """
+        if not rows:
+            return []
+        scores = _normalized(self.full.matrix[np.asarray(rows)]) @ query
+        return list(zip(rows, scores.tolist()))
+
+class _MemmapMatrix:
+    """
+    Append-only matrix backed by a memory-mapped file, optionally with cached
+    row norms for cosine search.
+    """
+    def __init__(self, path: Path, dim: int, n_rows: int, dtype=np.float32, track_norms: bool = False, grow_by: int = 4096):
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.track_norms = track_norms
+        self.grow_by = grow_by
+        self.n_rows = n_rows
+        self._data = None
+        capacity = path.stat().st_size // (self.dtype.itemsize * dim) if path.exists() else 0
+        self._resize(max(capacity, n_rows, 1))
+        self.norms = np.linalg.norm(self.matrix, axis=1) if track_norms else None
+
+    @property
+    def matrix(self):
+        return self._data[:self.n_rows]
+
+    def append(self, vectors):
+        start = self.n_rows
+        if start + len(vectors) > len(self._data):
+            self._resize(start + len(vectors) + self.grow_by)
+        self._data[start:start + len(vectors)] = vectors
+        self._data.flush()
+        self.n_rows += len(vectors)
+        if self.track_norms:
+            self.norms = np.concatenate([self.norms[:start], np.linalg.norm(vectors, axis=1)])
+
+    def _resize(self, n_rows: int):
+        if self._data is not None:
+            self._data.flush()
+        with open(self.path, 'ab') as f:
+            f.truncate(n_rows * self.dim * self.dtype.itemsize)
+        self._data = np.memmap(self.path, dtype=self.dtype, mode='r+', shape=(n_rows, self.dim))
+
+def _cypher_literal(value):
+    if isinstance(value, str):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return str(value)
+
+def _escape(predicate: str):
+    """
+    Escape a predicate for use inside a single-quoted Cypher string.
+    """
+    return predicate.replace('\\', '\\\\').replace("'", "\\'")
+
+def _normalized(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def embedding_column_type(dim: int, precision: str = settings.EMBEDDING_PRECISION):
+    """
+    Return the column type for embeddings stored at a precision.
+    """
+    types = {precision: column_type for column_type, precision in VECTOR_PRECISIONS.items()}
+    if precision not in types:
+        raise ValueError(f"Unknown embedding precision: {precision}")
+    return f"{types[precision]}[{dim}]"
+
+def _sqlite_type(column_type: str):
+    """
+    Map kuzu column types to sqlite ones.
+    """
+    if column_type == "SERIAL PRIMARY KEY":
+        return "INTEGER PRIMARY KEY"
+    base, _, rest = column_type.partition(" ")
+    sqlite_type = {"STRING": "TEXT", "INT64": "INTEGER", "INT32": "INTEGER", "DOUBLE": "REAL", "FLOAT": "REAL", "BOOLEAN": "INTEGER"}.get(base, "TEXT")
+    return f"{sqlite_type} {rest}".strip()
+
+def _to_arrow(rows: list, columns: list):
+    """
+    Convert a list of row dicts to an Arrow table. Vector columns become
+    fixed-size float32 lists, kuzu casts them to the declared column type.
+    """
+    arrays = {}
+    for column in columns:
+        values = [row[column] for row in rows]
+        if isinstance(values[0], (list, tuple, np.ndarray)):
+            matrix = np.asarray(values, dtype=np.float32)
+            arrays[column] = pa.FixedSizeListArray.from_arrays(pa.array(matrix.ravel()), matrix.shape[1])
+        else:
+            arrays[column] = pa.array(values)
+    return pa.table(arrays)
+
+
+def default_db_path(db_type: str):
+    if db_type == "kuzu":
+        return settings.KUZU_DB_PATH / "vdb.kuzu"
+    elif db_type == "numpy":
+        return settings.NUMPY_DB_PATH
+    else:
+        raise NotImplementedError(f"Unknown database type: {db_type}")
 
-def get_db(db_type: str = "kuzu", db_path: Path = settings.KUZU_DB_PATH / "vdb.kuzu"):
+def get_db(db_type: str = "kuzu", db_path: Union[Path, None] = None):
+    db_path = db_path or default_db_path(db_type)
     if db_type == "kuzu":
         return KuzuDB(db_path)
+    elif db_type == "numpy":
+        return NumpyDB(db_path)
     else:
         raise NotImplementedError(f"Unknown database type: {db_type}")
 
-def delete_db(db_type: str = "kuzu", db_path: Path = settings.KUZU_DB_PATH / "vdb.kuzu"):
+def delete_db(db_type: str = "kuzu", db_path: Union[Path, None] = None):
+    db_path = db_path or default_db_path(db_type)
     if db_type == "kuzu":
         os.remove(db_path)
+    elif db_type == "numpy":
+        shutil.rmtree(db_path)
     else:
         raise NotImplementedError(f"Unknown database type: {db_type}")
 
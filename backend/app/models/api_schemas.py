@@ -6,6 +6,7 @@
 
 from pydantic import BaseModel, Field
 from typing import List, Union, Dict # Union instead of Optional for clarity
+from app.config import settings
 
 # ---------------------- Incoming Story Requests -------------------------
 
@@ -27,6 +28,15 @@ class StoryRequest(BaseModel):
     # default_factory=list to prevent all requests sharing same instance
     context: List[str] = Field(default_factory=list) # rollback context
     user_choice: str # user's choice from previous scene
+    story_id: Union[str, None] = None # story a new first scene starts, defaults to scene_id
+    replay: bool = False # serve the stored generation for the same prompt, if any (see GenerationStore)
+
+class SceneMarkRequest(BaseModel):
+    """
+    Mark a scene as important, so it stays in context for the rest of its story.
+    """
+    scene_id: str
+    important: bool = True # False to unmark
 
 # ------------------------ Outgoing Story Responses -------------------------
 
@@ -46,4 +56,18 @@ class AssetRequest(BaseModel):
     """
     asset_type: str # type of asset to retrieve
     asset_category: Union[str, None] = None # category of asset to retrieve
-    query: str # query to retrieve assets
\ No newline at end of file
+    query: str # query to retrieve assets
+    efs: Union[int, None] = Field(None, ge=1, le=settings.HNSW_MAX_EFS) # HNSW search breadth, defaults to settings.HNSW_EFS
+
+class AssetBatchRequest(BaseModel):
+    """
+    Several asset requests answered in one round trip, e.g. for upcoming scenes.
+    """
+    requests: List[AssetRequest] # requests, results are returned in the same order
+
+class SceneAssetRequest(BaseModel):
+    """
+    Raw scene line to retrieve assets for, rewritten into asset queries by the VLM.
+    """
+    query: str # scene line, as written
+    deadline: Union[float, None] = None # seconds to wait on the rewrite, defaults to settings.REWRITE_DEADLINE
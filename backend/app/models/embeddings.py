@@ -3,7 +3,10 @@
 # ------------------------------------------------------------------------
 
 import torch 
-from transformers import AutoProcessor, AutoModel, AutoTokenizer
+import numpy as np
+from typing import Union
+from transformers import AutoProcessor, AutoModel, AutoTokenizer, AutoConfig
+from transformers import SiglipTextModel, Siglip2TextModel
 from torchvision import transforms 
 from PIL import Image
 
@@ -25,9 +28,35 @@ class ImageTextEmbedder:
                 images = image,
                 return_tensors="pt"
             )
-            image_embeddings = self.model.get_image_features(**inputs)
+            image_embeddings = _pooled(self.model.get_image_features(**inputs))
             return image_embeddings
 
+    def embed_images(self, images, batch_size: int = 16):
+        """
+        Embed a list of images, stacking each batch into a single forward pass.
+
+        Args:
+            images: List of PIL images
+            batch_size: Number of images per forward pass
+
+        Returns:
+            (len(images), dim) float32 matrix of L2-normalized embeddings
+        """
+        batches = []
+        with torch.no_grad():
+            for i in range(0, len(images), batch_size):
+                inputs = self.processor(
+                    images = images[i:i + batch_size],
+                    return_tensors="pt"
+                ).to(self.device)
+                image_embeddings = _pooled(self.model.get_image_features(**inputs))
+                image_embeddings = torch.nn.functional.normalize(image_embeddings.float(), dim=-1)
+                batches.append(image_embeddings.cpu().numpy())
+
+        if not batches:
+            return np.empty((0, self.model.config.vision_config.hidden_size), dtype=np.float32)
+        return np.concatenate(batches, axis=0).astype(np.float32, copy=False)
+
     def embed_text(self, text):
         with torch.no_grad():
             inputs = self.tokenizer(
@@ -36,9 +65,102 @@ class ImageTextEmbedder:
                 truncation=True,
                 return_tensors="pt"
             )
-            text_embeddings = self.model.get_text_features(**inputs)
+            text_embeddings = _pooled(self.model.get_text_features(**inputs))
             return text_embeddings
 
+    def embed_texts(self, texts: list):
+        """
+        Embed a list of texts in one tokenizer and model pass, matching
+        embed_text for each text (see _embed_padded).
+        """
+        return _embed_padded(self.model, self.tokenizer, texts, self.device)
+
+class TextEmbedder:
+    """
+    Text tower of an image-text model, for query-serving nodes that only need
+    embed_text. Skips loading the processor and vision tower, and can apply
+    int8 dynamic quantization to the linear layers.
+
+    Embeddings live in the same space as ImageTextEmbedder.embed_text.
+    """
+    text_models = {
+        "siglip": SiglipTextModel,
+        "siglip2": Siglip2TextModel,
+    }
+
+    def __init__(self, model_id: str, device: str = "cpu", quantize: Union[str, None] = None):
+        self.model_id = model_id
+        self.device = device
+        self.quantize = quantize
+
+        config = AutoConfig.from_pretrained(model_id)
+        if config.model_type not in self.text_models:
+            raise NotImplementedError(f"No text-only loader for model type: {config.model_type}")
+        self.model = self.text_models[config.model_type].from_pretrained(model_id).eval()
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+
+        if quantize == "int8":
+            # dynamic quantization only runs on cpu
+            self.device = "cpu"
+            self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif quantize is not None:
+            raise NotImplementedError(f"Unknown quantization: {quantize}")
+        self.model = self.model.to(self.device)
+
+    def embed_text(self, text):
+        with torch.no_grad():
+            inputs = self.tokenizer(
+                [text],
+                max_length=64,
+                truncation=True,
+                return_tensors="pt"
+            ).to(self.device)
+            text_embeddings = self.model(**inputs).pooler_output
+            return text_embeddings
+
+    def embed_texts(self, texts: list):
+        """
+        Embed a list of texts in one tokenizer and model pass, matching
+        embed_text for each text (see _embed_padded).
+        """
+        return _embed_padded(self.model, self.tokenizer, texts, self.device)
+
+def _embed_padded(model, tokenizer, texts: list, device: str):
+    """
+    SigLIP pools the hidden state of the last position, so padding a batch
+    would pool a pad token. Right-pad with an attention mask instead (pads
+    don't change the real tokens' hidden states) and pool each text's last
+    real token, which gives the same embeddings as one pass per text.
+
+    Returns:
+        (len(texts), dim) tensor of unnormalized embeddings, like embed_text
+    """
+    with torch.no_grad():
+        inputs = tokenizer(
+            list(texts),
+            max_length=64,
+            truncation=True,
+            padding=True,
+            padding_side="right",
+            return_attention_mask=True,
+            return_tensors="pt"
+        ).to(device)
+        # the module holding the pooling head: the model itself, or its
+        # text_model, depending on the model and transformers version
+        text_model = model
+        while not hasattr(text_model, "head"):
+            text_model = text_model.text_model
+        hidden = text_model(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"]).last_hidden_state
+        last = inputs["attention_mask"].sum(dim=1) - 1
+        return text_model.head(hidden[torch.arange(len(texts), device=hidden.device), last])
+
+def _pooled(features):
+    """
+    Newer transformers versions return a model output from get_*_features
+    rather than the pooled tensor.
+    """
+    return getattr(features, "pooler_output", features)
+
 class AudioTextEmbedder:
     def __init__(self, model_id: str):
         self.model_id = model_id
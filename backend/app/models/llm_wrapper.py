@@ -3,15 +3,34 @@
 # 
 # Interface for LLM adapters. Currently implemented adapters:
 # - OllamaAdapter
+# - AsyncOllamaAdapter
+# - AsyncRoutingAdapter, over several Ollama endpoints
 # ------------------------------------------------------------------------
 
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
 import abc 
+import time
+import asyncio
+import httpx
 import requests
 from typing import Generator, List, Dict, Union
+from app.services.lru_cache import LRUCache
 
 class LLMAdapter(abc.ABC):
     """
     Abstract base class for LLM adapters. 
+
+    Adapters may implement these as regular methods/generators (OllamaAdapter)
+    or as coroutines/async generators (AsyncOllamaAdapter), callers pick the
+    adapter that matches their context.
+
+    Requests may pass session (e.g. a story id), so adapters over several
+    backends keep a session on the one holding its KV cache. Adapters with
+    one backend ignore it.
     """
     # TODO: think about whether we want a shared constructor
     # def __init__(self):
@@ -38,17 +57,19 @@ class OllamaAdapter(LLMAdapter):
 
     Use chat endpoint to allow for message history context.
     """
-    def __init__(self, url: str, model: str):
+    def __init__(self, url: str, model: str, timeout: Union[float, None] = None):
         self.url = url # ollama api url
         self.model = model # ollama model name
         self.chat_url = f"{self.url}/api/chat" # natural language chat
+        self.timeout = timeout # seconds, None waits forever
 
     # for now, just use messages, rather than allowing kwargs
-    def chat_stream(self, messages: List[Dict[str, str]], options: Dict[str, str] = {}, _format: Union[str, None] = None):
+    def chat_stream(self, messages: List[Dict[str, str]], options: Dict[str, str] = {}, _format: Union[str, None] = None, session: Union[str, None] = None):
         """
         Args:
             messages: List of messages to send to LLM, defined by 'role' and 'content'
             options: Additional inference options
+            session: Routing hint (see LLMAdapter), unused with one backend
         """
         payload = {
             "model": self.model,
@@ -60,16 +81,17 @@ class OllamaAdapter(LLMAdapter):
             payload["format"] = _format
 
         # stream response https://stackoverflow.com/questions/57497833/python-requests-stream-data-from-api
-        with requests.post(self.chat_url, json=payload, stream=True) as resp:
+        with requests.post(self.chat_url, json=payload, stream=True, timeout=self.timeout) as resp:
             for line in resp.iter_lines(): # streams word by word
                 if line:
                     yield line
 
-    def chat_chunk(self, messages: List[Dict[str, str]], options: Dict[str, str] = {}, _format: Union[str, None] = None):
+    def chat_chunk(self, messages: List[Dict[str, str]], options: Dict[str, str] = {}, _format: Union[str, None] = None, session: Union[str, None] = None):
         """
         Args:
             messages: List of messages to send to LLM, defined by 'role' and 'content'
             options: Additional inference options
+            session: Routing hint (see LLMAdapter), unused with one backend
         """
         payload = {
             "model": self.model,
@@ -80,13 +102,364 @@ class OllamaAdapter(LLMAdapter):
         if _format:
             payload["format"] = _format
 
-        response = requests.post(self.chat_url, json=payload)
+        response = requests.post(self.chat_url, json=payload, timeout=self.timeout)
         return response.json()
 
     def list_models(self):
-        response = requests.get(f"{self.url}/api/tags")
+        response = requests.get(f"{self.url}/api/tags", timeout=self.timeout)
+        return response.json()
+
+
+class AsyncOllamaAdapter(LLMAdapter):
+    """
+    Async Ollama LLM adapter, for use inside the FastAPI event loop.
+
+    Requests share one pooled keep-alive httpx.AsyncClient, so a slow generation
+    only holds its own connection rather than blocking the worker. Failed
+    connections, timeouts and 5xx responses are retried with exponential
+    backoff, as long as nothing has been yielded to the caller yet.
+    """
+    def __init__(self, url: str, model: str, timeout: float = 120.0, connect_timeout: float = 5.0, max_retries: int = 2, max_connections: int = 32, backoff: float = 0.5):
+        self.url = url # ollama api url
+        self.model = model # ollama model name
+        self.chat_url = f"{self.url}/api/chat" # natural language chat
+        self.max_retries = max_retries
+        self.backoff = backoff # seconds before first retry, doubles each retry
+
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client = None
+        self._client_loop = None
+        self._client_closer = None # task closing the client when its loop shuts down
+
+    async def chat_stream(self, messages: List[Dict[str, str]], options: Dict[str, str] = {}, _format: Union[str, None] = None, session: Union[str, None] = None):
+        """
+        Args:
+            messages: List of messages to send to LLM, defined by 'role' and 'content'
+            options: Additional inference options
+            session: Routing hint (see LLMAdapter), unused with one backend
+
+        Yields:
+            Raw NDJSON lines from Ollama, as they arrive
+        """
+        payload = self._payload(messages, options, _format, stream=True)
+        yielded = False # don't retry once output has reached the caller
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._get_client().stream("POST", self.chat_url, json=payload) as resp:
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        if line:
+                            yielded = True
+                            yield line
+                return
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if yielded or not self._should_retry(e, attempt):
+                    raise
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def chat_chunk(self, messages: List[Dict[str, str]], options: Dict[str, str] = {}, _format: Union[str, None] = None, session: Union[str, None] = None):
+        """
+        Args:
+            messages: List of messages to send to LLM, defined by 'role' and 'content'
+            options: Additional inference options
+            session: Routing hint (see LLMAdapter), unused with one backend
+        """
+        payload = self._payload(messages, options, _format, stream=False)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._get_client().post(self.chat_url, json=payload)
+                response.raise_for_status()
+                return response.json()
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if not self._should_retry(e, attempt):
+                    raise
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def list_models(self):
+        response = await self._get_client().get(f"{self.url}/api/tags")
+        response.raise_for_status()
         return response.json()
 
+    async def aclose(self):
+        if self._client is None:
+            return
+        if self._client_loop is not asyncio.get_running_loop():
+            self._release_client()
+            return
+        client, closer = self._client, self._client_closer
+        self._client = self._client_loop = self._client_closer = None
+        closer.cancel()
+        await client.aclose()
+
+    def _get_client(self):
+        """
+        Return the pooled client, creating one on first use. Pooled connections
+        belong to an event loop, and can only be closed on it, so a new loop
+        (e.g. asyncio.run in scripts) gets a new client, and each client is
+        closed on its own loop: when that loop shuts down, or as soon as
+        another loop replaces it.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._client_loop is not loop:
+            self._release_client()
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+            self._client_loop = loop
+            self._client_closer = loop.create_task(_close_on_cancel(self._client))
+        return self._client
+
+    def _release_client(self):
+        """
+        Drop the client of another event loop, closing it there. A closed
+        loop already closed it as it shut down.
+        """
+        loop, closer = self._client_loop, self._client_closer
+        self._client = self._client_loop = self._client_closer = None
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(closer.cancel)
+
+    def _payload(self, messages: List[Dict[str, str]], options: Dict[str, str], _format: Union[str, None], stream: bool):
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": stream,
+            "options": options,
+        }
+        if _format:
+            payload["format"] = _format
+        return payload
+
+    def _should_retry(self, error: Exception, attempt: int):
+        if attempt >= self.max_retries:
+            return False
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code >= 500
+        return True
+
+
+class _Backend:
+    """
+    One endpoint of an AsyncRoutingAdapter, and what the router knows about it.
+    """
+    def __init__(self, adapter: AsyncOllamaAdapter):
+        self.adapter = adapter
+        self.healthy = True
+        self.down_until = 0.0 # monotonic time a down endpoint is tried again
+        self.outstanding = 0
+        self.n_requests = 0
+        self.n_failures = 0
+        self.ttfb = None # moving average of seconds to first byte
+
+    def available(self, now: float):
+        return self.healthy or now >= self.down_until
+
+    def mark_down(self, retry_after: float):
+        self.healthy = False
+        self.down_until = time.monotonic() + retry_after
+
+    def mark_up(self):
+        self.healthy = True
+        self.down_until = 0.0
+
+
+class AsyncRoutingAdapter(LLMAdapter):
+    """
+    Async adapter over several Ollama endpoints serving the same model.
+
+    - A request goes to the available endpoint with the fewest requests
+      outstanding (ties go to the fastest to first byte).
+    - Requests of the same session stick to the endpoint that served it
+      last, where its prompt prefix is still in the KV cache, unless that
+      endpoint has more than affinity_slack requests outstanding beyond
+      the least loaded one.
+    - A connection error, timeout or 5xx before any output reaches the
+      caller marks the endpoint down for retry_after seconds and retries
+      the request on the next endpoint. The session moves with it. After
+      retry_after the endpoint gets requests again, and goes back down if
+      it fails.
+    - Every health_interval seconds, a request starts probing all endpoints
+      (GET /api/tags) in the background, so dead ones are found before a
+      player hits them and recovered ones rejoin.
+    """
+    def __init__(self, urls: List[str], model: str, timeout: float = 120.0, connect_timeout: float = 5.0, max_connections: int = 32, health_interval: float = 5.0, retry_after: float = 5.0, affinity_slack: int = 2, max_sessions: int = 4096):
+        if not urls:
+            raise ValueError("AsyncRoutingAdapter needs at least one url")
+        self.model = model # ollama model name
+        self.health_interval = health_interval
+        self.retry_after = retry_after
+        self.affinity_slack = affinity_slack
+        # failover replaces the adapters' own retries
+        self.backends = [
+            _Backend(AsyncOllamaAdapter(url=url, model=model, timeout=timeout, connect_timeout=connect_timeout, max_retries=0, max_connections=max_connections))
+            for url in urls
+        ]
+        self.n_failovers = 0
+        self.n_affinity_hits = 0 # requests served by their session's endpoint
+        self._sessions = LRUCache(maxsize=max_sessions) # session -> _Backend
+        self._last_check = time.monotonic()
+        self._health_check = None
+
+    async def chat_stream(self, messages: List[Dict[str, str]], options: Dict[str, str] = {}, _format: Union[str, None] = None, session: Union[str, None] = None):
+        """
+        Args:
+            messages: List of messages to send to LLM, defined by 'role' and 'content'
+            options: Additional inference options
+            session: Requests with the same session prefer the same endpoint, e.g. a story id
+
+        Yields:
+            Raw NDJSON lines from Ollama, as they arrive
+        """
+        tried = []
+        while True:
+            backend = self._select(session, tried)
+            tried.append(backend)
+            start = time.perf_counter()
+            yielded = False
+            backend.outstanding += 1
+            backend.n_requests += 1
+            stream = backend.adapter.chat_stream(messages, options=options, _format=_format)
+            try:
+                async for line in stream:
+                    if not yielded:
+                        yielded = True
+                        self._observe(backend, time.perf_counter() - start)
+                    yield line
+                return
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                # once output has reached the caller, another endpoint can't continue it
+                if yielded or not self._failover(backend, e, tried):
+                    raise
+            finally:
+                backend.outstanding -= 1
+                await stream.aclose()
+
+    async def chat_chunk(self, messages: List[Dict[str, str]], options: Dict[str, str] = {}, _format: Union[str, None] = None, session: Union[str, None] = None):
+        """
+        Args:
+            messages: List of messages to send to LLM, defined by 'role' and 'content'
+            options: Additional inference options
+            session: Requests with the same session prefer the same endpoint, e.g. a story id
+        """
+        tried = []
+        while True:
+            backend = self._select(session, tried)
+            tried.append(backend)
+            start = time.perf_counter()
+            backend.outstanding += 1
+            backend.n_requests += 1
+            try:
+                response = await backend.adapter.chat_chunk(messages, options=options, _format=_format)
+                self._observe(backend, time.perf_counter() - start)
+                return response
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                if not self._failover(backend, e, tried):
+                    raise
+            finally:
+                backend.outstanding -= 1
+
+    async def list_models(self):
+        now = time.monotonic()
+        backend = next((backend for backend in self.backends if backend.available(now)), self.backends[0])
+        return await backend.adapter.list_models()
+
+    async def check_health(self):
+        """
+        Probe every endpoint, marking it up or down. Returns {url: healthy}.
+        """
+        await asyncio.gather(*(self._probe(backend) for backend in self.backends))
+        return {backend.adapter.url: backend.healthy for backend in self.backends}
+
+    def stats(self):
+        return {
+            "backends": [
+                {
+                    "url": backend.adapter.url,
+                    "healthy": backend.healthy,
+                    "outstanding": backend.outstanding,
+                    "requests": backend.n_requests,
+                    "failures": backend.n_failures,
+                    "ttfb_ms": backend.ttfb * 1000 if backend.ttfb is not None else None
+                }
+                for backend in self.backends
+            ],
+            "sessions": len(self._sessions),
+            "affinity_hits": self.n_affinity_hits,
+            "failovers": self.n_failovers
+        }
+
+    async def aclose(self):
+        if self._health_check is not None:
+            self._health_check.cancel()
+            self._health_check = None
+        for backend in self.backends:
+            await backend.adapter.aclose()
+
+    def _select(self, session: Union[str, None], tried: list):
+        """
+        Pick the endpoint for a request, skipping those it already failed on.
+        """
+        now = time.monotonic()
+        self._schedule_health_check(now)
+        untried = [backend for backend in self.backends if backend not in tried]
+        # with every endpoint down, trying one beats failing outright
+        candidates = [backend for backend in untried if backend.available(now)] or untried
+        backend = min(candidates, key=lambda backend: (backend.outstanding, backend.ttfb or 0.0))
+        if session is not None:
+            pinned = self._sessions.get(session)
+            if pinned in candidates and pinned.outstanding <= backend.outstanding + self.affinity_slack:
+                backend = pinned
+                self.n_affinity_hits += 1
+            self._sessions.put(session, backend)
+        return backend
+
+    def _failover(self, backend: _Backend, error: Exception, tried: list):
+        """
+        Record a failed request, and return whether to retry it on another endpoint.
+        """
+        if isinstance(error, httpx.HTTPStatusError) and error.response.status_code < 500:
+            return False # the request's fault, not the endpoint's
+        backend.n_failures += 1
+        backend.mark_down(self.retry_after)
+        print(f"LLM endpoint {backend.adapter.url} failed, marked down for {self.retry_after}s: {error!r}")
+        if len(tried) >= len(self.backends):
+            return False
+        self.n_failovers += 1
+        return True
+
+    def _observe(self, backend: _Backend, ttfb: float):
+        backend.mark_up()
+        backend.ttfb = ttfb if backend.ttfb is None else 0.8 * backend.ttfb + 0.2 * ttfb
+
+    def _schedule_health_check(self, now: float):
+        if now - self._last_check < self.health_interval:
+            return
+        if self._health_check is not None and not self._health_check.done():
+            return
+        self._last_check = now
+        self._health_check = asyncio.ensure_future(self.check_health())
+
+    async def _probe(self, backend: _Backend):
+        try:
+            await backend.adapter.list_models()
+        except (httpx.TransportError, httpx.HTTPStatusError) as e:
+            if backend.healthy:
+                print(f"LLM endpoint {backend.adapter.url} failed its health check: {e!r}")
+            backend.mark_down(self.retry_after)
+            return
+        backend.mark_up()
+
+
+async def _close_on_cancel(client: httpx.AsyncClient):
+    """
+    Close client once cancelled: by asyncio.run cancelling its remaining
+    tasks before closing the loop, or when the client is dropped.
+    """
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await client.aclose()
+
 
 
 if __name__ == "__main__":
@@ -123,4 +496,4 @@ if __name__ == "__main__":
     ])
     print(metadata)
 
-    
\ No newline at end of file
+    
@@ -7,16 +7,25 @@
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 from app.services.asset_manager import AssetManager
-from app.models.api_schemas import AssetRequest
+from app.models.api_schemas import AssetRequest, AssetBatchRequest, SceneAssetRequest
+from app.config import settings
 
 router = APIRouter()
-asset_manager = AssetManager()
+asset_manager = AssetManager() # models and db load lazily, see main.lifespan
 
 @router.post("/load_assets")
 def load_assets():
     asset_manager.load_assets()
     return JSONResponse(content={"message": "Assets loaded successfully"})
 
+@router.post("/reindex_assets")
+def reindex_assets():
+    """
+    Apply added, removed and moved files under the asset directory.
+    """
+    summary = asset_manager.reindex_assets()
+    return JSONResponse(content=summary)
+
 @router.post("/retrieve_image_candidates")
 def retrieve_image_candidates(request: AssetRequest, k: int = 5):
     """
@@ -32,6 +41,47 @@ def retrieve_image_candidates(request: AssetRequest, k: int = 5):
     image_assets = asset_manager.search_image_assets(asset_request=request, k=k)
     return JSONResponse(content={"image_assets": image_assets})
 
+@router.post("/retrieve_image_candidates_batch")
+def retrieve_image_candidates_batch(request: AssetBatchRequest, k: int = 5):
+    """
+    Retrieve candidates for several queries at once. Query texts are encoded
+    in one model pass, and results are grouped by request.
+
+    Example:
+
+        batch = AssetBatchRequest(requests=[
+            AssetRequest(query="messy red kitchen", asset_type="image", asset_category="bg"),
+            AssetRequest(query="school rooftop at sunset", asset_type="image", asset_category="bg")
+        ])
+
+        requests.post("http://localhost:8000/api/asset/retrieve_image_candidates_batch", json=batch.model_dump(), params={'k':1}).json()
+    """
+    image_assets = asset_manager.search_image_assets_batch(asset_requests=request.requests, k=k)
+    return JSONResponse(content={"image_assets": image_assets})
+
+@router.post("/retrieve_scene_assets")
+def retrieve_scene_assets(request: SceneAssetRequest, k: int = 5):
+    """
+    Retrieve background image candidates for a raw scene line. The raw line
+    is searched while the VLM rewrites it, and the refined results replace
+    the raw ones only if the rewrite finishes within the deadline.
+
+    Example:
+
+        scene = SceneAssetRequest(query="He walked into the messy, red kitchen, it was dark and quiet.")
+
+        requests.post("http://localhost:8000/api/asset/retrieve_scene_assets", json=scene.model_dump(), params={'k':1}).json()
+    """
+    response = asset_manager.retrieve_scene_assets(query=request.query, k=k, deadline=request.deadline)
+    return JSONResponse(content=response)
+
+@router.get("/cache_stats")
+def cache_stats():
+    """
+    Hit/miss counters for the query embedding, search result and rewrite caches.
+    """
+    return JSONResponse(content=asset_manager.cache_stats())
+
 @router.post("/retrieve_audio_candidates")
 def retrieve_audio_candidates(request: AssetRequest, k: int = 5):
     audio_assets = asset_manager.search_audio_assets(asset_request=request, k=k)
@@ -4,12 +4,16 @@
 # Define API endpoints for story-telling engine.
 # ------------------------------------------------------------------------
 
+from typing import Union
+import httpx
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse, StreamingResponse
-from app.models.api_schemas import StoryRequest, Chunk 
+from app.models.api_schemas import StoryRequest, SceneMarkRequest, Chunk 
 from app.services.rag_engine import GraphRAG
 from app.config import settings
 from app.services.rag_engine import get_llm_adapter
+from app.services.llm_scheduler import LLMBusyError
+from app.models.llm_wrapper import AsyncRoutingAdapter
 
 router = APIRouter() 
 rag_engine = GraphRAG(llm_adapter=get_llm_adapter())
@@ -18,34 +22,103 @@ rag_engine = GraphRAG(llm_adapter=get_llm_adapter())
 async def generate_stream(request: StoryRequest):
     """
     Endpoint to generate the next story dialogue as a stream.
+
+    Each event is one Chunk, framed as Server-Sent Events:
+
+        data: {"text":"John: ","is_final":false,"fx":null}
+
+    and the last event has is_final true. If generation fails midway, the
+    last event is a final Chunk with fx {"error": ...}, so clients can tell
+    it from a dropped connection. Returns 503 if too many story requests
+    are already queued for the LLM (see LLMScheduler).
     """
-    context = rag_engine.retrieve(
+    response_generator = rag_engine.generate_stream(
         scene_id=request.scene_id,
-        context=request.context, 
-        active_chars=request.active_chars
+        context=request.context,
+        active_chars=request.active_chars,
+        history=request.context,
+        user_choice=request.user_choice,
+        options=settings.LLM_OPTIONS,
+        story_id=request.story_id,
+        replay=request.replay
     )
-    response_generator = rag_engine.generate_stream(
-        context=context,
-        user_choice=request.user_choice
+    # wait for the first chunk, so a rejected request still gets a status code
+    try:
+        first_chunk = await anext(response_generator)
+    except LLMBusyError as e:
+        return _busy(e)
+    return StreamingResponse(
+        sse_events(response_generator, first_chunk),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # don't let proxies buffer tokens
     )
-    return StreamingResponse(response_generator, media_type="text/event-stream")
 
 @router.post("/generate_chunk")
 async def generate_chunk(request: StoryRequest):
     """
     Endpoint to generate the next story dialogue as a chunk.
     """
-    context = rag_engine.retrieve(
-        scene_id=request.scene_id,
-        context=request.context,
-        active_chars=request.active_chars
-    )
-    response = rag_engine.generate_chunk(
-        context=context,
-        user_choice=request.user_choice
-    )
+    try:
+        response = await rag_engine.generate_chunk(
+            scene_id=request.scene_id,
+            context=request.context,
+            active_chars=request.active_chars,
+            history=request.context,
+            user_choice=request.user_choice,
+            options=settings.LLM_OPTIONS,
+            story_id=request.story_id,
+            replay=request.replay
+        )
+    except LLMBusyError as e:
+        return _busy(e)
     return JSONResponse(content=response)
 
+@router.post("/mark_important")
+async def mark_important(request: SceneMarkRequest):
+    """
+    Endpoint to keep a scene in context for the rest of its story.
+    """
+    rag_engine.mark_important(request.scene_id, request.important)
+    return JSONResponse(content={"scene_id": request.scene_id, "important": request.important})
+
+@router.get("/stream_stats")
+async def stream_stats():
+    """
+    Time to first token, prefill and tokens/sec percentiles over recent
+    generations, how often prompts reused their story's cached prefix,
+    with SPECULATE, how often choices were served pre-generated, with
+    GENERATION_STORE, how often replays were served from it, and with
+    OLLAMA_URLS, the load and health of each endpoint.
+    """
+    stats = {**rag_engine.stream_metrics.summary(), "prompt": rag_engine.prompt_builder.stats()}
+    if rag_engine.speculator is not None:
+        stats["speculation"] = rag_engine.speculator.stats()
+    if rag_engine.generation_store is not None:
+        stats["generations"] = rag_engine.generation_store.stats()
+    # the router sits behind the scheduler, if there is one
+    adapter = getattr(rag_engine.llm_adapter, "adapter", rag_engine.llm_adapter)
+    if isinstance(adapter, AsyncRoutingAdapter):
+        stats["routing"] = adapter.stats()
+    return JSONResponse(content=stats)
+
+async def sse_events(chunks, first_chunk: Union[Chunk, None] = None):
+    """
+    Frame Chunks as SSE events, one event per Chunk, ending with a final
+    error Chunk if the LLM fails partway through.
+    """
+    if first_chunk is not None:
+        yield f"data: {first_chunk.model_dump_json()}\n\n"
+    try:
+        async for chunk in chunks:
+            yield f"data: {chunk.model_dump_json()}\n\n"
+    except (RuntimeError, httpx.TransportError, httpx.HTTPStatusError) as e:
+        # the status code is already sent, so the error goes in the stream
+        error = Chunk(text="", is_final=True, fx={"error": str(e) or type(e).__name__})
+        yield f"data: {error.model_dump_json()}\n\n"
+
+def _busy(error: LLMBusyError):
+    return JSONResponse(status_code=503, headers={"Retry-After": "1"}, content={"detail": str(error)})
+
 @router.get("/save_story")
 async def save_story():
     """
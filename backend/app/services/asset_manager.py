@@ -11,95 +11,179 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"
 
 import json
 import base64
-from app.models.embeddings import ImageTextEmbedder, AudioTextEmbedder
+import time
+import threading
+from typing import Union
+from itertools import islice
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from app.models.embeddings import ImageTextEmbedder, AudioTextEmbedder, TextEmbedder
 from app.models.llm_wrapper import OllamaAdapter
 from app.models.api_schemas import AssetRequest 
-from app.database import get_db
+from app.services.embedding_cache import EmbeddingCache, file_hash
+from app.services.components import LazyComponent
+from app.services.lru_cache import LRUCache
+from app.services.llm_scheduler import ScheduledAdapter, get_llm_scheduler
+from app.database import get_db, embedding_column_type
 from app.config import settings
 from pathlib import Path
 from PIL import Image
 from tqdm import tqdm
 
+CAPTION_PROMPT = """
+You are an expert metadata and keyword captioner. Explain this image in 1 sentence, with as little filler as possible. Do not write anything other than your most important keyword metadata.
+"""
+
 class AssetManager:
-    def __init__(self, db_path: Path = settings.KUZU_DB_PATH / "vdb.kuzu", asset_path: Path = settings.ASSET_PATH):
-        self.image_text_embedder = ImageTextEmbedder(
+    """
+    Constructing an AssetManager is cheap: the embedding model, database and
+    embedding cache are loaded on first use (or by warm_up()), so importing
+    the asset router doesn't block startup.
+    """
+    def __init__(self, db_path: Union[Path, None] = None, asset_path: Path = settings.ASSET_PATH, cache_path: Path = settings.EMBEDDING_CACHE_PATH):
+        self._image_text_embedder = LazyComponent("image_text_embedder", lambda: ImageTextEmbedder(
             model_id=settings.IMAGE_TEXT_MODEL_ID, 
             device=settings.DEVICE
-        )
+        ))
         self.vlm_adapter = OllamaAdapter(
             url=settings.OLLAMA_URL,
-            model=settings.OLLAMA_VLM_MODEL
+            model=settings.OLLAMA_VLM_MODEL,
+            timeout=settings.OLLAMA_TIMEOUT
         )
+        # captions and rewrites queue behind players' story requests
+        self.llm_scheduler = get_llm_scheduler() if settings.LLM_SCHEDULER else None
+
+        # query-serving nodes can skip the vision tower entirely
+        self._text_embedder = self._image_text_embedder
+        if settings.QUERY_ENCODER == "text":
+            self._text_embedder = LazyComponent("text_embedder", lambda: TextEmbedder(
+                model_id=settings.IMAGE_TEXT_MODEL_ID,
+                device=settings.DEVICE,
+                quantize=settings.QUERY_ENCODER_QUANTIZE
+            ))
+
+        self._embedding_cache = LazyComponent("embedding_cache", lambda: EmbeddingCache(
+            cache_path=cache_path,
+            dim=settings.IMAGE_TEXT_DIM,
+            model_id=settings.IMAGE_TEXT_MODEL_ID
+        ))
 
         self.asset_path = asset_path
+        self._sync_lock = threading.Lock()
+
+        # repeated scene queries skip the encoder and/or the index
+        self._query_embedding_cache = LRUCache(maxsize=settings.QUERY_EMBEDDING_CACHE_SIZE)
+        self._search_cache = LRUCache(maxsize=settings.SEARCH_CACHE_SIZE)
+        self._index_generation = 0
+
+        # scene line -> {"image_query", "audio_query"}, independent of the index
+        self._rewrite_cache = LRUCache(maxsize=settings.REWRITE_CACHE_SIZE)
+        self._rewrite_executor = ThreadPoolExecutor(max_workers=settings.CAPTION_CONCURRENCY, thread_name_prefix="rewrite")
 
         # want to keep db methods private
-        self._db = get_db(db_type="kuzu", db_path=db_path)
-        self._conn = self._db.conn
-        
-        # TODO: check if db is empty
+        self._vector_db = LazyComponent("vector_db", lambda: get_db(db_type=settings.DB_TYPE, db_path=db_path))
+
+    @property
+    def image_text_embedder(self):
+        return self._image_text_embedder.get()
+
+    @image_text_embedder.setter
+    def image_text_embedder(self, embedder):
+        shared = self._text_embedder is self._image_text_embedder
+        self._image_text_embedder = LazyComponent.of("image_text_embedder", embedder)
+        if shared:
+            self._text_embedder = self._image_text_embedder
+
+    @property
+    def text_embedder(self):
+        """
+        Encoder for search queries, see settings.QUERY_ENCODER.
+        """
+        return self._text_embedder.get()
+
+    @text_embedder.setter
+    def text_embedder(self, embedder):
+        self._text_embedder = LazyComponent.of("text_embedder", embedder)
+
+    @property
+    def embedding_cache(self):
+        return self._embedding_cache.get()
 
-    def load_assets(self, infer_metadata: bool = True):
+    @property
+    def _db(self):
+        return self._vector_db.get()
+
+    def components(self):
+        """
+        Return the lazily loaded components, in warm-up order. A text-only
+        query node doesn't warm up the full image-text model.
+        """
+        if self._text_embedder is not self._image_text_embedder:
+            return [self._vector_db, self._text_embedder]
+        return [self._vector_db, self._embedding_cache, self._image_text_embedder]
+
+    def load_assets(self, infer_metadata: bool = True, batch_size: int = settings.IMAGE_EMBED_BATCH_SIZE):
         """
         Parse asset directory, embed assets, and index them in the database.
         This should be called once if db is empty, or if existing asset file 
         structure has changed.
 
-        TODO: implement schema (asset_path, asset_name, asset_type, asset_embedding)
+        Assets stream through parse -> decode -> embed -> caption -> insert
+        one batch at a time, so memory stays bounded by batch_size rather than
+        the size of the corpus. Progress is checkpointed in the database, so an
+        interrupted run resumes from the last inserted batch.
         """
         # initialize database
         self.initialize_db()
 
-        # check if db is empty
-        response = self._conn.execute("MATCH (n:Image) RETURN COUNT(*)")
-        for row in response:
-            db_rows = row[0]
-        
-        # fill db if empty
-        if db_rows == 0:
-            # parse assets
-            image_assets = self.parse_image_assets()
-
-            # embed assets
-            image_assets = self.embed_image_assets(image_assets, infer_metadata=infer_metadata)
-
-            print(f"Adding {len(image_assets)} images to database...")
-            for asset in tqdm(image_assets):
-                self._conn.execute(
-                    """
-                    CREATE (n:Image {
-                        image_path: $image_path,
-                        image_name: $image_name,
-                        image_type: $image_type,
-                        image_embedding: $image_embedding,
-                        image_metadata: $image_metadata
-                    })
-                    """,
-                    {
-                        "image_path": asset['image_path'],
-                        "image_name": asset['image_name'],
-                        "image_type": asset['image_type'],
-                        "image_embedding": asset['image_embedding'],
-                        "image_metadata": asset['image_metadata']
-                    }
-                )
-
-            # create HNSW index
-            print("Creating HNSW index...")
-            self._conn.execute(
-                """
-                CALL CREATE_VECTOR_INDEX(
-                    'Image',
-                    'image_index',
-                    'image_embedding',
-                    metric := 'cosine'
-                );
-                """
-            )
-
-            print('Vector database initialized successfully!')
-        else:
+        checkpoint = self._db.get_checkpoint("image_ingest")
+        if checkpoint is None and self._db.count("Image") > 0:
+            # db was built before checkpoints existed
+            checkpoint = {"status": "complete", "n_done": self._db.count("Image")}
+
+        if checkpoint is not None and checkpoint["status"] == "complete":
+            self._backfill_categories()
             print('Vector database already initialized!')
+            return
+
+        # skip assets inserted by an interrupted run
+        n_done = checkpoint["n_done"] if checkpoint is not None else 0
+        inserted = set(self._db.get_column("Image", "image_path"))
+        if inserted:
+            print(f"Resuming from checkpoint, {len(inserted)} images already indexed...")
+        image_assets = (
+            asset for asset in self.iter_image_assets() 
+            if asset['image_path'] not in inserted
+        )
+
+        print("Adding images to database...")
+        for batch in self.iter_embedded_assets(image_assets, infer_metadata=infer_metadata, batch_size=batch_size):
+            self._db.bulk_insert("Image", [_image_row(asset) for asset in batch])
+            n_done += len(batch)
+            self._db.set_checkpoint("image_ingest", status="running", n_done=n_done)
+
+        # create HNSW index
+        print("Creating HNSW index...")
+        self._db.create_vector_index("Image", "image_index", "image_embedding", metric="cosine", **settings.VECTOR_INDEX_PARAMS)
+        self._db.flush()
+        self._db.set_checkpoint("image_ingest", status="complete", n_done=n_done)
+
+        self._invalidate_search_cache()
+        print('Vector database initialized successfully!')
+
+    def _backfill_categories(self):
+        """
+        Fill in image_category for rows inserted before it was stored, so
+        category-filtered searches don't miss them.
+        """
+        rows = self._db.get_rows("Image", ["image_path", "image_category"])
+        missing = [
+            {"key": row['image_path'], "image_category": self.image_category(row['image_path'])}
+            for row in rows if row['image_category'] is None
+        ]
+        if missing:
+            self._db.update_rows("Image", "image_path", missing)
+            self._invalidate_search_cache()
 
     def initialize_db(self):
         """
@@ -115,9 +199,13 @@ class AssetManager:
             "image_path": "STRING",
             "image_name": "STRING",
             "image_type": "STRING",
-            "image_embedding": f"DOUBLE[{settings.IMAGE_TEXT_DIM}]",
+            "image_embedding": embedding_column_type(settings.IMAGE_TEXT_DIM, settings.EMBEDDING_PRECISION),
             "image_metadata": "STRING",
-            "image_category": "STRING"
+            "image_category": "STRING",
+            # manifest, used to detect new/changed/moved files
+            "image_hash": "STRING",
+            "image_mtime": "DOUBLE",
+            "image_size": "INT64"
         }
         self._db.create_schema(image_schema)
 
@@ -134,14 +222,23 @@ class AssetManager:
     def parse_image_assets(self):
         """
         Return a json list of valid image asset file paths.
+        """
+        return list(self.iter_image_assets())
+
+    def iter_image_assets(self, asset_path: Path = None):
+        """
+        Yield valid image assets one at a time, as they are found on disk.
+
+        Args:
+            asset_path: Directory to scan, defaults to the asset root
 
         TODO: do i want to filter out portraits? only keeping bg assets? 
         - skip pngs for now
         """
         extensions = {'.jpg', '.jpeg', '.webp'}
-        files = [p for p in Path(self.asset_path).rglob("*") if p.suffix.lower() in extensions]
-        assets = []
-        for file in files:
+        for file in Path(asset_path or self.asset_path).rglob("*"):
+            if file.suffix.lower() not in extensions:
+                continue
 
             # convert png to jpg
             # if '.png' in str(file) and not os.path.exists(str(file).replace('.png', '.jpg')):
@@ -153,16 +250,27 @@ class AssetManager:
             # if '.png' in str(file):
             #     continue
 
-            # get image category
-            image_category = str(file).split("backend/data/assets")[1].split("/")[0]
-            assets.append({
+            stat = file.stat()
+            yield {
                 "image_path": str(file),
                 "image_name": file.name,
                 "image_type": file.suffix.lower(),
-                "image_category": image_category
-            })
-        
-        return assets
+                "image_category": self.image_category(file),
+                "image_mtime": stat.st_mtime,
+                "image_size": stat.st_size
+            }
+
+    def image_category(self, path):
+        """
+        Return an image's category, the top-level directory under the asset
+        root it lives in (e.g. "bg"), or "" for files outside any category.
+        """
+        path = Path(path)
+        try:
+            parts = path.relative_to(self.asset_path).parts
+        except ValueError:
+            return path.parent.name
+        return parts[0] if len(parts) > 1 else ""
 
     def parse_audio_assets(self):
         """
@@ -170,54 +278,113 @@ class AssetManager:
         """
         pass
 
-    def embed_image_assets(self, image_assets: list, infer_metadata: bool = True):
+    def embed_image_assets(self, image_assets: list, infer_metadata: bool = True, batch_size: int = settings.IMAGE_EMBED_BATCH_SIZE, caption_concurrency: int = settings.CAPTION_CONCURRENCY):
         """
         Embed image assets and index them in the database.
+        """
+        embedded = []
+        for batch in self.iter_embedded_assets(image_assets, infer_metadata=infer_metadata, batch_size=batch_size, caption_concurrency=caption_concurrency):
+            embedded.extend(batch)
+        return embedded
 
-        TODO: Figure out how to reduce latency of metadata extraction - quantize vlm?
+    def iter_embedded_assets(self, image_assets, infer_metadata: bool = True, batch_size: int = settings.IMAGE_EMBED_BATCH_SIZE, caption_concurrency: int = settings.CAPTION_CONCURRENCY):
         """
-        failed = 0
+        Yield batches of embedded image assets from any iterable of assets.
+
+        Images are decoded and embedded batch_size at a time, so each batch is
+        a single forward pass through the image tower. Assets already in the
+        embedding cache skip decoding, embedding and captioning entirely.
+
+        Captions are requested from the VLM by a pool of caption_concurrency
+        threads, so up to that many requests are in flight while the main
+        thread decodes and embeds. Captioning of batch i+1 starts before batch i
+        is yielded, which keeps at most two batches in memory. Batches (and
+        assets within them) are yielded in input order.
+        """
+        prompt = CAPTION_PROMPT if infer_metadata else ""
         if infer_metadata:
             print("Inferring metadata for image assets...")
-        for asset in tqdm(image_assets):
-            # try:
-            image = Image.open(asset['image_path']).convert('RGB')
-
-            embedding = self.image_text_embedder.embed_image(image)
+        pending = deque()
+        with tqdm(unit="img") as pbar, ThreadPoolExecutor(max_workers=caption_concurrency) as executor:
+            for batch in _batched(image_assets, batch_size):
+                misses = []
+                for asset in batch:
+                    if 'image_hash' not in asset:
+                        asset['image_hash'] = file_hash(asset['image_path'])
+                    asset['cache_key'] = self.embedding_cache.key(asset['image_hash'], prompt)
+                    cached = self.embedding_cache.get(asset['cache_key'])
+                    if cached is None:
+                        misses.append(asset)
+                        continue
+                    embedding, metadata_extracted = cached
+                    asset['image_embedding'] = embedding.tolist()
+                    asset['image_metadata'] = metadata_extracted
+
+                # start captioning before embedding, so the two overlap
+                captions = []
+                if infer_metadata:
+                    captions = [executor.submit(self._caption_image, asset['image_path']) for asset in misses]
+
+                embeddings = []
+                if misses:
+                    images = [Image.open(asset['image_path']).convert('RGB') for asset in misses]
+                    embeddings = self.image_text_embedder.embed_images(images, batch_size=batch_size)
+                    del images
+
+                # only look ahead when there are captions to overlap with
+                pending.append((batch, misses, embeddings, captions))
+                if len(pending) > (1 if infer_metadata else 0):
+                    finished = self._finish_embedded_batch(*pending.popleft())
+                    pbar.update(len(finished))
+                    yield finished
+
+            while pending:
+                finished = self._finish_embedded_batch(*pending.popleft())
+                pbar.update(len(finished))
+                yield finished
+
+    def _finish_embedded_batch(self, batch: list, misses: list, embeddings, captions: list):
+        """
+        Wait for a batch's captions, combine them with the image embeddings
+        and write the results to the embedding cache.
+        """
+        for i, (asset, embedding) in enumerate(zip(misses, embeddings)):
             metadata_extracted = "No extracted metadata"
-            if infer_metadata:
-                # use llm to infer metadata
-                metadata_extraction_prompt = """
-                You are an expert metadata and keyword captioner. Explain this image in 1 sentence, with as little filler as possible. Do not write anything other than your most important keyword metadata.
-                """
-                with open(asset['image_path'], 'rb') as f:
-                    image_b64 = base64.b64encode(f.read()).decode('utf-8')
-                
-                metadata = self.vlm_adapter.chat_chunk(messages=[
-                    {
-                        "role": "user", 
-                        "content": metadata_extraction_prompt,
-                        'images': [image_b64]
-                    }
-                ])
-                # print(metadata)
-                metadata_extracted = metadata['message']['content']
-                # print(metadata_extracted)
+            if captions:
+                metadata_extracted = captions[i].result()
                 # embed metadata
                 metadata_embedding = self.image_text_embedder.embed_text(metadata_extracted)
+                metadata_embedding = metadata_embedding.cpu().numpy()[0]
 
                 # hybrid embedding
                 embedding = 0.3*embedding + 0.7*metadata_embedding
                 embedding = metadata_embedding
 
-            asset['image_embedding'] = embedding.cpu().tolist()[0]
+            self.embedding_cache.put(asset['cache_key'], embedding, metadata_extracted)
+            asset['image_embedding'] = embedding.tolist()
             asset['image_metadata'] = metadata_extracted
-            # except Exception as e:
-            #     print(f"Failed to embed asset {asset['image_path']}: {e}")
-            #     failed += 1
-        
-        print(f"Failed to embed {failed} assets")
-        return image_assets
+
+        if misses:
+            self.embedding_cache.flush()
+        return batch
+
+    def _caption_image(self, image_path: str):
+        """
+        Use the VLM to infer keyword metadata for an image.
+
+        TODO: Figure out how to reduce latency of metadata extraction - quantize vlm?
+        """
+        with open(image_path, 'rb') as f:
+            image_b64 = base64.b64encode(f.read()).decode('utf-8')
+
+        metadata = self._vlm("caption").chat_chunk(messages=[
+            {
+                "role": "user", 
+                "content": CAPTION_PROMPT,
+                'images': [image_b64]
+            }
+        ])
+        return metadata['message']['content']
 
     def embed_audio_assets(self):
         """
@@ -225,23 +392,183 @@ class AssetManager:
         """
         pass
 
-    def add_assets(self, asset_path: Path):
+    def add_assets(self, asset_path: Path, infer_metadata: bool = True, batch_size: int = settings.IMAGE_EMBED_BATCH_SIZE):
         """
         Add new assets to the database, if user provides new assets.
+
+        Only files under asset_path that aren't already indexed are embedded.
+
+        Args:
+            asset_path: Directory containing the new assets
         """
-        pass 
+        return self._sync_image_assets(asset_path, remove_missing=False, infer_metadata=infer_metadata, batch_size=batch_size)
 
-    def reindex_assets(self):
+    def reindex_assets(self, infer_metadata: bool = True, batch_size: int = settings.IMAGE_EMBED_BATCH_SIZE):
         """
         Reindex assets in the database, if user rearranges directory structure.
+
+        Compares the asset directory against the manifest stored with each
+        image (path, mtime, size, hash). New files are embedded and inserted,
+        deleted files are dropped, and moved files keep their embedding. The
+        vector index is updated in place.
         """
-        pass
+        return self._sync_image_assets(self.asset_path, remove_missing=True, infer_metadata=infer_metadata, batch_size=batch_size)
+
+    def watch_assets(self, interval: float = 2.0, stop_event: threading.Event = None, infer_metadata: bool = True):
+        """
+        Poll the asset directory and reindex whenever a file is added, removed
+        or modified. Blocks until stop_event is set.
+        """
+        stop_event = stop_event or threading.Event()
+        snapshot = None
+        while not stop_event.is_set():
+            current = {
+                asset['image_path']: (asset['image_mtime'], asset['image_size']) 
+                for asset in self.iter_image_assets()
+            }
+            if snapshot is not None and current != snapshot:
+                print(f"Asset directory changed: {self.reindex_assets(infer_metadata=infer_metadata)}")
+            snapshot = current
+            stop_event.wait(interval)
+
+    def start_watching(self, interval: float = 2.0, infer_metadata: bool = True):
+        """
+        Run watch_assets in a daemon thread. Set the returned event to stop.
+        """
+        stop_event = threading.Event()
+        threading.Thread(
+            target=self.watch_assets, 
+            kwargs={"interval": interval, "stop_event": stop_event, "infer_metadata": infer_metadata},
+            daemon=True
+        ).start()
+        return stop_event
+
+    def _sync_image_assets(self, asset_path: Path, remove_missing: bool, infer_metadata: bool = True, batch_size: int = settings.IMAGE_EMBED_BATCH_SIZE):
+        """
+        Bring the Image table in line with the files under asset_path.
+
+        Returns:
+            Counts of added, removed, moved and updated images
+        """
+        with self._sync_lock:
+            checkpoint = self._db.get_checkpoint("image_ingest")
+            if checkpoint is None or checkpoint["status"] != "complete":
+                # nothing indexed yet, or an interrupted build to resume
+                self.load_assets(infer_metadata=infer_metadata, batch_size=batch_size)
+                return {"added": self._db.count("Image"), "removed": 0, "moved": 0, "updated": 0}
+
+            indexed = {
+                row['image_path']: row 
+                for row in self._db.get_rows("Image", ["image_path", "image_hash", "image_mtime", "image_size"])
+            }
+            on_disk = {asset['image_path']: asset for asset in self.iter_image_assets(asset_path)}
+
+            # same path with unchanged mtime/size is assumed unchanged
+            new, updated = [], []
+            for path, asset in on_disk.items():
+                row = indexed.get(path)
+                if row is None:
+                    new.append(asset)
+                elif (row['image_mtime'], row['image_size']) != (asset['image_mtime'], asset['image_size']):
+                    asset['image_hash'] = file_hash(path)
+                    if asset['image_hash'] == row['image_hash']:
+                        updated.append({"key": path, "image_mtime": asset['image_mtime'], "image_size": asset['image_size']})
+                    else:
+                        new.append(asset)
+
+            missing = {path: row for path, row in indexed.items() if path not in on_disk} if remove_missing else {}
+            missing_by_hash = {row['image_hash']: path for path, row in missing.items()}
+
+            # new files whose content matches a missing file were moved
+            moved, added = [], []
+            for asset in new:
+                if asset['image_path'] in indexed:
+                    added.append(asset) # content changed in place
+                    continue
+                asset['image_hash'] = file_hash(asset['image_path'])
+                old_path = missing_by_hash.pop(asset['image_hash'], None)
+                if old_path is None:
+                    added.append(asset)
+                    continue
+                del missing[old_path]
+                moved.append({
+                    "key": old_path,
+                    "image_path": asset['image_path'],
+                    "image_name": asset['image_name'],
+                    "image_type": asset['image_type'],
+                    "image_category": asset['image_category'],
+                    "image_mtime": asset['image_mtime'],
+                    "image_size": asset['image_size']
+                })
+
+            try:
+                self._db.update_rows("Image", "image_path", moved + updated)
+                self._db.delete_rows("Image", "image_path", list(missing) + [asset['image_path'] for asset in added if asset['image_path'] in indexed])
+                for batch in self.iter_embedded_assets(added, infer_metadata=infer_metadata, batch_size=batch_size):
+                    self._db.bulk_insert("Image", [_image_row(asset) for asset in batch])
+            finally:
+                self._db.flush()
+                # after every write, searches during the sync may have cached a partial index
+                self._invalidate_search_cache()
+
+            return {"added": len(added), "removed": len(missing), "moved": len(moved), "updated": len(updated)}
 
     def build_asset_request(self, query: str):
         """
         Build asset request from query.
+
+        The VLM rewrite is cached by (model, normalized query), so repeated
+        scene lines don't block on the VLM again.
         """
+        rewrite = self._rewrite_cache.get(self._rewrite_key(query))
+        if rewrite is None:
+            rewrite = self._rewrite_query(query)
+        return _asset_requests(rewrite)
 
+    def retrieve_scene_assets(self, query: str, k: int = 5, deadline: Union[float, None] = None):
+        """
+        Retrieve background image candidates for a scene line without waiting
+        on the VLM rewrite for more than deadline seconds (REWRITE_DEADLINE).
+
+        On a rewrite cache miss the raw line is embedded and searched while
+        the rewrite runs. If the rewrite lands in time its refined results are
+        returned, otherwise the raw-query results are. A late rewrite still
+        finishes in the background and is cached for the next request.
+
+        Returns:
+            Dict with image_assets, the image_query and audio_query used
+            (audio_query is None if the rewrite missed), and whether the
+            results are refined
+        """
+        deadline = settings.REWRITE_DEADLINE if deadline is None else deadline
+        start = time.perf_counter()
+        rewrite = self._rewrite_cache.get(self._rewrite_key(query))
+        if rewrite is None:
+            future = self._rewrite_executor.submit(self._rewrite_query, query)
+            raw_assets = self.search_image_assets(AssetRequest(asset_type="image", query=query, asset_category="bg"), k=k)
+            try:
+                rewrite = future.result(timeout=max(0.0, deadline - (time.perf_counter() - start)))
+            except FuturesTimeoutError:
+                rewrite = None
+            except Exception as e:
+                print(f"Query rewrite failed, using raw query: {e}")
+                rewrite = None
+            if rewrite is None:
+                return {"image_assets": raw_assets, "image_query": query, "audio_query": None, "refined": False}
+
+        requests = _asset_requests(rewrite)
+        return {
+            "image_assets": self.search_image_assets(requests["image"], k=k),
+            "image_query": requests["image"].query,
+            "audio_query": requests["audio"].query,
+            "refined": True
+        }
+
+    def _rewrite_query(self, query: str):
+        """
+        Ask the VLM to rewrite a scene line into image and audio queries, and
+        cache the result.
+        """
         metadata_extraction_prompt = """
         You are an expert metadata and keyword captioner. Rewrite the query in 1 sentence, with as little filler as possible. Isolate the setting for background image selection and the type of feeling that should be evoked by the audio that should be played. Do not write anything other than your most important keyword metadata.
 
@@ -251,57 +578,164 @@ class AssetManager:
         - image_query: the rewritten query for image selection
         - audio_query: the rewritten query for audio selection
         """
-        response = self.vlm_adapter.chat_chunk(messages=[
+        response = self._vlm("rewrite").chat_chunk(messages=[
             {
                 "role": "user", 
                 "content": metadata_extraction_prompt.format(query=query)
             }
         ],
         _format="json")
-        image_query = json.loads(response['message']['content'])['image_query']
-        audio_query = json.loads(response['message']['content'])['audio_query']
-
-        assets = {
-            "image": AssetRequest(
-                asset_type="image",
-                query=image_query,
-                asset_category="bg"
-            ),
-            "audio": AssetRequest(
-                asset_type="audio",
-                query=audio_query
-            )
-        }
+        content = json.loads(response['message']['content'])
+        rewrite = {"image_query": content['image_query'], "audio_query": content['audio_query']}
+        self._rewrite_cache.put(self._rewrite_key(query), rewrite)
+        return rewrite
+
+    def _vlm(self, priority: str):
+        """
+        Return the VLM adapter, scheduled under priority if there's a scheduler.
+        """
+        if self.llm_scheduler is None:
+            return self.vlm_adapter
+        return ScheduledAdapter(self.vlm_adapter, self.llm_scheduler, priority)
 
-        return assets
+    def _rewrite_key(self, query: str):
+        return (self.vlm_adapter.model if self.vlm_adapter else None, _normalize_query(query))
 
     def search_image_assets(self, asset_request: AssetRequest, k: int = 5):
         """
         Search image assets in the database.
+
+        Results are cached by (query, k, category, efs) until the index
+        changes. efs comes from the request, or HNSW_EFS.
         """
+        return self.search_image_assets_batch([asset_request], k=k)[0]
 
-        embedding = self.image_text_embedder.embed_text(asset_request.query)
-        embedding = embedding.cpu().tolist()[0]
-
-        response = self._conn.execute(
-            f"""
-            CALL QUERY_VECTOR_INDEX(
-                'Image',
-                'image_index',
-                $embedding,
-                $k,
-                efs:=550
-            )
-            RETURN node.image_path, node.image_metadata, distance
-            ORDER BY distance;
-            """,
-            {"embedding": embedding, "k": k}
+    def search_image_assets_batch(self, asset_requests: list, k: int = 5):
+        """
+        Search image assets for several requests at once. Cache misses are
+        encoded in one text-model pass and looked up in the database together.
+
+        Returns:
+            One list of results per request, in request order
+        """
+        efs = [settings.HNSW_EFS if request.efs is None else request.efs for request in asset_requests]
+        keys = [
+            (self._index_generation, _normalize_query(request.query), k, request.asset_category, request_efs)
+            for request, request_efs in zip(asset_requests, efs)
+        ]
+        results = [self._search_cache.get(key) for key in keys]
+        misses = [i for i, res in enumerate(results) if res is None]
+        if misses:
+            embeddings = dict(zip(misses, self.embed_queries([asset_requests[i].query for i in misses])))
+            responses = {}
+            for group_efs in dict.fromkeys(efs[i] for i in misses):
+                group = [i for i in misses if efs[i] == group_efs]
+                responses.update(zip(group, self._db.query_vector_index_batch(
+                    "Image", "image_index", [embeddings[i] for i in group], k,
+                    columns=["image_path", "image_metadata"],
+                    efs=group_efs,
+                    filters=[
+                        {"image_category": asset_requests[i].asset_category} if asset_requests[i].asset_category else None
+                        for i in group
+                    ]
+                )))
+            for i, response in responses.items():
+                results[i] = [{
+                    'node.image_path': row["image_path"],
+                    'node.image_metadata': row["image_metadata"],
+                    'distance': row["distance"]
+                } for row in response]
+                self._search_cache.put(keys[i], results[i])
+
+        return [
+            [{**row, 'query': request.query} for row in res]
+            for request, res in zip(asset_requests, results)
+        ]
+
+    def embed_query(self, query: str):
+        """
+        Return the query embedding as a list, cached by (model, normalized query).
+        """
+        return self.embed_queries([query])[0]
+
+    def embed_queries(self, queries: list):
+        """
+        Return a list of query embeddings, encoding all uncached queries in
+        one embed_texts call.
+        """
+        keys = [
+            (settings.IMAGE_TEXT_MODEL_ID, settings.QUERY_ENCODER, settings.QUERY_ENCODER_QUANTIZE, _normalize_query(query))
+            for query in queries
+        ]
+        embeddings = {key: self._query_embedding_cache.get(key) for key in dict.fromkeys(keys)}
+        uncached = {key: query for key, query in zip(keys, queries) if embeddings[key] is None}
+        if uncached:
+            encoded = self.text_embedder.embed_texts(list(uncached.values())).cpu().tolist()
+            for key, embedding in zip(uncached, encoded):
+                embeddings[key] = embedding
+                self._query_embedding_cache.put(key, embedding)
+        return [embeddings[key] for key in keys]
+
+    def cache_stats(self):
+        """
+        Return hit/miss counters for the query embedding, search and rewrite caches.
+        """
+        return {
+            "query_embedding": self._query_embedding_cache.stats(),
+            "search_results": self._search_cache.stats(),
+            "query_rewrites": self._rewrite_cache.stats(),
+            "index_generation": self._index_generation
+        }
+
+    def _invalidate_search_cache(self):
+        """
+        Drop cached search results once the index has changed. Call it after
+        the last write: a search keys its results by the generation it
+        started under, so one that overlapped the writes can't repopulate
+        the cache under the new generation.
+        """
+        self._index_generation += 1
+        self._search_cache.clear()
+
+def _normalize_query(query: str):
+    return " ".join(query.lower().split())
+
+def _asset_requests(rewrite: dict):
+    return {
+        "image": AssetRequest(
+            asset_type="image",
+            query=rewrite["image_query"],
+            asset_category="bg"
+        ),
+        "audio": AssetRequest(
+            asset_type="audio",
+            query=rewrite["audio_query"]
         )
-        res = []
-        for row in response.rows_as_dict():
-            row['query'] = asset_request.query
-            res.append(row)
-        return res
+    }
+
+def _image_row(asset: dict):
+    """
+    Return the Image table columns for an embedded asset.
+    """
+    return {
+        "image_path": asset['image_path'],
+        "image_name": asset['image_name'],
+        "image_type": asset['image_type'],
+        "image_category": asset['image_category'],
+        "image_embedding": asset['image_embedding'],
+        "image_metadata": asset['image_metadata'],
+        "image_hash": asset['image_hash'],
+        "image_mtime": asset['image_mtime'],
+        "image_size": asset['image_size']
+    }
+
+def _batched(iterable, n: int):
+    """
+    Yield lists of up to n items from any iterable.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, n)):
+        yield batch
 
 if __name__ == "__main__":
     asset_manager = AssetManager()
@@ -0,0 +1,76 @@
+# ------------------------------------------------------------------------
+# Lazy Components
+#
+# Heavy dependencies (embedding models, database connections) are wrapped
+# so they load on first use or during background warm-up, rather than at
+# import time, and report how long they took for the readiness endpoint.
+# ------------------------------------------------------------------------
+
+import time
+import threading
+from typing import Callable, Any, Union
+
+class LazyComponent:
+    """
+    Load a component with factory() the first time get() is called.
+
+    Concurrent callers block on the same load rather than loading twice.
+    """
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self.factory = factory
+        self.load_seconds = None
+        self.error = None
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def of(cls, name: str, value: Any):
+        """
+        Wrap an already-constructed value, e.g. to inject one in tests.
+        """
+        component = cls(name, lambda: value)
+        component.get()
+        return component
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                start = time.perf_counter()
+                try:
+                    self._value = self.factory()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.load_seconds = time.perf_counter() - start
+                self.error = None
+                self._loaded = True
+        return self._value
+
+    def status(self):
+        return {
+            "loaded": self._loaded,
+            "load_seconds": self.load_seconds,
+            "error": self.error
+        }
+
+def warm_up(components: list, stop: Union[threading.Event, None] = None):
+    """
+    Load each component in turn, recording (not raising) failures so one
+    broken component doesn't stop the rest from loading. Once stop is set
+    (e.g. on shutdown), no further components are loaded.
+    """
+    for component in components:
+        if stop is not None and stop.is_set():
+            return
+        try:
+            component.get()
+        except Exception as e:
+            print(f"Failed to load {component.name}: {e}")
@@ -0,0 +1,113 @@
+# ------------------------------------------------------------------------
+# Embedding Cache
+#
+# Content-addressed on-disk cache of asset embeddings and VLM captions, so
+# rebuilding the database doesn't re-run models on files we've already seen.
+# - vectors live in a memory-mapped float32 matrix (vectors.f32)
+# - index.json maps cache keys to rows in that matrix, plus the caption
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import json
+import hashlib
+import threading
+import numpy as np
+from pathlib import Path
+from app.config import settings
+
+def file_hash(path):
+    """
+    Return the sha256 hex digest of a file's content.
+    """
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by (file content hash, model id, caption prompt).
+
+    Rows are only ever appended, and index.json is rewritten atomically on
+    flush, so a crash never leaves the index pointing at a missing row.
+    """
+    def __init__(self, cache_path: Path = settings.EMBEDDING_CACHE_PATH, dim: int = settings.IMAGE_TEXT_DIM, model_id: str = settings.IMAGE_TEXT_MODEL_ID, grow_by: int = 1024):
+        self.cache_path = Path(cache_path)
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.model_id = model_id
+        self.grow_by = grow_by
+
+        self._vectors_path = self.cache_path / "vectors.f32"
+        self._index_path = self.cache_path / "index.json"
+        self._lock = threading.Lock()
+
+        self._index = {}
+        if self._index_path.exists():
+            with open(self._index_path, 'r') as f:
+                self._index = json.load(f)
+        self._n_rows = max((entry["row"] + 1 for entry in self._index.values()), default=0)
+
+        capacity = 0
+        if self._vectors_path.exists():
+            capacity = self._vectors_path.stat().st_size // (4 * dim)
+        self._vectors = None
+        self._resize(max(capacity, self._n_rows, grow_by))
+
+    def key(self, content_hash: str, prompt: str = ""):
+        """
+        Return the cache key for a file's content hash (see file_hash), the
+        model and the caption prompt.
+        """
+        return hashlib.sha256(f"{content_hash}:{self.model_id}:{prompt}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """
+        Return (embedding, caption) for a key, or None on a miss.
+        """
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        return np.array(self._vectors[entry["row"]]), entry["caption"]
+
+    def put(self, key: str, embedding, caption: str):
+        """
+        Append an embedding and caption. Call flush() to persist the index.
+        """
+        with self._lock:
+            if key in self._index:
+                return
+            if self._n_rows >= len(self._vectors):
+                self._resize(len(self._vectors) + self.grow_by)
+            self._vectors[self._n_rows] = np.asarray(embedding, dtype=np.float32)
+            self._index[key] = {"row": self._n_rows, "caption": caption}
+            self._n_rows += 1
+
+    def flush(self):
+        """
+        Flush vectors to disk, then atomically replace the index file.
+        """
+        with self._lock:
+            self._vectors.flush()
+            tmp_path = self._index_path.with_suffix(".json.tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(self._index, f)
+            os.replace(tmp_path, self._index_path)
+
+    def __contains__(self, key: str):
+        return key in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def _resize(self, n_rows: int):
+        """
+        Grow the backing file to n_rows and re-open the memory map.
+        """
+        if self._vectors is not None:
+            self._vectors.flush()
+        with open(self._vectors_path, 'ab') as f:
+            f.truncate(n_rows * self.dim * 4)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r+', shape=(n_rows, self.dim))
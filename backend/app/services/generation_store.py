@@ -0,0 +1,135 @@
+# ------------------------------------------------------------------------
+# Generation Store
+#
+# Persistent memo of story generations, so rolling back to an earlier
+# scene and replaying a choice doesn't pay for the same generation again.
+# Entries are keyed by a hash of the story, model, options and the exact
+# prompt, and live in a sqlite file that every worker (and every session
+# of a story) shares. Least recently used entries are evicted past
+# max_entries.
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import List, Dict, Union
+from app.config import settings
+
+class GenerationStore:
+    """
+    Args:
+        db_path: sqlite file, created if missing
+        max_entries: Generations kept, least recently used are evicted
+    """
+    def __init__(self, db_path: Path = settings.GENERATION_STORE_PATH, max_entries: int = settings.GENERATION_STORE_SIZE):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.n_stored = 0
+        self.n_evicted = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # WAL lets other workers read while one writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS Generation(
+                key TEXT PRIMARY KEY,
+                story_id TEXT,
+                text TEXT,
+                created REAL,
+                used REAL,
+                n_hits INTEGER DEFAULT 0
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS Generation_used ON Generation(used)")
+        self.conn.commit()
+
+    def key(self, story_id: str, model: Union[str, None], options: Dict, messages: List[Dict[str, str]]):
+        """
+        Return the key of a generation: sha256 of the story, model, options
+        and messages, so a replay only hits if the prompt is byte-identical.
+        """
+        payload = json.dumps([story_id, model, options, messages], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """
+        Return the stored text for a key, or None on a miss.
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT text FROM Generation WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE Generation SET used = ?, n_hits = n_hits + 1 WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, story_id: str, text: str):
+        """
+        Store a generation, evicting the least recently used past max_entries.
+        """
+        if self.max_entries <= 0 or not text:
+            return
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO Generation(key, story_id, text, created, used) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET text = excluded.text, used = excluded.used",
+                (key, story_id, text, now, now)
+            )
+            self.n_stored += 1
+            # counted here rather than kept in memory, other workers insert too
+            excess = self.conn.execute("SELECT COUNT(*) FROM Generation").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.conn.execute("DELETE FROM Generation WHERE key IN (SELECT key FROM Generation ORDER BY used LIMIT ?)", (excess,))
+                self.n_evicted += excess
+            self.conn.commit()
+
+    def forget(self, story_id: str):
+        """
+        Drop a story's stored generations, e.g. when it's deleted.
+        """
+        with self._lock:
+            self.conn.execute("DELETE FROM Generation WHERE story_id = ?", (story_id,))
+            self.conn.commit()
+
+    def stats(self):
+        with self._lock:
+            n_entries = self.conn.execute("SELECT COUNT(*) FROM Generation").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stored": self.n_stored,
+            "evicted": self.n_evicted,
+            "entries": n_entries
+        }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM Generation").fetchone()[0]
+
+def deterministic(options: Dict):
+    """
+    Whether Ollama samples the same output for the same prompt with these
+    options: greedy decoding (temperature 0) or a fixed seed.
+    """
+    return options.get("temperature") == 0 or options.get("seed") is not None
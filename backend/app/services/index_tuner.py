@@ -0,0 +1,157 @@
+# ------------------------------------------------------------------------
+# Vector Index Tuner
+#
+# Sweep HNSW construction parameters and search-time efs over a sample of
+# queries, measuring recall@k against exact ground truth and p50/p99
+# latency, then save the chosen operating point to the .env config
+# (VECTOR_INDEX_PARAMS, HNSW_EFS).
+#
+# Run with: python backend/app/services/index_tuner.py --target-recall 0.95 --save
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import json
+import time
+import argparse
+import uuid
+import itertools
+import numpy as np
+from pathlib import Path
+from app.database import DB, KuzuDB, get_db, default_db_path
+from app.config import settings
+
+# construction grids per backend, every combination is built once
+KUZU_GRID = {"mu": [15, 30, 60], "efc": [100, 200, 400]}
+FAISS_GRID = {"M": [16, 32, 64], "efc": [100, 200, 400]}
+EFS_GRID = [16, 32, 64, 128, 256, 550, 1024]
+
+def default_grid(db: DB):
+    if isinstance(db, KuzuDB):
+        # kuzu's lower layer allows twice the upper layer's degree by default
+        return [{**params, "ml": 2 * params["mu"]} for params in _combinations(KUZU_GRID)]
+    return [{"index_type": "hnsw", **params} for params in _combinations(FAISS_GRID)]
+
+def sample_queries(db: DB, table_name: str, column: str, n: int, seed: int = 0):
+    """
+    Sample stored embeddings to use as queries. Each query's own row is left
+    out of its ground truth, see exact_neighbours.
+    """
+    embeddings = np.asarray(db.get_column(table_name, column), dtype=np.float32)
+    rows = np.random.default_rng(seed).choice(len(embeddings), size=min(n, len(embeddings)), replace=False)
+    return embeddings, embeddings[rows], rows
+
+def exact_neighbours(embeddings, queries, k: int, exclude=None):
+    """
+    Return the row ids of each query's k nearest embeddings by cosine
+    similarity, optionally excluding one row per query (its own).
+    """
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    scores = queries @ embeddings.T
+    if exclude is not None:
+        scores[np.arange(len(queries)), exclude] = -np.inf
+    return np.argsort(-scores, axis=1)[:, :k]
+
+def tune(db: DB, table_name: str, column: str, key_column: str, queries, truth: list, k: int, grid: list = None, efs_grid: list = EFS_GRID, exclude: list = None):
+    """
+    Build a scratch index for each construction config and query it at each
+    efs. The live index is left untouched. Scratch indexes get unique names,
+    since kuzu can't re-create an index under a dropped index's name.
+
+    Args:
+        queries: (n, dim) query embeddings
+        truth: Set of expected key_column values per query
+        exclude: Key to drop from each query's results (the query's own row)
+
+    Returns:
+        One dict per (construction params, efs) with recall, p50_ms, p99_ms
+        and build_seconds
+    """
+    results = []
+    run = uuid.uuid4().hex[:8]
+    for n, params in enumerate(grid or default_grid(db)):
+        index_name = f"{table_name.lower()}_tune_{run}_{n}"
+        start = time.perf_counter()
+        db.create_vector_index(table_name, index_name, column, **params)
+        build_seconds = time.perf_counter() - start
+
+        for efs in efs_grid:
+            latencies, recalls = [], []
+            for i, (query, expected) in enumerate(zip(queries, truth)):
+                start = time.perf_counter()
+                res = db.query_vector_index(table_name, index_name, query.tolist(), k + 1, columns=[key_column], efs=efs)
+                latencies.append(time.perf_counter() - start)
+                found = [row[key_column] for row in res if exclude is None or row[key_column] != exclude[i]][:k]
+                recalls.append(len(expected & set(found)) / k)
+            results.append({
+                "params": {name: value for name, value in params.items() if name != "index_type"},
+                "efs": efs,
+                "recall": float(np.mean(recalls)),
+                "p50_ms": float(np.percentile(latencies, 50) * 1000),
+                "p99_ms": float(np.percentile(latencies, 99) * 1000),
+                "build_seconds": build_seconds
+            })
+        db.drop_vector_index(table_name, index_name)
+    return results
+
+def choose_operating_point(results: list, target_recall: float):
+    """
+    Return the fastest (by p50) result reaching target_recall, breaking ties
+    by build time, or the highest-recall result if none reach it.
+    """
+    reached = [result for result in results if result["recall"] >= target_recall]
+    if not reached:
+        return max(results, key=lambda result: (result["recall"], -result["p50_ms"]))
+    return min(reached, key=lambda result: (result["p50_ms"], result["build_seconds"]))
+
+def save_to_env(values: dict, env_path: Path = Path(settings.model_config["env_file"])):
+    """
+    Set keys in a .env file, keeping every other line as is.
+    """
+    env_path = Path(env_path)
+    lines = env_path.read_text().splitlines() if env_path.exists() else []
+    remaining = dict(values)
+    for i, line in enumerate(lines):
+        name = line.split("=", 1)[0].strip()
+        if name in remaining:
+            lines[i] = f"{name}={_env_value(remaining.pop(name))}"
+    lines += [f"{name}={_env_value(value)}" for name, value in remaining.items()]
+    env_path.write_text("\n".join(lines) + "\n")
+
+def _env_value(value):
+    return json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+
+def _combinations(grid: dict):
+    return [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=settings.DB_TYPE, choices=["kuzu", "numpy"])
+    parser.add_argument("--db-path", type=Path, default=None)
+    parser.add_argument("--queries", type=int, default=200, help="stored embeddings sampled as queries")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--efs", type=int, nargs="+", default=EFS_GRID)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--save", action="store_true", help="write the chosen point to .env")
+    args = parser.parse_args()
+
+    db = get_db(db_type=args.db, db_path=args.db_path or default_db_path(args.db))
+    embeddings, queries, rows = sample_queries(db, "Image", "image_embedding", args.queries)
+    paths = db.get_column("Image", "image_path")
+    truth = [{paths[i] for i in neighbours} for neighbours in exact_neighbours(embeddings, queries, args.k, exclude=rows)]
+
+    results = tune(db, "Image", "image_embedding", "image_path", queries, truth, args.k, efs_grid=args.efs, exclude=[paths[i] for i in rows])
+    print(f"{'params':>36} {'efs':>5} {'recall':>7} {'p50 (ms)':>9} {'p99 (ms)':>9} {'build (s)':>10}")
+    for result in results:
+        print(f"{json.dumps(result['params']):>36} {result['efs']:>5} {result['recall']:>7.3f} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['build_seconds']:>10.2f}")
+
+    best = choose_operating_point(results, args.target_recall)
+    print(f"Chosen: {json.dumps(best['params'])} efs={best['efs']} recall={best['recall']:.3f} p50={best['p50_ms']:.2f}ms")
+    if args.save:
+        save_to_env({"VECTOR_INDEX_PARAMS": best["params"], "HNSW_EFS": best["efs"]})
+        # efs applies on restart, construction params the next time image_index is built
+        print(f"Saved to {settings.model_config['env_file']}, rebuild the database to apply VECTOR_INDEX_PARAMS")
@@ -0,0 +1,260 @@
+# ------------------------------------------------------------------------
+# LLM Scheduler
+#
+# Story generation and asset captioning/rewrites share one Ollama. Ollama
+# serves requests first come, first served, so a bulk captioning run
+# queues players' streams behind hundreds of images. The scheduler sits in
+# front of the adapters and decides which request goes next: at most
+# max_in_flight requests reach Ollama at once (set it to Ollama's
+# OLLAMA_NUM_PARALLEL), a freed slot goes to the highest priority class
+# with a request waiting, and each class has its own concurrency limit and
+# queue bound. Requests can't be preempted once sent, so a few slots are
+# reserved for interactive ones, and a player arriving mid-captioning
+# doesn't wait for a caption to finish. It's thread-safe and serves sync
+# callers (AssetManager's thread pools) and async ones (GraphRAG) alike.
+# ------------------------------------------------------------------------
+
+import time
+import asyncio
+import threading
+import contextlib
+from collections import deque
+from typing import Dict, List, Union
+from app.models.llm_wrapper import LLMAdapter
+from app.services.stream_metrics import percentiles
+from app.config import settings
+
+# highest priority first
+PRIORITIES = ["interactive", "rewrite", "speculative", "caption"]
+
+class LLMBusyError(Exception):
+    """
+    Raised when a request would have to wait behind max_queued others of
+    its priority class, rather than queueing it.
+    """
+    def __init__(self, priority: str, n_queued: int):
+        super().__init__(f"{n_queued} {priority} LLM requests already queued")
+        self.priority = priority
+        self.n_queued = n_queued
+
+class _Waiter:
+    """
+    One queued request, woken from whichever thread frees its slot.
+    """
+    def __init__(self, loop: Union[asyncio.AbstractEventLoop, None] = None):
+        self.enqueued = time.perf_counter()
+        self.granted = False
+        self._loop = loop
+        self._future = loop.create_future() if loop is not None else None
+        self._event = threading.Event() if loop is None else None
+
+    def grant(self):
+        self.granted = True
+        if self._loop is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(_resolve, self._future)
+
+    def wait(self):
+        self._event.wait()
+
+    async def await_grant(self):
+        await self._future
+
+class LLMScheduler:
+    """
+    Args:
+        max_in_flight: Requests sent to the LLM at once, across all classes
+        reserved: Slots of max_in_flight only the highest priority class
+            (interactive) may use
+        limits: Requests in flight per priority class, classes not listed
+            are only bound by max_in_flight
+        max_queued: Requests waiting per priority class before new ones
+            are rejected with LLMBusyError
+        window: Queue waits kept per class for the percentiles
+    """
+    def __init__(self, max_in_flight: int = settings.LLM_MAX_IN_FLIGHT, reserved: int = settings.LLM_RESERVED_SLOTS, limits: Dict[str, int] = settings.LLM_CLASS_CONCURRENCY, max_queued: Dict[str, int] = settings.LLM_CLASS_MAX_QUEUED, window: int = 1024):
+        self.max_in_flight = max_in_flight
+        self.reserved = min(reserved, max_in_flight - 1)
+        self.limits = {priority: limits.get(priority, max_in_flight) for priority in PRIORITIES}
+        self.max_queued = {priority: max_queued.get(priority) for priority in PRIORITIES}
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._in_flight = {priority: 0 for priority in PRIORITIES}
+        self._admitted = {priority: 0 for priority in PRIORITIES}
+        self._rejected = {priority: 0 for priority in PRIORITIES}
+        self._waits = {priority: deque(maxlen=window) for priority in PRIORITIES}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def slot(self, priority: str):
+        """
+        Block the calling thread until a request of this priority may run,
+        and hold the slot for the block.
+        """
+        waiter = self._enqueue(priority, _Waiter())
+        waiter.wait()
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, priority: str):
+        """
+        Like slot(), waiting without blocking the event loop. A request
+        cancelled while queued (e.g. the player disconnected) gives up its
+        place.
+        """
+        waiter = self._enqueue(priority, _Waiter(asyncio.get_running_loop()))
+        try:
+            await waiter.await_grant()
+        except asyncio.CancelledError:
+            with self._lock:
+                if not waiter.granted:
+                    self._queues[priority].remove(waiter)
+                    raise
+            self._release(priority)
+            raise
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    def stats(self):
+        """
+        Return per class: requests in flight and queued, admitted and
+        rejected counts, and queue wait percentiles in ms.
+        """
+        with self._lock:
+            waits = {priority: list(self._waits[priority]) for priority in PRIORITIES}
+            stats = {
+                priority: {
+                    "in_flight": self._in_flight[priority],
+                    "queued": len(self._queues[priority]),
+                    "limit": self.limits[priority],
+                    "admitted": self._admitted[priority],
+                    "rejected": self._rejected[priority]
+                }
+                for priority in PRIORITIES
+            }
+        for priority in PRIORITIES:
+            stats[priority]["wait_ms"] = percentiles([wait * 1000 for wait in waits[priority]])
+        return {"max_in_flight": self.max_in_flight, "reserved": self.reserved, "classes": stats}
+
+    def _enqueue(self, priority: str, waiter: _Waiter):
+        if priority not in self._queues:
+            raise ValueError(f"Unknown LLM priority class {priority!r}, expected one of {PRIORITIES}")
+        with self._lock:
+            queue = self._queues[priority]
+            queue.append(waiter)
+            self._dispatch()
+            # only requests that would have to wait count against the bound
+            max_queued = self.max_queued[priority]
+            if not waiter.granted and max_queued is not None and len(queue) > max_queued:
+                queue.pop()
+                self._rejected[priority] += 1
+                raise LLMBusyError(priority, len(queue))
+        return waiter
+
+    def _release(self, priority: str):
+        with self._lock:
+            self._in_flight[priority] -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        """
+        Grant free slots to waiting requests, highest priority first. A
+        class at its own limit doesn't hold back the classes below it.
+        Called with the lock held.
+        """
+        n_in_flight = sum(self._in_flight.values())
+        n_background = n_in_flight - self._in_flight[PRIORITIES[0]]
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            background = priority != PRIORITIES[0]
+            while (
+                queue and n_in_flight < self.max_in_flight and self._in_flight[priority] < self.limits[priority]
+                and not (background and n_background >= self.max_in_flight - self.reserved)
+            ):
+                waiter = queue.popleft()
+                self._in_flight[priority] += 1
+                self._admitted[priority] += 1
+                self._waits[priority].append(time.perf_counter() - waiter.enqueued)
+                n_in_flight += 1
+                n_background += background
+                waiter.grant()
+            if n_in_flight >= self.max_in_flight:
+                return
+
+class ScheduledAdapter(LLMAdapter):
+    """
+    Sync adapter (e.g. OllamaAdapter) whose requests wait for a slot of
+    their priority class. A stream holds its slot until it's exhausted or
+    closed.
+    """
+    def __init__(self, adapter: LLMAdapter, scheduler: LLMScheduler, priority: str):
+        self.adapter = adapter
+        self.scheduler = scheduler
+        self.priority = priority
+
+    @property
+    def model(self):
+        return self.adapter.model
+
+    def with_priority(self, priority: str):
+        """
+        Return the same adapter scheduled under another priority class.
+        """
+        return type(self)(self.adapter, self.scheduler, priority)
+
+    def chat_stream(self, messages: List[Dict[str, str]], options: Dict[str, str] = {}, _format: Union[str, None] = None, session: Union[str, None] = None):
+        with self.scheduler.slot(self.priority):
+            yield from self.adapter.chat_stream(messages, options=options, _format=_format, session=session)
+
+    def chat_chunk(self, messages: List[Dict[str, str]], options: Dict[str, str] = {}, _format: Union[str, None] = None, session: Union[str, None] = None):
+        with self.scheduler.slot(self.priority):
+            return self.adapter.chat_chunk(messages, options=options, _format=_format, session=session)
+
+    def list_models(self):
+        return self.adapter.list_models()
+
+class AsyncScheduledAdapter(ScheduledAdapter):
+    """
+    Async adapter (e.g. AsyncOllamaAdapter) whose requests wait for a slot
+    of their priority class without blocking the event loop.
+    """
+    async def chat_stream(self, messages: List[Dict[str, str]], options: Dict[str, str] = {}, _format: Union[str, None] = None, session: Union[str, None] = None):
+        async with self.scheduler.aslot(self.priority):
+            stream = self.adapter.chat_stream(messages, options=options, _format=_format, session=session)
+            try:
+                async for line in stream:
+                    yield line
+            finally:
+                await stream.aclose()
+
+    async def chat_chunk(self, messages: List[Dict[str, str]], options: Dict[str, str] = {}, _format: Union[str, None] = None, session: Union[str, None] = None):
+        async with self.scheduler.aslot(self.priority):
+            return await self.adapter.chat_chunk(messages, options=options, _format=_format, session=session)
+
+    async def list_models(self):
+        return await self.adapter.list_models()
+
+    async def aclose(self):
+        await self.adapter.aclose()
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_llm_scheduler():
+    """
+    Return the process-wide scheduler, shared by the story and asset services.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,186 @@
+# ------------------------------------------------------------------------
+# Prompt Builder
+#
+# Assemble story generation prompts so successive turns share as long a
+# prefix as possible: Ollama keeps the KV cache of the previous prompt and
+# only prefills tokens after the first difference. The system message
+# holds the instructions and character sheets only, byte-identical for
+# the same cast, and everything that changes per turn follows it, roughly
+# from least to most volatile. The variable part is trimmed to a token
+# budget, dropping the oldest history a page at a time.
+# ------------------------------------------------------------------------
+
+import hashlib
+import threading
+from typing import List, Dict, Union
+from app.services.lru_cache import LRUCache
+from app.config import settings
+
+# Should follow Dialogic 2's 'timeline text syntax': https://docs.dialogic.pro/timeline-text-syntax.html
+# TODO: Express all timeline options or maybe return json and decode in frontend timeline
+INSTRUCTIONS = """You are a magnificent story-teller.
+
+Your goal is to generate the next chunk of text for the story based on the Player's chosen action.
+
+Choose ONE of the following:
+- Create one character's dialogue
+- Create one piece of narration
+- Create one set of choices for the player to choose from
+
+STRICT OUTPUT FORMAT (Dialogic 2.0's "Timeline Text Syntax"):
+1. Use "CharacterName: Dialogue" for speech. e.g. "John: Lovely to see you!"
+2. Replace "CharacterName" with "CharacterName (CharacterEmotion)" to express emotion. e.g. "John (happy): Lovely to see you!"
+3. Use "narrator: Description" for narration. e.g. "narrator: John looks around, noticing the sky in the distance."
+4. To create choices for the player to choose from, use "- UserChoice". Create at least two choices, and no more than four choices. e.g. "- I don't know\n- This is why...\n- I give up"
+5. Do NOT use any other form of formatting, purely raw text.
+6. Keep descriptions concise."""
+
+# variable context sections, most stable first. History goes between
+# important and recent scenes, see build()
+SECTIONS = [
+    ("lore", "Lore"),
+    ("important", "Important earlier scenes"),
+    ("scene", "Recent scenes"),
+    ("memory", "Related earlier scenes"),
+]
+HISTORY_PAGE = 16 # history is trimmed in pages of lines, so its start only moves every few turns
+
+CHARS_PER_TOKEN = 4 # rough estimate, the Ollama model's tokenizer isn't available here
+
+class PromptBuilder:
+    """
+    Build chat messages from retrieved context (see GraphRAG.retrieve),
+    the client's history and the player's choice.
+
+    Args:
+        token_budget: Estimated prompt tokens, keep it below the model's
+            num_ctx minus the tokens it generates, or Ollama truncates the
+            prompt (and loses the cached prefix)
+    """
+    def __init__(self, token_budget: int = settings.PROMPT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.n_prompts = 0
+        self.n_trimmed = 0 # prompts that didn't fit the budget whole
+        self.n_prefix_hits = 0 # prefix identical to the story's previous prompt
+        self._prompt_tokens = 0
+        self._prefix_tokens = 0
+        self._prefixes = LRUCache(maxsize=4096) # story -> hash of its last prefix
+        self._lock = threading.Lock()
+
+    def prefix(self, retrieved: List[Dict[str, str]]):
+        """
+        Return the static system prompt: instructions, then the retrieved
+        character sheets in a fixed order. Listed characters are the only
+        speakers besides the narrator, as the stream validator enforces.
+        """
+        sheets = sorted(item["content"] for item in retrieved if item["role"] == "character")
+        if not sheets:
+            return INSTRUCTIONS
+        return INSTRUCTIONS + "\n\nCharacters (only they and the narrator speak):\n" + "\n".join(sheets)
+
+    def build(self, retrieved: List[Dict[str, str]], history: list, user_choice: str, story_id: Union[str, None] = None):
+        """
+        Return [system, user] messages within token_budget.
+
+        The player's choice and the latest scene are always kept. The rest
+        is added while it fits, in order: lore, important scenes, recent
+        scenes (newest first), related scenes (most relevant first), then
+        history. History is cut at a multiple of HISTORY_PAGE lines, and
+        the dropped lines replaced with a count of them, so as it grows
+        the cut (and the cached prompt up to the newest lines) stays put
+        for several turns.
+
+        The user message reads: lore, important scenes, history, recent
+        scenes, related scenes, then the player's choice.
+
+        Args:
+            retrieved: {"role", "content"} dicts from GraphRAG.retrieve
+            history: Client-side history, strings or {"role", "content"} dicts
+            user_choice: Player's choice
+            story_id: Story the prompt continues, for prefix reuse stats
+        """
+        prefix = self.prefix(retrieved)
+        choice = f"Player chose: {user_choice}"
+        budget = self.token_budget - estimate_tokens(prefix) - estimate_tokens(choice)
+        titles = dict(SECTIONS)
+
+        sections = {role: [item["content"] for item in retrieved if item["role"] == role] for role, _ in SECTIONS}
+        kept = {role: [] for role, _ in SECTIONS}
+        latest = [("scene", sections["scene"].pop())] if sections["scene"] else []
+        candidates = latest + (
+            [("lore", text) for text in sections["lore"]]
+            + [("important", text) for text in sections["important"]]
+            + [("scene", text) for text in reversed(sections["scene"])]
+            + [("memory", text) for text in sections["memory"]]
+        )
+        trimmed = False
+        for i, (role, text) in enumerate(candidates):
+            # separators and section titles count too
+            cost = estimate_tokens(text + "\n\n") + (0 if kept[role] else estimate_tokens(f"{titles[role]}:\n\n\n"))
+            if cost <= budget or (i == 0 and latest):
+                kept[role].append(text)
+                budget -= cost
+            else:
+                trimmed = True
+        kept["scene"] = kept["scene"][:0:-1] + kept["scene"][:1] # oldest first again
+
+        lines = [_history_line(item) for item in history]
+        recent = []
+        if lines:
+            budget -= estimate_tokens("History:\n\n\n") + estimate_tokens(_omitted(len(lines)) + "\n")
+            costs = [estimate_tokens(line + "\n") for line in lines]
+            start = 0
+            while start < len(lines) and sum(costs[start:]) > budget:
+                start += HISTORY_PAGE
+            recent = lines[start:]
+            if start:
+                trimmed = True
+                recent.insert(0, _omitted(start))
+
+        parts = [f"{title}:\n" + "\n\n".join(kept[role]) for role, title in SECTIONS[:2] if kept[role]]
+        if recent:
+            parts.append("History:\n" + "\n".join(recent))
+        parts += [f"{title}:\n" + "\n\n".join(kept[role]) for role, title in SECTIONS[2:] if kept[role]]
+        parts.append(choice)
+        messages = [
+            {"role": "system", "content": prefix},
+            {"role": "user", "content": "\n\n".join(parts)}
+        ]
+        self._record(prefix, messages, trimmed, story_id)
+        return messages
+
+    def stats(self):
+        """
+        Return how many prompts were built, trimmed, and reused their
+        story's previous prefix, and the share of prompt tokens in the
+        static prefix.
+        """
+        with self._lock:
+            return {
+                "prompts": self.n_prompts,
+                "trimmed": self.n_trimmed,
+                "prefix_hits": self.n_prefix_hits,
+                "prefix_share": self._prefix_tokens / self._prompt_tokens if self._prompt_tokens else 0.0
+            }
+
+    def _record(self, prefix: str, messages: list, trimmed: bool, story_id: Union[str, None]):
+        digest = hashlib.sha1(prefix.encode()).digest()
+        with self._lock:
+            self.n_prompts += 1
+            self.n_trimmed += trimmed
+            self._prefix_tokens += estimate_tokens(prefix)
+            self._prompt_tokens += sum(estimate_tokens(message["content"]) for message in messages)
+            if story_id is not None:
+                self.n_prefix_hits += self._prefixes.get(story_id) == digest
+                self._prefixes.put(story_id, digest)
+
+def estimate_tokens(text: str):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def _omitted(n_lines: int):
+    return f"({n_lines} earlier lines omitted)"
+
+def _history_line(item):
+    if isinstance(item, dict):
+        return f"{item.get('role', 'user')}: {item.get('content', '')}"
+    return str(item)
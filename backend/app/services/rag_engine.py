@@ -9,116 +9,471 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 
+import json
+import time
+import asyncio
+import contextlib
 from app.models.llm_wrapper import LLMAdapter
-from typing import List, Dict
+from app.models.api_schemas import Chunk
+from typing import List, Dict, Union
 from app.config import settings
-from app.models.llm_wrapper import OllamaAdapter
+from app.models.llm_wrapper import AsyncOllamaAdapter, AsyncRoutingAdapter
+from app.services.stream_metrics import StreamMetrics
+from app.services.val_engine import ValEngine, DialogicSyntaxError
+from app.services.story_graph import StoryGraph
+from app.services.story_memory import StoryMemory
+from app.services.prompt_builder import PromptBuilder
+from app.services.speculator import Speculator, SpeculationError
+from app.services.generation_store import GenerationStore, deterministic
+from app.services.llm_scheduler import AsyncScheduledAdapter, get_llm_scheduler
+from app.services.components import LazyComponent
+from app.models.embeddings import TextEmbedder
 
 class GraphRAG:
     """
     Use GraphRAG to provide memory/lore for story generation.
+
+    Every generated scene is stored in the story graph as a child of the
+    requested scene, and its id is returned in the final Chunk's fx
+    ({"scene_id": ...}) so the next request can continue from it.
+
+    With STORY_MEMORY (or a text_embedder given), generated scenes are also
+    embedded in the background (see StoryMemory), and retrieval adds the
+    story's most relevant older scenes.
+
+    With SPECULATE (or speculate=True), the next scene for each choice a
+    scene offers is generated in the background while the player reads
+    (see Speculator), and served straight away if it's chosen.
+
+    With GENERATION_STORE (or a generation_store given), generations are
+    persisted, and a request with the exact same prompt is served the
+    stored text if sampling is deterministic or the request is a replay.
     """
-    def __init__(self, llm_adapter: LLMAdapter):
+    def __init__(self, llm_adapter: LLMAdapter, story_graph: Union[StoryGraph, None] = None, text_embedder: Union[TextEmbedder, None] = None, speculate: Union[bool, None] = None, generation_store: Union[GenerationStore, None] = None):
         self.llm_adapter = llm_adapter
-        # initialize graphdb connection
+        self.stream_metrics = StreamMetrics()
+        self.val_engine = ValEngine()
+        self.prompt_builder = PromptBuilder()
+        self.speculator = Speculator() if (settings.SPECULATE if speculate is None else speculate) else None
+        if story_graph is not None:
+            self._story_graph = LazyComponent.of("story_graph", story_graph)
+        else:
+            self._story_graph = LazyComponent("story_graph", lambda: StoryGraph())
+
+        self._generation_store = None
+        if generation_store is not None:
+            self._generation_store = LazyComponent.of("generation_store", generation_store)
+        elif settings.GENERATION_STORE:
+            self._generation_store = LazyComponent("generation_store", lambda: GenerationStore())
+
+        self._text_embedder = None
+        if text_embedder is not None:
+            self._text_embedder = LazyComponent.of("story_text_embedder", text_embedder)
+        elif settings.STORY_MEMORY:
+            self._text_embedder = LazyComponent("story_text_embedder", lambda: TextEmbedder(
+                model_id=settings.IMAGE_TEXT_MODEL_ID,
+                device=settings.DEVICE,
+                quantize=settings.QUERY_ENCODER_QUANTIZE
+            ))
+        self._story_memory = None
+        if self._text_embedder is not None:
+            self._story_memory = LazyComponent("story_memory", lambda: StoryMemory(
+                self.story_graph,
+                embed_texts=lambda texts: self._text_embedder.get().embed_texts(texts)
+            ))
+
+    @property
+    def story_graph(self):
+        return self._story_graph.get()
+
+    @property
+    def story_memory(self):
+        """
+        Background scene embedder, None without long-term memory.
+        """
+        return self._story_memory.get() if self._story_memory is not None else None
+
+    @property
+    def generation_store(self):
+        """
+        Persistent store of generations, None without GENERATION_STORE.
+        """
+        return self._generation_store.get() if self._generation_store is not None else None
 
+    def components(self):
+        components = [self._story_graph]
+        if self._story_memory is not None:
+            components += [self._text_embedder, self._story_memory]
+        if self._generation_store is not None:
+            components.append(self._generation_store)
+        return components
 
     def retrieve(self, scene_id: str, context: str, user_choice: str, active_chars: List[str]):
         """
         Retrieve relevant memory/lore for story generation, based on scene, context, and user choice.
 
+        Walks back from scene_id through at most STORY_CONTEXT_DEPTH scenes
+        (memoized per scene, see StoryGraph.ancestors), and adds every active
+        character (with its description, if known) and any lore describing
+        them or the retrieved scenes. Older scenes come from the story's scenes marked
+        important (at most STORY_IMPORTANT_MAX) and, with long-term memory,
+        the STORY_MEMORY_K scenes most relevant to the user's choice and the
+        current scene. The prompt stays the same size however long the
+        story gets.
+
         Args:
             scene_id: ID of the scene
             context: Context for the story to find relevant memory/lore
             user_choice: User's choice for the story to find relevant visual/audio content
             active_chars: List of active characters to find relevant memory/lore
+
+        Returns:
+            List of {"role", "content"} dicts: characters, then lore, then
+            important scenes, relevant older scenes ("memory"), and the
+            latest scenes oldest first
         """
-        return [{"role": "Sky", "content": "The sky is blue because of I, the lord, the sky, was born that way."}, {"role": "Sky", "content": "I was born under the sea, and so the sky reflects me."}]
+        names = _character_names(active_chars)
+        ancestors = self.story_graph.ancestors(scene_id)
+        scenes = [entry for entry in ancestors if entry.text]
+        seen = {entry.scene_id for entry in ancestors}
+        story_id = self.story_graph.story_of(scene_id)
+        important, memories = [], []
+        if story_id is not None:
+            important = [entry for entry in self.story_graph.important(story_id) if entry.scene_id not in seen]
+            seen |= {entry.scene_id for entry in important}
+            if self.story_memory is not None:
+                query = f"{user_choice}\n{scenes[-1].text}" if scenes else user_choice
+                memories = self.story_memory.search(story_id, query, exclude=seen)
+        # every active character is listed, the validator rejects other speakers
+        descriptions = self.story_graph.characters(names)
+        retrieved = [
+            {"role": "character", "content": f"{name}: {descriptions[name]}" if descriptions.get(name) else name}
+            for name in dict.fromkeys(names)
+        ]
+        lore = [text for entry in ancestors for text in entry.lore] + self.story_graph.lore(names)
+        retrieved += [{"role": "lore", "content": text} for text in dict.fromkeys(lore)]
+        retrieved += [{"role": "important", "content": _scene_content(entry)} for entry in important]
+        retrieved += [{"role": "memory", "content": entry.text} for entry in memories]
+        retrieved += [{"role": "scene", "content": _scene_content(entry)} for entry in scenes]
+        return retrieved
 
-    def generate_stream(self, scene_id: str, context: str, active_chars: List[str], history: List[str], user_choice: str, options: Dict[str, str]):
+    def mark_important(self, scene_id: str, important: bool = True):
         """
-        Yield streamed response with context retrieved from RAG.
+        Keep a scene in context for the rest of its story (see StoryGraph.mark_important).
         """
+        self.story_graph.mark_important(scene_id, important)
 
-        retrieved_context = self.retrieve(scene_id, context, user_choice, active_chars)
-        system_prompt = self._build_system_prompt(retrieved_context)
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"History: \n{history}\nUser: {user_choice}"}
-        ]
-        for chunk in self.llm_adapter.chat_stream(messages):
-            yield chunk
+    def _enter_scene(self, scene_id: str, user_choice: str, text: str, active_chars: list, story_id: Union[str, None]):
+        """
+        Store a generated scene and queue it for embedding.
+        """
+        new_scene_id = self.story_graph.enter_scene(scene_id, user_choice, text, _character_names(active_chars), story_id=story_id)
+        if self.story_memory is not None:
+            self.story_memory.add(new_scene_id, self.story_graph.story_of(new_scene_id), text)
+        return new_scene_id
+
+    async def generate_stream(self, scene_id: str, context: str, active_chars: List[str], history: List[str], user_choice: str, options: Dict[str, str], story_id: Union[str, None] = None, replay: bool = False):
+        """
+        Yield Chunks with context retrieved from RAG, one per streamed token,
+        then an empty Chunk with is_final=True.
 
-    def generate_chunk(self, scene_id: str, context: str, active_chars: List[str], history: List[str], user_choice: str, options: Dict[str, str]):
+        With VALIDATE_STREAM, output is checked line by line as it streams
+        (see ValEngine). Invalid output aborts the Ollama request, so it
+        stops generating, and is regenerated up to VALIDATION_MAX_RETRIES
+        times. If anything from the aborted attempt already reached the
+        client, a Chunk with fx {"event": "regenerate"} tells it to discard
+        that text. The last attempt streams unchecked.
+
+        Time to first token (from the call, so retrieval counts) and decode
+        tokens/sec are recorded in stream_metrics, even if the client
+        disconnects mid-stream.
+
+        story_id names the story when scene_id is a new story's first scene,
+        it defaults to scene_id. replay serves the stored generation for the
+        same prompt, if any, even if sampling isn't deterministic.
+        """
+        start = time.perf_counter()
+        generated = []
+        speculated = await self._take_speculation(scene_id, user_choice)
+        if speculated is not None:
+            first_token = None
+            try:
+                async with contextlib.aclosing(speculated):
+                    async for text in speculated:
+                        first_token = first_token or time.perf_counter()
+                        generated.append(text)
+                        yield Chunk(text=text)
+            except SpeculationError as e:
+                print(f"Generating scene {scene_id} interactively: {e}")
+                speculated = None
+                if generated:
+                    generated.clear()
+                    yield Chunk(text="", fx={"event": "regenerate", "reason": str(e)})
+            finally:
+                # the speculator counts the tokens it generated, a failed
+                # speculation is recorded with the generation replacing it
+                if speculated is not None:
+                    self.stream_metrics.record(ttft=first_token - start if first_token else None, n_tokens=0, decode_seconds=0.0)
+        if speculated is None:
+            messages = await asyncio.to_thread(self._messages, scene_id, context, active_chars, history, user_choice, story_id)
+            key, stored = self._stored(scene_id, messages, options, story_id, replay)
+            if stored is not None:
+                self.stream_metrics.record(ttft=time.perf_counter() - start, n_tokens=0, decode_seconds=0.0)
+                generated.append(stored)
+                yield Chunk(text=stored)
+            else:
+                # closed explicitly, so metrics are recorded even if the client disconnects
+                async with self._interactive(), contextlib.aclosing(self._stream(scene_id, messages, active_chars, options, self._story_id(scene_id, story_id), start, generated)) as chunks:
+                    async for chunk in chunks:
+                        yield chunk
+                self._store(key, scene_id, story_id, "".join(generated))
+        text = "".join(generated)
+        new_scene_id = self._enter_scene(scene_id, user_choice, text, active_chars, story_id)
+        self._speculate(new_scene_id, text, context, active_chars, history, options, story_id)
+        yield Chunk(text="", is_final=True, fx={"scene_id": new_scene_id})
+
+    async def _stream(self, scene_id: str, messages: list, active_chars: list, options: dict, session: str, start: float, generated: list):
+        """
+        Stream, validate and retry a generation (see generate_stream),
+        leaving the released text of the final attempt in generated.
+        """
+        first_token, first_generated, n_tokens, n_retries = None, None, 0, 0
+        prefill_seconds, prompt_tokens = None, None
+        attempts = settings.VALIDATION_MAX_RETRIES + 1 if settings.VALIDATE_STREAM else 1
+        try:
+            for attempt in range(attempts):
+                validator = self.val_engine.validator(active_chars) if attempt < attempts - 1 else None
+                stream = self.llm_adapter.chat_stream(messages, options=options, session=session)
+                released = False
+                generated.clear()
+                try:
+                    async for line in stream:
+                        response = json.loads(line)
+                        if "error" in response:
+                            raise RuntimeError(f"Ollama error: {response['error']}")
+                        if response.get("done"):
+                            prefill_seconds, prompt_tokens = _prefill(response, prefill_seconds, prompt_tokens)
+                        text = response["message"]["content"] if not response.get("done") else ""
+                        if not text:
+                            continue
+                        first_generated = first_generated or time.perf_counter()
+                        n_tokens += 1
+                        if validator is not None:
+                            text = validator.feed(text)
+                        if text:
+                            if first_token is None:
+                                first_token = time.perf_counter()
+                            released = True
+                            generated.append(text)
+                            yield Chunk(text=text)
+                    if validator is not None and (text := validator.finish()):
+                        generated.append(text)
+                        yield Chunk(text=text)
+                    break
+                except DialogicSyntaxError as e:
+                    n_retries += 1
+                    print(f"Invalid generation for scene {scene_id} (attempt {attempt + 1}), regenerating: {e}")
+                    if released:
+                        yield Chunk(text="", fx={"event": "regenerate", "reason": str(e)})
+                finally:
+                    # closing the stream drops the connection, which stops Ollama generating
+                    await stream.aclose()
+        finally:
+            self.stream_metrics.record(
+                ttft=first_token - start if first_token else None,
+                n_tokens=n_tokens,
+                decode_seconds=time.perf_counter() - first_generated if first_generated else 0.0,
+                n_retries=n_retries,
+                prefill_seconds=prefill_seconds,
+                prompt_tokens=prompt_tokens
+            )
+
+    async def generate_chunk(self, scene_id: str, context: str, active_chars: List[str], history: List[str], user_choice: str, options: Dict[str, str], story_id: Union[str, None] = None, replay: bool = False):
         """
         Return single chunk response with context retrieved from RAG.
         """
-        retrieved_context = self.retrieve(scene_id, context, user_choice, active_chars)
-        system_prompt = self._build_system_prompt(retrieved_context)
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"History: \n{history}\nUser Choice: {user_choice}"}
-        ]
-        return self.llm_adapter.chat_chunk(messages)
+        start = time.perf_counter()
+        response = None
+        speculated = await self._take_speculation(scene_id, user_choice)
+        if speculated is not None:
+            try:
+                text = "".join([text async for text in speculated])
+                response = {"model": getattr(self.llm_adapter, "model", None), "message": {"role": "assistant", "content": text}, "done": True, "speculative": True}
+                self.stream_metrics.record(ttft=time.perf_counter() - start, n_tokens=0, decode_seconds=0.0)
+            except SpeculationError as e:
+                print(f"Generating scene {scene_id} interactively: {e}")
+        if response is None:
+            messages = await asyncio.to_thread(self._messages, scene_id, context, active_chars, history, user_choice, story_id)
+            key, stored = self._stored(scene_id, messages, options, story_id, replay)
+            if stored is not None:
+                response = {"model": getattr(self.llm_adapter, "model", None), "message": {"role": "assistant", "content": stored}, "done": True, "replayed": True}
+                self.stream_metrics.record(ttft=time.perf_counter() - start, n_tokens=0, decode_seconds=0.0)
+            else:
+                async with self._interactive():
+                    response = await self.llm_adapter.chat_chunk(messages, options=options, session=self._story_id(scene_id, story_id))
+                # nothing reaches the client before the whole response does
+                prefill_seconds, prompt_tokens = _prefill(response)
+                self.stream_metrics.record(
+                    ttft=time.perf_counter() - start,
+                    n_tokens=response.get("eval_count", 0),
+                    decode_seconds=response.get("eval_duration", 0) / 1e9,
+                    prefill_seconds=prefill_seconds,
+                    prompt_tokens=prompt_tokens
+                )
+                self._store(key, scene_id, story_id, response["message"]["content"])
+        response["scene_id"] = self._enter_scene(scene_id, user_choice, response["message"]["content"], active_chars, story_id)
+        self._speculate(response["scene_id"], response["message"]["content"], context, active_chars, history, options, story_id)
+        return response
 
-    def _build_system_prompt(self, retrieved_context: List[str]):
+    async def _take_speculation(self, scene_id: str, user_choice: str):
         """
-        Return system prompt for story generation, using RAG-retrieved context.
+        Return an async iterator of the speculated continuation for the
+        player's choice, or None (see Speculator.take).
+        """
+        if self.speculator is None:
+            return None
+        return await self.speculator.take(scene_id, user_choice)
+
+    def _interactive(self):
+        return self.speculator.interactive() if self.speculator is not None else contextlib.nullcontext()
 
-        Should follow Dialogic 2's 'timeline text syntax': https://docs.dialogic.pro/timeline-text-syntax.html
+    def _speculate(self, scene_id: str, text: str, context: str, active_chars: list, history: list, options: dict, story_id: Union[str, None]):
+        """
+        Offer the choices text ends with to the speculator.
+        """
+        choices = self.val_engine.choices(text) if self.speculator is not None else []
+        if choices:
+            self.speculator.offer(scene_id, choices, lambda choice: self._speculative_tokens(scene_id, context, active_chars, history, choice, options, story_id))
 
-        TODO: Express all timeline options or maybe return json and decode in frontend timeline
+    async def _speculative_tokens(self, scene_id: str, context: str, active_chars: list, history: list, user_choice: str, options: dict, story_id: Union[str, None]):
+        """
+        Yield the text of a speculative generation token by token, raising
+        DialogicSyntaxError if it's invalid.
         """
+        messages = await asyncio.to_thread(self._messages, scene_id, context, active_chars, history, user_choice, story_id)
+        validator = self.val_engine.validator(active_chars) if settings.VALIDATE_STREAM else None
+        # behind players' requests and rewrites, if the adapter is scheduled
+        adapter = self.llm_adapter.with_priority("speculative") if hasattr(self.llm_adapter, "with_priority") else self.llm_adapter
+        stream = adapter.chat_stream(messages, options=options, session=self._story_id(scene_id, story_id))
+        try:
+            async for line in stream:
+                response = json.loads(line)
+                if "error" in response:
+                    raise RuntimeError(f"Ollama error: {response['error']}")
+                if response.get("done"):
+                    continue
+                text = response["message"]["content"]
+                yield validator.feed(text) if validator is not None else text
+            if validator is not None:
+                yield validator.finish()
+        finally:
+            await stream.aclose()
 
-        system_prompt = f"""
-        You are a magnificent story-teller.
+    def _stored(self, scene_id: str, messages: list, options: dict, story_id: Union[str, None], replay: bool):
+        """
+        Return (key, text) for messages in the generation store. key is None
+        without a store, text is None unless a generation is stored and may
+        be served: sampling is deterministic, or the request is a replay.
+        """
+        if self.generation_store is None:
+            return None, None
+        key = self.generation_store.key(self._story_id(scene_id, story_id), getattr(self.llm_adapter, "model", None), options, messages)
+        if not (replay or deterministic(options)):
+            return key, None
+        return key, self.generation_store.get(key)
 
-        Your goal is to generate the next chunk of text for the story based on the Player's chosen action. 
-        
-        Choose ONE of the following:
-        - Create one character's dialogue
-        - Create one piece of narration
-        - Create one set of choices for the player to choose from
+    def _store(self, key: Union[str, None], scene_id: str, story_id: Union[str, None], text: str):
+        if key is not None:
+            self.generation_store.put(key, self._story_id(scene_id, story_id), text)
 
-        STRICT OUTPUT FORMAT (Dialogic 2.0's "Timeline Text Syntax"):
-        1. Use "CharacterName: Dialogue" for speech. e.g. "John: Lovely to see you!"
-        2. Replace "CharacterName" with "CharacterName (CharacterEmotion)" to express emotion. e.g. "John (happy): Lovely to see you!"
-        3. Use "narrator: Description" for narration. e.g. "narrator: John looks around, noticing the sky in the distance."
-        4. To create choices for the player to choose from, use "- UserChoice". Create at least two choices, and no more than four choices. e.g. "- I don't know\n- This is why...\n- I give up"
-        5. Do NOT use any other form of formatting, purely raw text.
-        6. Keep descriptions concise.
+    def _messages(self, scene_id: str, context: str, active_chars: list, history: list, user_choice: str, story_id: Union[str, None]):
+        """
+        Retrieve context for the scene and build the chat messages (see PromptBuilder).
 
-        The context for the story is as follows:
-        {retrieved_context}
+        Blocking: retrieval may embed the query (see StoryMemory.search) and
+        waits on the story graph while the background embedder writes to it,
+        so async callers run it in a thread.
         """
-        
-        return system_prompt
+        retrieved_context = self.retrieve(scene_id, context, user_choice, active_chars)
+        return self.prompt_builder.build(retrieved_context, history, user_choice, story_id=self._story_id(scene_id, story_id))
+
+    def _story_id(self, scene_id: str, story_id: Union[str, None]):
+        return self.story_graph.story_of(scene_id) or story_id or scene_id
+
+def _prefill(response: dict, prefill_seconds: Union[float, None] = None, prompt_tokens: Union[int, None] = None):
+    """
+    Add the prompt evaluation time and tokens from an Ollama response to
+    the running totals (a retried generation prefills again).
+    """
+    if "prompt_eval_count" not in response:
+        return prefill_seconds, prompt_tokens
+    return (prefill_seconds or 0.0) + response.get("prompt_eval_duration", 0) / 1e9, (prompt_tokens or 0) + response["prompt_eval_count"]
+
+def _scene_content(entry):
+    return f"(Player chose: {entry.choice})\n{entry.text}" if entry.choice else entry.text
+
+def _character_names(active_chars: list):
+    return [getattr(char, "name", char) for char in active_chars]
 
 def get_llm_adapter():
+    """
+    Return the story generation adapter, routed across OLLAMA_URLS if set
+    (see AsyncRoutingAdapter) and scheduled as interactive requests with
+    LLM_SCHEDULER (see LLMScheduler).
+    """
     if settings.LLM_API == "ollama":
-        return OllamaAdapter(
-            url=settings.OLLAMA_URL,
-            model=settings.OLLAMA_VLM_MODEL
-        )
+        if settings.OLLAMA_URLS:
+            adapter = AsyncRoutingAdapter(
+                urls=settings.OLLAMA_URLS,
+                model=settings.OLLAMA_VLM_MODEL,
+                timeout=settings.OLLAMA_TIMEOUT,
+                connect_timeout=settings.OLLAMA_CONNECT_TIMEOUT,
+                max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                health_interval=settings.OLLAMA_HEALTH_INTERVAL,
+                retry_after=settings.OLLAMA_RETRY_AFTER,
+                affinity_slack=settings.OLLAMA_AFFINITY_SLACK,
+                max_sessions=settings.OLLAMA_SESSIONS
+            )
+        else:
+            adapter = AsyncOllamaAdapter(
+                url=settings.OLLAMA_URL,
+                model=settings.OLLAMA_VLM_MODEL,
+                timeout=settings.OLLAMA_TIMEOUT,
+                connect_timeout=settings.OLLAMA_CONNECT_TIMEOUT,
+                max_retries=settings.OLLAMA_MAX_RETRIES,
+                max_connections=settings.OLLAMA_MAX_CONNECTIONS
+            )
+        if settings.LLM_SCHEDULER:
+            return AsyncScheduledAdapter(adapter, get_llm_scheduler(), "interactive")
+        return adapter
 
 if __name__ == "__main__":
+    import asyncio
     user_choice = "But Why?"
     history = [
         {"role": "user", "content": "Are you sure the sky is blue?"},
         {"role": "Sky", "content": "Yes I'm sure."}
     ]
-    rag_engine = GraphRAG(llm_adapter=OllamaAdapter(url="http://localhost:11434", model="gemma3"))
+    rag_engine = GraphRAG(llm_adapter=AsyncOllamaAdapter(url="http://localhost:11434", model="gemma3"), story_graph=StoryGraph(":memory:"))
+    rag_engine.story_graph.add_character("Sky", "The sky, old and proud.")
+    rag_engine.story_graph.add_lore("sky_colour", "The sky is blue because of I, the lord, the sky, was born that way.", characters=["Sky"])
+    rag_engine.story_graph.add_lore("sky_birth", "I was born under the sea, and so the sky reflects me.", characters=["Sky"])
 
     context = "Why do you think the sky is blue?"
-    retrieved_context = rag_engine.retrieve(scene_id="ID0001", context=context, active_chars=[], user_choice=user_choice)
+    retrieved_context = rag_engine.retrieve(scene_id="ID0001", context=context, active_chars=["Sky"], user_choice=user_choice)
     print(retrieved_context)
 
-    print(rag_engine._build_system_prompt(retrieved_context))
+    for message in rag_engine.prompt_builder.build(retrieved_context, history, user_choice):
+        print(f"{message['role']}:\n{message['content']}\n")
+
 
+    async def main():
+        async for chunk in rag_engine.generate_stream(scene_id="ID0001", context=context, active_chars=["Sky"], history=history, user_choice=user_choice, options={}):
+            print(chunk.text, end="", flush=True)
+        print(rag_engine.stream_metrics.summary())
 
-    for chunk in rag_engine.generate_stream(scene_id="ID0001", context=context, active_chars=[], history=history, user_choice=user_choice, options={}):
+        chunk = await rag_engine.generate_chunk(scene_id="ID0001", context=context, active_chars=["Sky"], history=history, user_choice=user_choice, options={})
         print(chunk)
+        print('\n' + chunk['message']['content'])
 
-    chunk = rag_engine.generate_chunk(scene_id="ID0001", context=context, active_chars=[], history=history, user_choice=user_choice, options={})
-    print(chunk)
-    print('\n' + chunk['message']['content'])
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,248 @@
+# ------------------------------------------------------------------------
+# Speculator
+#
+# While the player reads a scene that ends in a set of choices, the model
+# is idle. The speculator pre-generates the next scene for each offered
+# choice in the background, and a request for one of them is served from
+# the result (or streams the rest of it if it's still running). Speculative
+# generations only run while no player is waiting on an interactive one,
+# are preempted when one arrives, and the rest of a scene's speculations
+# are cancelled as soon as the player's real choice does.
+# ------------------------------------------------------------------------
+
+import time
+import asyncio
+import contextlib
+from typing import AsyncIterator, Callable
+from app.services.lru_cache import LRUCache
+from app.config import settings
+
+class SpeculationError(Exception):
+    """
+    A speculative continuation a player was waiting on failed.
+    """
+    pass
+
+class SpeculativeJob:
+    """
+    One speculative continuation of a scene. state is "queued", "running",
+    "done", "failed" or "cancelled".
+    """
+    def __init__(self, scene_id: str, choice: str):
+        self.scene_id = scene_id
+        self.choice = choice
+        self.state = "queued"
+        self.pieces = [] # generated text, one item per token
+        self.n_tokens = 0
+        self.claimed = False # a player is waiting on it, it's no longer preempted
+        self.error = None
+        self.task = None
+        self.changed = asyncio.Event()
+
+    @property
+    def text(self):
+        return "".join(self.pieces)
+
+class Speculator:
+    """
+    Args:
+        concurrency: Speculative generations in flight at once
+        max_choices: Choices speculated per scene
+        cache_size: Finished continuations kept, e.g. for a rollback to the scene
+    """
+    def __init__(self, concurrency: int = settings.SPECULATE_CONCURRENCY, max_choices: int = settings.SPECULATE_MAX_CHOICES, cache_size: int = settings.SPECULATE_CACHE_SIZE):
+        self.concurrency = concurrency
+        self.max_choices = max_choices
+        self.n_offered = 0
+        self.n_lookups = 0 # requests for a scene that had speculations
+        self.n_hits = 0 # served a finished continuation
+        self.n_joined = 0 # waited on a running one
+        self.n_cancelled = 0
+        self.n_preempted = 0
+        self.n_failed = 0
+        self.n_tokens = 0 # generated speculatively, including cancelled work
+        self.n_served_tokens = 0
+        self.seconds = 0.0 # spent generating speculatively
+        self._results = LRUCache(maxsize=cache_size) # (scene_id, choice key) -> finished job
+        self._scenes = LRUCache(maxsize=cache_size) # scenes with speculations, for the hit rate
+        self._pending = {} # scene_id -> {choice key: queued or running job}
+        self._n_interactive = 0
+        self._semaphore = None
+        self._idle = None
+        self._busy = None
+
+    def offer(self, scene_id: str, choices: list, generate: Callable[[str], AsyncIterator[str]]):
+        """
+        Schedule speculative continuations of scene_id, one per choice.
+        Must be called from the event loop.
+
+        Args:
+            generate: Returns an async iterator of generated text, one item
+                per token, for a choice. Raising discards the continuation.
+        """
+        self._events()
+        self._scenes.put(scene_id, True)
+        pending = self._pending.setdefault(scene_id, {})
+        for choice in choices[:self.max_choices]:
+            key = _choice_key(choice)
+            if key in pending or (scene_id, key) in self._results:
+                continue
+            job = SpeculativeJob(scene_id, choice)
+            job.task = asyncio.ensure_future(self._run(job, generate))
+            pending[key] = job
+            self.n_offered += 1
+        if not pending:
+            del self._pending[scene_id]
+
+    async def take(self, scene_id: str, choice: str):
+        """
+        Return an async iterator of the speculative continuation of scene_id
+        for choice, or None to generate it interactively. The scene's other
+        pending speculations are cancelled.
+
+        A finished continuation is yielded whole. A running one is streamed
+        as it's generated, and raises SpeculationError if it then fails
+        (text may already have been yielded). A queued one is cancelled, the
+        player would otherwise wait for it to start.
+        """
+        key = _choice_key(choice)
+        speculated = scene_id in self._scenes
+        pending = self._pending.pop(scene_id, {})
+        job = pending.pop(key, None)
+        for other in pending.values():
+            other.task.cancel()
+        if job is not None and job.state != "running":
+            job.task.cancel()
+            job = None
+
+        self.n_lookups += speculated
+        finished = self._results.get((scene_id, key))
+        if finished is not None:
+            self.n_hits += 1
+            self.n_served_tokens += finished.n_tokens
+            return _once(finished.text)
+        if job is None:
+            return None
+        job.claimed = True
+        self.n_joined += 1
+        return self._follow(job)
+
+    @contextlib.asynccontextmanager
+    async def interactive(self):
+        """
+        Hold while a player waits on an interactive generation, speculative
+        ones are paused (and preempted if already running) meanwhile.
+        """
+        self._events()
+        self._n_interactive += 1
+        self._idle.clear()
+        self._busy.set()
+        try:
+            yield
+        finally:
+            self._n_interactive -= 1
+            if self._n_interactive == 0:
+                self._busy.clear()
+                self._idle.set()
+
+    def stats(self):
+        return {
+            "offered": self.n_offered,
+            "lookups": self.n_lookups,
+            "hits": self.n_hits,
+            "joined": self.n_joined,
+            "hit_rate": (self.n_hits + self.n_joined) / self.n_lookups if self.n_lookups else 0.0,
+            "cancelled": self.n_cancelled,
+            "preempted": self.n_preempted,
+            "failed": self.n_failed,
+            "pending": sum(len(pending) for pending in self._pending.values()),
+            "tokens": self.n_tokens,
+            "wasted_tokens": self.n_tokens - self.n_served_tokens,
+            "seconds": self.seconds
+        }
+
+    def _events(self):
+        # created lazily, inside the event loop they're used from
+        if self._idle is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._idle, self._busy = asyncio.Event(), asyncio.Event()
+            self._idle.set()
+
+    async def _run(self, job: SpeculativeJob, generate: Callable[[str], AsyncIterator[str]]):
+        try:
+            async with self._semaphore:
+                while True:
+                    await self._idle.wait()
+                    job.state = "running"
+                    generation = asyncio.ensure_future(self._generate(job, generate))
+                    busy = asyncio.ensure_future(self._busy.wait())
+                    try:
+                        await asyncio.wait({generation, busy}, return_when=asyncio.FIRST_COMPLETED)
+                        if job.claimed and not generation.done():
+                            await asyncio.wait({generation})
+                    finally:
+                        busy.cancel()
+                        if not generation.done():
+                            generation.cancel()
+                            with contextlib.suppress(asyncio.CancelledError):
+                                await generation
+                    if generation.cancelled():
+                        # a player is waiting, start over once they're served
+                        self.n_preempted += 1
+                        job.state = "queued"
+                        continue
+                    generation.result()
+                    break
+            job.state = "done"
+            self._results.put((job.scene_id, _choice_key(job.choice)), job)
+        except asyncio.CancelledError:
+            job.state = "cancelled"
+            self.n_cancelled += 1
+            raise
+        except Exception as e:
+            job.state = "failed"
+            job.error = e
+            self.n_failed += 1
+            print(f"Speculation for scene {job.scene_id} ({job.choice!r}) failed: {e}")
+        finally:
+            job.changed.set()
+            pending = self._pending.get(job.scene_id, {})
+            if pending.get(_choice_key(job.choice)) is job:
+                del pending[_choice_key(job.choice)]
+                if not pending:
+                    del self._pending[job.scene_id]
+
+    async def _generate(self, job: SpeculativeJob, generate: Callable[[str], AsyncIterator[str]]):
+        start = time.perf_counter()
+        job.n_tokens, job.pieces = 0, [] # a preempted attempt is wasted
+        tokens = generate(job.choice)
+        try:
+            async for piece in tokens:
+                job.n_tokens += 1
+                self.n_tokens += 1
+                job.pieces.append(piece)
+                job.changed.set()
+        finally:
+            self.seconds += time.perf_counter() - start
+            await tokens.aclose()
+
+    async def _follow(self, job: SpeculativeJob):
+        sent = 0
+        while True:
+            job.changed.clear()
+            while sent < len(job.pieces):
+                sent += 1
+                if job.pieces[sent - 1]:
+                    yield job.pieces[sent - 1]
+            if job.task.done():
+                break
+            await job.changed.wait()
+        if job.state != "done":
+            raise SpeculationError(f"speculation for scene {job.scene_id} ({job.choice!r}) {job.state}") from job.error
+        self.n_served_tokens += job.n_tokens
+
+async def _once(text: str):
+    yield text
+
+def _choice_key(choice: str):
+    return " ".join(choice.split()).casefold()
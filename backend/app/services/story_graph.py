@@ -0,0 +1,305 @@
+# ------------------------------------------------------------------------
+# Story Graph
+#
+# Scenes, the choices between them, characters and lore, stored as a Kuzu
+# graph. Scenes form a tree of choices: a scene is identified by its
+# parent, the choice and its text, so only the same continuation of the
+# same scene (e.g. a replay after a rollback) maps to an existing node, and
+# equal text elsewhere in the story stays a separate scene with its own
+# context. The context built from a scene's last max_depth ancestors is
+# memoized per scene, so entering a scene extends its parent's cached
+# context instead of re-walking the story.
+#
+# Scene text embeddings (see StoryMemory) are kept in a Memory table, and
+# scenes the player marks important are always retrieved.
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import hashlib
+import threading
+from pathlib import Path
+from typing import NamedTuple, Union
+from app.database import KuzuDB
+from app.services.lru_cache import LRUCache
+from app.config import settings
+
+class SceneEntry(NamedTuple):
+    scene_id: str
+    choice: str # player's choice that led to the scene, "" for a story's first scene
+    text: str
+    lore: tuple = () # text of lore describing the scene
+
+class StoryGraph:
+    """
+    Args:
+        db_path: Kuzu database path, ":memory:" for a throwaway graph
+        max_depth: Scenes of context per retrieval, the scene itself included
+        cache_size: Scenes whose ancestor context is memoized
+        embedding_dim: Size of scene text embeddings in the Memory table
+
+    Methods are thread-safe, the background embedder writes through the
+    same connection.
+    """
+    def __init__(self, db_path: Union[Path, str] = settings.STORY_DB_PATH, max_depth: int = settings.STORY_CONTEXT_DEPTH, cache_size: int = settings.STORY_CONTEXT_CACHE_SIZE, embedding_dim: int = settings.IMAGE_TEXT_DIM):
+        self.db = KuzuDB(db_path)
+        self.conn = self.db.conn
+        self.max_depth = max_depth
+        self._context_cache = LRUCache(maxsize=cache_size)
+        self._lock = threading.RLock()
+
+        self.db.create_schema({
+            "table_name": "Scene",
+            "id": "STRING PRIMARY KEY",
+            "story_id": "STRING", # id of the story's first scene
+            "parent_id": "STRING",
+            "choice": "STRING",
+            "text": "STRING",
+            "depth": "INT64"
+        })
+        self.db.create_schema({
+            "table_name": "Character",
+            "name": "STRING PRIMARY KEY",
+            "description": "STRING"
+        })
+        self.db.create_schema({
+            "table_name": "Lore",
+            "id": "STRING PRIMARY KEY",
+            "text": "STRING"
+        })
+        self.db.create_schema({
+            "table_name": "Memory",
+            "id": "STRING PRIMARY KEY", # scene id
+            "story_id": "STRING",
+            "text": "STRING",
+            "embedding": f"FLOAT[{embedding_dim}]"
+        })
+        self.db.create_schema({
+            "table_name": "Important",
+            "id": "STRING PRIMARY KEY", # scene id
+            "story_id": "STRING",
+            "choice": "STRING",
+            "text": "STRING",
+            "depth": "INT64"
+        })
+        self._execute("CREATE REL TABLE IF NOT EXISTS Next(FROM Scene TO Scene, choice STRING)")
+        self._execute("CREATE REL TABLE IF NOT EXISTS Features(FROM Scene TO Character)")
+        self._execute("CREATE REL TABLE IF NOT EXISTS Describes(FROM Lore TO Character, FROM Lore TO Scene)")
+
+    def add_character(self, name: str, description: str = ""):
+        self._execute(
+            "MERGE (c:Character {name: $name}) SET c.description = $description",
+            {"name": name, "description": description}
+        )
+
+    def add_lore(self, lore_id: str, text: str, characters: list = (), scenes: list = ()):
+        """
+        Add (or replace) a piece of lore, retrieved whenever one of its
+        characters is active or one of its scenes is in context.
+
+        Scene lore is memoized with the scenes' context, so adding it clears
+        the context cache. Lore is meant to be authored up front, not per turn.
+        """
+        self._execute("MERGE (l:Lore {id: $id}) SET l.text = $text", {"id": lore_id, "text": text})
+        for name in characters:
+            self._merge_character(name)
+            self._execute(
+                "MATCH (l:Lore {id: $id}), (c:Character {name: $name}) MERGE (l)-[:Describes]->(c)",
+                {"id": lore_id, "name": name}
+            )
+        for scene_id in scenes:
+            self._execute(
+                "MATCH (l:Lore {id: $id}), (s:Scene {id: $scene_id}) MERGE (l)-[:Describes]->(s)",
+                {"id": lore_id, "scene_id": scene_id}
+            )
+        if scenes:
+            self._context_cache.clear()
+
+    def enter_scene(self, parent_id: str, choice: str, text: str, characters: list = (), story_id: Union[str, None] = None):
+        """
+        Store a generated scene as the child of parent_id, reached by
+        choice. An unknown parent becomes the first scene of a new story,
+        story_id (or, by default, the parent's id).
+
+        The same text generated from the same parent and choice maps to the
+        same scene, each scene has exactly one parent.
+
+        Returns:
+            The new scene's id
+        """
+        with self._lock:
+            return self._enter_scene(parent_id, choice, text, characters, story_id or parent_id)
+
+    def _enter_scene(self, parent_id: str, choice: str, text: str, characters: list, story_id: str):
+        parent = self._scene(parent_id)
+        if parent is None:
+            self._execute(
+                "CREATE (:Scene {id: $id, story_id: $story_id, parent_id: '', choice: '', text: '', depth: 0})",
+                {"id": parent_id, "story_id": story_id}
+            )
+            parent = {"story_id": story_id, "depth": 0}
+            self._context_cache.put(parent_id, (SceneEntry(parent_id, "", ""),))
+
+        scene_id = scene_key(parent_id, choice, text)
+        scene = self._scene(scene_id)
+        if scene is None:
+            self._execute(
+                """
+                MATCH (p:Scene {id: $parent_id})
+                CREATE (p)-[:Next {choice: $choice}]->(:Scene {id: $id, story_id: $story_id, parent_id: $parent_id, choice: $choice, text: $text, depth: $depth})
+                """,
+                {"id": scene_id, "story_id": parent["story_id"], "parent_id": parent_id, "choice": choice, "text": text, "depth": parent["depth"] + 1}
+            )
+            # O(1) per turn: extend the parent's memoized context
+            self._context_cache.put(scene_id, (self.ancestors(parent_id) + (SceneEntry(scene_id, choice, text),))[-self.max_depth:])
+        if characters:
+            self._execute(
+                """
+                MATCH (s:Scene {id: $id})
+                UNWIND $names AS name
+                MERGE (c:Character {name: name}) ON CREATE SET c.description = ''
+                MERGE (s)-[:Features]->(c)
+                """,
+                {"id": scene_id, "names": list(characters)}
+            )
+        return scene_id
+
+    def ancestors(self, scene_id: str):
+        """
+        Return the last max_depth scenes leading to scene_id (included),
+        with their lore, oldest first. Memoized
+        per scene, a miss walks back through the graph once.
+        """
+        context = self._context_cache.get(scene_id)
+        if context is None:
+            response = self._execute(
+                f"""
+                MATCH p = (a:Scene)-[:Next*0..{self.max_depth - 1}]->(s:Scene {{id: $id}})
+                OPTIONAL MATCH (a)<-[:Describes]-(l:Lore)
+                RETURN a.id, a.choice, a.text, collect(l.text), length(p) AS hops
+                ORDER BY hops DESC
+                """,
+                {"id": scene_id}
+            )
+            context = tuple(SceneEntry(scene_id, choice, text, tuple(sorted(lore or ()))) for scene_id, choice, text, lore, _ in response)
+            if context:
+                self._context_cache.put(scene_id, context)
+        return context
+
+    def lore(self, characters: list):
+        """
+        Return the text of lore describing any of the characters. Scene
+        lore comes with ancestors().
+        """
+        response = self._execute(
+            """
+            MATCH (l:Lore)-[:Describes]->(c:Character)
+            WHERE c.name IN $names
+            RETURN DISTINCT l.id, l.text
+            ORDER BY l.id
+            """,
+            {"names": list(characters)}
+        )
+        return [row[1] for row in response]
+
+    def characters(self, names: list):
+        """
+        Return {name: description} for the known characters among names.
+        """
+        response = self._execute(
+            "MATCH (c:Character) WHERE c.name IN $names RETURN c.name, c.description",
+            {"names": list(names)}
+        )
+        return {name: description for name, description in response}
+
+    def story_of(self, scene_id: str):
+        """
+        Return the story a scene belongs to, None for an unknown scene.
+        """
+        scene = self._scene(scene_id)
+        return scene["story_id"] if scene else None
+
+    def add_memories(self, rows: list):
+        """
+        Insert embedded scenes, dicts of id, story_id, text and embedding.
+        Scenes already in the Memory table are skipped, and the inserted
+        rows are returned.
+
+        The table has no vector index: inserting into kuzu's HNSW index
+        gets slower as it grows, and StoryMemory searches per story anyway.
+        """
+        with self._lock:
+            existing = {row[0] for row in self._execute(
+                "UNWIND $ids AS id MATCH (m:Memory {id: id}) RETURN m.id",
+                {"ids": [row["id"] for row in rows]}
+            )}
+            rows = [row for row in rows if row["id"] not in existing]
+            self.db.bulk_insert("Memory", rows)
+            return rows
+
+    def memories(self, story_id: str):
+        """
+        Return the story's embedded scenes as (id, text, embedding) rows.
+        """
+        response = self._execute(
+            "MATCH (m:Memory) WHERE m.story_id = $story_id RETURN m.id, m.text, m.embedding",
+            {"story_id": story_id}
+        )
+        return response.get_all()
+
+    def mark_important(self, scene_id: str, important: bool = True):
+        """
+        Mark (or unmark) a scene as important, so it's retrieved for the
+        rest of its story regardless of depth or similarity.
+        """
+        with self._lock:
+            if not important:
+                self._execute("MATCH (i:Important {id: $id}) DELETE i", {"id": scene_id})
+                return
+            self._execute(
+                """
+                MATCH (s:Scene {id: $id})
+                MERGE (i:Important {id: s.id})
+                SET i.story_id = s.story_id, i.choice = s.choice, i.text = s.text, i.depth = s.depth
+                """,
+                {"id": scene_id}
+            )
+
+    def important(self, story_id: str, limit: int = settings.STORY_IMPORTANT_MAX):
+        """
+        Return the story's last limit important scenes, oldest first.
+        """
+        response = self._execute(
+            """
+            MATCH (i:Important) WHERE i.story_id = $story_id
+            RETURN i.id, i.choice, i.text, i.depth
+            ORDER BY i.depth DESC
+            LIMIT $limit
+            """,
+            {"story_id": story_id, "limit": limit}
+        )
+        return [SceneEntry(scene_id, choice, text) for scene_id, choice, text, _ in reversed(response.get_all())]
+
+    def cache_stats(self):
+        return self._context_cache.stats()
+
+    def _execute(self, query: str, parameters: Union[dict, None] = None):
+        with self._lock:
+            return self.conn.execute(query, parameters or {})
+
+    def _merge_character(self, name: str):
+        self._execute("MERGE (c:Character {name: $name}) ON CREATE SET c.description = ''", {"name": name})
+
+    def _scene(self, scene_id: str):
+        response = self._execute(
+            "MATCH (s:Scene {id: $id}) RETURN s.story_id AS story_id, s.parent_id AS parent_id, s.depth AS depth",
+            {"id": scene_id}
+        )
+        rows = list(response.rows_as_dict())
+        return rows[0] if rows else None
+
+def scene_key(parent_id: str, choice: str, text: str):
+    return hashlib.sha1(f"{parent_id}\0{choice}\0{text}".encode()).hexdigest()[:16]
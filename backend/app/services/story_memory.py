@@ -0,0 +1,168 @@
+# ------------------------------------------------------------------------
+# Story Memory
+#
+# Long-term memory over generated scenes. New scenes are queued and
+# embedded in batches by a background thread, stored in the story graph's
+# Memory table, and appended to an in-memory index per story. A story's
+# index is loaded from the graph on first use, and searched exactly: one
+# matrix-vector product over that story's scenes only, so other stories
+# don't slow it down, and the number of scenes retrieved is fixed.
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import time
+import queue
+import threading
+import numpy as np
+from typing import Callable
+from app.services.story_graph import StoryGraph, SceneEntry
+from app.services.lru_cache import LRUCache
+from app.config import settings
+
+class StoryIndex:
+    """
+    Append-only embedding matrix of one story's scenes. Capacity doubles
+    as scenes are added, so appends never rebuild the index.
+    """
+    def __init__(self):
+        self.ids = []
+        self.texts = []
+        self._vectors = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids: list, texts: list, embeddings):
+        embeddings = _normalized(embeddings)
+        n = len(self.ids)
+        if self._vectors is None:
+            self._vectors = np.empty((max(len(ids), 16), embeddings.shape[1]), dtype=np.float32)
+        if n + len(ids) > len(self._vectors):
+            grown = np.empty((max(2 * len(self._vectors), n + len(ids)), self._vectors.shape[1]), dtype=np.float32)
+            grown[:n] = self._vectors[:n]
+            self._vectors = grown
+        self._vectors[n:n + len(ids)] = embeddings
+        self.ids.extend(ids)
+        self.texts.extend(texts)
+
+    def search(self, embedding, k: int):
+        """
+        Return [(row, cosine similarity)] for the k nearest scenes, nearest first.
+        """
+        n = len(self.ids)
+        if n == 0 or k <= 0:
+            return []
+        scores = self._vectors[:n] @ _normalized(embedding)[0]
+        top = np.argpartition(-scores, min(k, n) - 1)[:k]
+        return sorted(zip(top.tolist(), scores[top].tolist()), key=lambda hit: -hit[1])
+
+class StoryMemory:
+    """
+    Args:
+        story_graph: Graph holding the Memory table
+        embed_texts: Returns one embedding per text, e.g. TextEmbedder.embed_texts
+        batch_size: Scenes per embedding pass
+        interval: Seconds to wait for a batch to fill before embedding it
+        max_stories: Story indexes kept in memory, least recently used are reloaded from the graph
+    """
+    def __init__(self, story_graph: StoryGraph, embed_texts: Callable, batch_size: int = settings.STORY_EMBED_BATCH_SIZE, interval: float = settings.STORY_EMBED_INTERVAL, max_stories: int = settings.STORY_MEMORY_STORIES):
+        self.story_graph = story_graph
+        self.embed_texts = embed_texts
+        self.batch_size = batch_size
+        self.interval = interval
+        self.n_embedded = 0
+        self.n_batches = 0
+        self.n_failed = 0
+        self._indexes = LRUCache(maxsize=max_stories)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name="story-memory", daemon=True).start()
+
+    def add(self, scene_id: str, story_id: str, text: str):
+        """
+        Queue a scene to be embedded, without blocking generation.
+        """
+        if text.strip():
+            self._queue.put({"id": scene_id, "story_id": story_id, "text": text})
+
+    def search(self, story_id: str, query: str, k: int = settings.STORY_MEMORY_K, exclude: set = frozenset()):
+        """
+        Return the story's k embedded scenes most relevant to query, most
+        relevant first, skipping any in exclude (e.g. scenes already in
+        context).
+        """
+        embedding = self.embed_texts([query])
+        with self._lock:
+            index = self._index(story_id)
+            hits = index.search(embedding, k + len(exclude))
+            entries = [SceneEntry(index.ids[row], "", index.texts[row]) for row, _ in hits]
+        return [entry for entry in entries if entry.scene_id not in exclude][:k]
+
+    def flush(self):
+        """
+        Block until every queued scene has been embedded (or failed).
+        """
+        self._queue.join()
+
+    def stats(self):
+        return {
+            "embedded": self.n_embedded,
+            "batches": self.n_batches,
+            "failed": self.n_failed,
+            "queued": self._queue.qsize(),
+            "stories": self._indexes.stats()
+        }
+
+    def _index(self, story_id: str):
+        index = self._indexes.get(story_id)
+        if index is None:
+            index = StoryIndex()
+            rows = self.story_graph.memories(story_id)
+            if rows:
+                index.add([row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows])
+            self._indexes.put(story_id, index)
+        return index
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # wait briefly for more scenes, one forward pass per batch
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._embed(batch)
+            except Exception as e:
+                self.n_failed += len(batch)
+                print(f"Failed to embed {len(batch)} scenes: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _embed(self, batch: list):
+        rows = list({row["id"]: row for row in batch}.values())
+        embeddings = _normalized(self.embed_texts([row["text"] for row in rows]))
+        with self._lock:
+            rows = self.story_graph.add_memories([{**row, "embedding": embedding.tolist()} for row, embedding in zip(rows, embeddings)])
+            # stories not loaded yet pick the new rows up from the graph
+            for story_id in {row["story_id"] for row in rows}:
+                if story_id in self._indexes:
+                    story_rows = [row for row in rows if row["story_id"] == story_id]
+                    self._indexes.get(story_id).add([row["id"] for row in story_rows], [row["text"] for row in story_rows], [row["embedding"] for row in story_rows])
+        self.n_embedded += len(rows)
+        self.n_batches += 1
+
+def _normalized(embeddings):
+    # torch tensors (TextEmbedder), numpy arrays and lists alike
+    if hasattr(embeddings, "cpu"):
+        embeddings = embeddings.cpu().numpy()
+    embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, np.shape(embeddings)[-1])
+    return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
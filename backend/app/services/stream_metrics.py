@@ -0,0 +1,63 @@
+# ------------------------------------------------------------------------
+# Stream Metrics
+#
+# Time-to-first-token, prompt prefill and decode throughput of recent
+# story generations, kept in a bounded window so percentiles reflect
+# current load.
+# ------------------------------------------------------------------------
+
+import threading
+import numpy as np
+from collections import deque
+from typing import Union
+
+class StreamMetrics:
+    """
+    Record one entry per generation and summarize the last window entries.
+    """
+    def __init__(self, window: int = 1024):
+        self.window = window
+        self.n_requests = 0
+        self.n_retries = 0
+        self._records = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, ttft: Union[float, None], n_tokens: int, decode_seconds: float, n_retries: int = 0, prefill_seconds: Union[float, None] = None, prompt_tokens: Union[int, None] = None):
+        """
+        Args:
+            ttft: Seconds from request to first token, None if nothing was generated
+            n_tokens: Tokens generated, including any discarded by retries
+            decode_seconds: Seconds from first to last token
+            n_retries: Generations aborted and retried (e.g. invalid output)
+            prefill_seconds: Prompt evaluation time reported by Ollama
+            prompt_tokens: Prompt tokens Ollama evaluated, those served from
+                its KV cache aren't counted
+        """
+        tokens_per_second = n_tokens / decode_seconds if decode_seconds > 0 else None
+        with self._lock:
+            self.n_requests += 1
+            self.n_retries += n_retries
+            self._records.append((ttft, n_tokens, tokens_per_second, prefill_seconds, prompt_tokens))
+
+    def summary(self):
+        with self._lock:
+            records = list(self._records)
+        ttfts = [record[0] for record in records if record[0] is not None]
+        rates = [record[2] for record in records if record[2] is not None]
+        prefills = [record[3] for record in records if record[3] is not None]
+        prompt_tokens = [record[4] for record in records if record[4] is not None]
+        return {
+            "requests": self.n_requests,
+            "retries": self.n_retries,
+            "window": len(records),
+            "ttft_ms": percentiles([ttft * 1000 for ttft in ttfts]),
+            "prefill_ms": percentiles([prefill * 1000 for prefill in prefills]),
+            "prompt_tokens": percentiles(prompt_tokens),
+            "tokens_per_second": percentiles(rates),
+            "tokens": sum(record[1] for record in records)
+        }
+
+def percentiles(values: list):
+    if not values:
+        return {"p50": None, "p90": None, "p99": None}
+    return {f"p{q}": float(np.percentile(values, q)) for q in (50, 90, 99)}
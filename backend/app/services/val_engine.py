@@ -1,22 +1,192 @@
 # ------------------------------------------------------------------------
 # Validation Engine
-# 
-# Validate outgoing story generation responses.
-# TODO: still deciding whether to include here or in Godot
+#
+# Validate outgoing story generation responses against Dialogic 2's
+# Timeline Text Syntax (see app/services/prompt_builder.py), line by line
+# as tokens stream in, so clearly invalid output can be aborted early.
 # ------------------------------------------------------------------------
 
+import re
+
+NARRATOR = "narrator"
+
+# "Name: text", "Name (emotion): text", "- choice"
+_NAME = r"[^\W_][\w .'-]*?"
+_SPEAKER = re.compile(rf"(?P<name>{_NAME})(?:\s*\((?P<emotion>[^()\n]*)\))?\s*:")
+# what a speaker prefix can look like before its ":" has arrived
+_PARTIAL_SPEAKER = re.compile(rf"{_NAME}(?:\s*\([^()\n]*\)?)?\s*")
+_CHOICE = re.compile(r"-\s*\S")
+_MAX_PREFIX = 64 # chars without a ":" before a line can't be a speaker prefix
+
+class DialogicSyntaxError(ValueError):
+    """
+    Raised when a generated line breaks the Timeline Text Syntax rules.
+    """
+    def __init__(self, reason: str, line: str):
+        super().__init__(f"{reason}: {line.strip()!r}" if line.strip() else reason)
+        self.reason = reason
+        self.line = line
+
+class DialogicValidator:
+    """
+    Line-level state machine over a token stream. Each line's prefix (its
+    speaker, or the choice marker) is held back until it has been checked,
+    after which the rest of the line is released token by token, so an
+    invalid prefix never reaches the client.
+
+    Raises DialogicSyntaxError from feed() or finish() at the first
+    invalid line.
+    """
+    def __init__(self, characters: set, min_choices: int = 2, max_choices: int = 4):
+        self.characters = characters # casefolded, empty accepts any speaker
+        self.min_choices = min_choices
+        self.max_choices = max_choices
+        self.n_lines = 0
+        self.n_choices = 0 # in the current set of consecutive choices
+        self._line = ""
+        self._checked = False # current line's prefix has been checked and released
+
+    def feed(self, text: str):
+        """
+        Add streamed text, returning the part of it (and of any held back
+        prefix) that is safe to release.
+        """
+        released = []
+        while text:
+            end = text.find("\n") + 1 or len(text)
+            piece, text = text[:end], text[end:]
+            self._line += piece
+            complete = piece.endswith("\n")
+            if self._checked:
+                released.append(piece)
+            elif self._check_prefix(self._line, complete):
+                self._checked = True
+                released.append(self._line)
+            if complete:
+                self._end_line()
+        return "".join(released)
+
+    def finish(self):
+        """
+        Check the last (unterminated) line and the response as a whole,
+        returning any text still held back.
+        """
+        released = ""
+        if self._line:
+            if not self._checked:
+                self._check_prefix(self._line, complete=True)
+                released = self._line
+            self._end_line()
+        if 0 < self.n_choices < self.min_choices:
+            raise DialogicSyntaxError(f"fewer than {self.min_choices} choices", "")
+        return released
+
+    def _check_prefix(self, line: str, complete: bool):
+        """
+        Return True once the line's prefix is known to be valid, False if
+        more text is needed.
+        """
+        stripped = line.lstrip()
+        if not stripped:
+            return complete # blank lines are fine
+        if stripped[0] == "-":
+            self.n_choices += 1
+            if self.n_choices > self.max_choices:
+                raise DialogicSyntaxError(f"more than {self.max_choices} choices", line)
+            return True
+
+        match = _SPEAKER.match(stripped)
+        if match is None:
+            prefix = stripped.rstrip("\n")
+            if complete or len(prefix) > _MAX_PREFIX or not _PARTIAL_SPEAKER.fullmatch(prefix):
+                raise DialogicSyntaxError("not a speaker, narrator or choice line", line)
+            return False
+
+        if 0 < self.n_choices < self.min_choices:
+            raise DialogicSyntaxError(f"fewer than {self.min_choices} choices", line)
+        self.n_choices = 0
+
+        name, emotion = match.group("name").strip(), match.group("emotion")
+        if emotion is not None and not emotion.strip():
+            raise DialogicSyntaxError("empty emotion", line)
+        if name.casefold() == NARRATOR:
+            if emotion is not None:
+                raise DialogicSyntaxError("narrator can't have an emotion", line)
+        elif self.characters and name.casefold() not in self.characters:
+            raise DialogicSyntaxError(f"unknown character {name!r}", line)
+        return True
+
+    def _end_line(self):
+        line = self._line.strip()
+        self._line, self._checked = "", False
+        if not line:
+            return
+        self.n_lines += 1
+        if line[0] == "-":
+            if not _CHOICE.match(line):
+                raise DialogicSyntaxError("empty choice", line)
+        elif not line[_SPEAKER.match(line).end():].strip():
+            raise DialogicSyntaxError("empty dialogue", line)
+
 class ValEngine:
-    def __init__(self):
-        # init with 
-        pass 
-    
-    def validate_characters(self):
+    """
+    Validate story generation responses for a scene's active characters.
+    """
+    def __init__(self, min_choices: int = 2, max_choices: int = 4):
+        self.min_choices = min_choices
+        self.max_choices = max_choices
+
+    def validator(self, active_chars: list = ()):
+        """
+        Return a fresh DialogicValidator for one streamed response.
+
+        Args:
+            active_chars: Character names or CharacterStates allowed to
+                speak (besides the narrator), empty to accept anyone
+        """
+        characters = {getattr(char, "name", char).casefold() for char in active_chars}
+        return DialogicValidator(characters, self.min_choices, self.max_choices)
+
+    def validate_characters(self, response: str, active_chars: list):
         """
-        Validate that all characters in story generation response are valid.
+        Return the speakers in a story generation response that aren't
+        active characters (or the narrator).
         """
-        pass 
+        characters = {getattr(char, "name", char).casefold() for char in active_chars}
+        unknown = []
+        for line in response.splitlines():
+            match = _SPEAKER.match(line.strip())
+            if match is None:
+                continue
+            name = match.group("name").strip()
+            if name.casefold() not in characters | {NARRATOR} | {known.casefold() for known in unknown}:
+                unknown.append(name)
+        return unknown
 
-    def validate_response(self):
+    def choices(self, response: str):
+        """
+        Return the choices a story generation response ends with, the text
+        of its trailing "- UserChoice" lines, or [] if it doesn't end in a
+        set of choices.
+        """
+        choices = []
+        for line in response.splitlines():
+            line = line.strip()
+            if _CHOICE.match(line):
+                choices.append(line[1:].strip())
+            elif line:
+                choices = []
+        return choices
+
+    def validate_response(self, response: str, active_chars: list = ()):
+        """
+        Validate that a complete story generation response is valid
+        Dialogic format, returning the first error or None.
         """
-        Validate that story generation response is valid Dialogic format.
-        """
\ No newline at end of file
+        validator = self.validator(active_chars)
+        try:
+            validator.feed(response)
+            validator.finish()
+        except DialogicSyntaxError as e:
+            return str(e)
+        return None
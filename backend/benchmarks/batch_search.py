@@ -0,0 +1,88 @@
+# ------------------------------------------------------------------------
+# Batch Search Benchmark
+#
+# Per-query cost of N search_image_assets calls against one
+# search_image_assets_batch call of N requests (query encoding plus vector
+# lookup, caches cleared between runs), on a synthetic index.
+#
+# Run with: python backend/benchmarks/batch_search.py --db numpy
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import argparse
+import tempfile
+import numpy as np
+from pathlib import Path
+from app.config import settings
+from app.models.api_schemas import AssetRequest
+from app.models.embeddings import TextEmbedder
+from query_encoder import QUERIES
+
+def make_asset_manager(tmp: Path, encoder, n_rows: int):
+    from app.services.asset_manager import AssetManager
+    asset_manager = AssetManager(db_path=tmp / "vdb", asset_path=tmp / "assets", cache_path=tmp / "cache")
+    asset_manager.text_embedder = encoder
+    asset_manager.initialize_db()
+
+    embeddings = np.random.default_rng(0).standard_normal((n_rows, settings.IMAGE_TEXT_DIM), dtype=np.float32)
+    asset_manager._db.bulk_insert("Image", [
+        {
+            "image_path": f"{category}/{i}.webp",
+            "image_name": f"{i}.webp",
+            "image_type": ".webp",
+            "image_category": category,
+            "image_embedding": embedding.tolist(),
+            "image_metadata": f"caption {i}"
+        }
+        for i, (embedding, category) in enumerate(zip(embeddings, np.random.default_rng(1).choice(["bg", "cg"], size=n_rows)))
+    ])
+    asset_manager._db.create_vector_index("Image", "image_index", "image_embedding")
+    return asset_manager
+
+def clear_caches(asset_manager):
+    asset_manager._search_cache.clear()
+    asset_manager._query_embedding_cache.clear()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-id", default=settings.IMAGE_TEXT_MODEL_ID)
+    parser.add_argument("--db", default=settings.DB_TYPE, choices=["kuzu", "numpy"])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    encoder = TextEmbedder(model_id=args.model_id, device=settings.DEVICE)
+    settings.DB_TYPE = args.db
+    settings.IMAGE_TEXT_DIM = encoder.model.config.hidden_size
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asset_manager = make_asset_manager(Path(tmp), encoder, args.rows)
+
+        print(f"{'n':>4} {'single (ms/query)':>18} {'batch (ms/query)':>17} {'ratio':>6}")
+        for n in args.batch_sizes:
+            requests = [
+                AssetRequest(asset_type="image", query=f"{QUERIES[i % len(QUERIES)]} {i}", asset_category="bg")
+                for i in range(n)
+            ]
+            single, batch = [], []
+            for _ in range(args.repeats):
+                clear_caches(asset_manager)
+                start = time.perf_counter()
+                for request in requests:
+                    asset_manager.search_image_assets(request, k=args.k)
+                single.append((time.perf_counter() - start) / n)
+
+                clear_caches(asset_manager)
+                start = time.perf_counter()
+                asset_manager.search_image_assets_batch(requests, k=args.k)
+                batch.append((time.perf_counter() - start) / n)
+
+            single_ms, batch_ms = np.median(single) * 1000, np.median(batch) * 1000
+            print(f"{n:>4} {single_ms:>18.2f} {batch_ms:>17.2f} {batch_ms / single_ms:>6.2f}")
@@ -0,0 +1,78 @@
+# ------------------------------------------------------------------------
+# Bulk Insert Benchmark
+#
+# Compare one parameterized CREATE per row against KuzuDB.bulk_insert.
+#
+# Run with: python backend/benchmarks/bulk_insert.py
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import argparse
+import tempfile
+import numpy as np
+from pathlib import Path
+from app.database import KuzuDB
+from app.config import settings
+
+def image_schema(dim: int):
+    return {
+        "table_name": "Image",
+        "image_id": "SERIAL PRIMARY KEY",
+        "image_path": "STRING",
+        "image_embedding": f"DOUBLE[{dim}]",
+        "image_metadata": "STRING"
+    }
+
+def make_rows(n: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n, dim), dtype=np.float32)
+    return [
+        {
+            "image_path": f"bg/pack/{i}.webp",
+            "image_embedding": embeddings[i].tolist(),
+            "image_metadata": f"caption {i}"
+        }
+        for i in range(n)
+    ]
+
+def insert_loop(db: KuzuDB, rows: list):
+    for row in rows:
+        db.conn.execute(
+            """
+            CREATE (n:Image {
+                image_path: $image_path,
+                image_embedding: $image_embedding,
+                image_metadata: $image_metadata
+            })
+            """,
+            row
+        )
+
+def insert_bulk(db: KuzuDB, rows: list):
+    db.bulk_insert("Image", rows)
+
+def bench(insert, rows: list, dim: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = KuzuDB(Path(tmp) / "bench.kuzu")
+        db.create_schema(image_schema(dim))
+        start = time.perf_counter()
+        insert(db, rows)
+        return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--dim", type=int, default=settings.IMAGE_TEXT_DIM)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'loop (s)':>10} {'bulk (s)':>10} {'speedup':>8}")
+    for n in args.sizes:
+        rows = make_rows(n, args.dim)
+        loop_time = bench(insert_loop, rows, args.dim)
+        bulk_time = bench(insert_bulk, rows, args.dim)
+        print(f"{n:>8} {loop_time:>10.2f} {bulk_time:>10.2f} {loop_time / bulk_time:>7.1f}x")
@@ -0,0 +1,71 @@
+# ------------------------------------------------------------------------
+# Caption Concurrency Benchmark
+#
+# Time embed_image_assets(infer_metadata=True) against a local stub Ollama
+# server with fixed latency, for several caption_concurrency values.
+#
+# Run with: python backend/benchmarks/caption_concurrency.py
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import argparse
+import tempfile
+import numpy as np
+import torch
+from pathlib import Path
+from PIL import Image
+from app.services.asset_manager import AssetManager
+from app.models.llm_wrapper import OllamaAdapter
+from app.config import settings
+from benchmarks.stub_ollama import StubOllama
+
+class SleepyEmbedder:
+    """
+    Stand-in for SigLIP2 with a fixed cost per image, so the overlap between
+    embedding and captioning shows up without loading the real model.
+    """
+    def __init__(self, seconds_per_image: float):
+        self.seconds_per_image = seconds_per_image
+
+    def embed_images(self, images, batch_size: int = 16):
+        time.sleep(self.seconds_per_image * len(images))
+        return np.ones((len(images), settings.IMAGE_TEXT_DIM), dtype=np.float32)
+
+    def embed_text(self, text):
+        return torch.ones((1, settings.IMAGE_TEXT_DIM))
+
+def make_asset_manager(asset_path: Path, cache_path: Path, url: str, seconds_per_image: float):
+    asset_manager = AssetManager(asset_path=asset_path, cache_path=cache_path)
+    asset_manager.image_text_embedder = SleepyEmbedder(seconds_per_image)
+    asset_manager.vlm_adapter = OllamaAdapter(url=url, model="stub")
+    asset_manager.llm_scheduler = None # measure the caption pool itself, not LLM_CLASS_CONCURRENCY
+    return asset_manager
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub VLM latency per caption (s)")
+    parser.add_argument("--embed_cost", type=float, default=0.02, help="simulated embedding cost per image (s)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, StubOllama(latency=args.latency) as stub:
+        asset_path = Path(tmp) / "backend" / "data" / "assets"
+        (asset_path / "bg").mkdir(parents=True)
+        for i in range(args.n):
+            Image.new("RGB", (64, 64), color=(i % 256, 0, 0)).save(asset_path / "bg" / f"{i}.jpg")
+
+        print(f"{'concurrency':>11} {'seconds':>8} {'images/sec':>11}")
+        for concurrency in args.concurrency:
+            # fresh cache per run so every image is a miss
+            asset_manager = make_asset_manager(asset_path, Path(tmp) / f"cache_{concurrency}", stub.url, args.embed_cost)
+            assets = asset_manager.parse_image_assets()
+            start = time.perf_counter()
+            asset_manager.embed_image_assets(assets, infer_metadata=True, caption_concurrency=concurrency)
+            elapsed = time.perf_counter() - start
+            print(f"{concurrency:>11} {elapsed:>8.2f} {args.n / elapsed:>11.2f}")
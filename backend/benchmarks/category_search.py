@@ -0,0 +1,82 @@
+# ------------------------------------------------------------------------
+# Category Search Benchmark
+#
+# On a mixed-category corpus, compare searching the whole index and
+# post-filtering to one category against a filtered (partitioned) search:
+# p50/p99 latency and recall@k against the exact in-category neighbours.
+#
+# Run with: python backend/benchmarks/category_search.py
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import argparse
+import tempfile
+import numpy as np
+from pathlib import Path
+from app.database import faiss
+from app.config import settings
+from bulk_insert import image_schema, make_rows
+from vector_backends import BACKENDS, ground_truth
+
+# share of the corpus in each category, "bg" is the one searched
+CATEGORIES = {"bg": 0.1, "cg": 0.3, "portrait": 0.6}
+
+def search(db, query, k: int, category: str, partitioned: bool, oversample: int, efs: int):
+    if partitioned:
+        return db.query_vector_index("Image", "image_index", query, k, columns=["image_path"], efs=efs, filters={"image_category": category})
+    res = db.query_vector_index("Image", "image_index", query, k * oversample, columns=["image_path", "image_category"], efs=efs)
+    return [row for row in res if row["image_category"] == category][:k]
+
+def bench(name: str, rows: list, queries, truth: list, k: int, dim: int, oversample: int, efs: int):
+    make_db, index_params = BACKENDS[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        db = make_db(Path(tmp))
+        db.create_schema({**image_schema(dim), "image_category": "STRING"})
+        db.bulk_insert("Image", rows)
+        db.create_vector_index("Image", "image_index", "image_embedding", **index_params)
+
+        results = {}
+        for partitioned in (False, True):
+            latencies, recalls = [], []
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                res = search(db, query.tolist(), k, "bg", partitioned, oversample, efs)
+                latencies.append(time.perf_counter() - start)
+                recalls.append(len(expected & {row["image_path"] for row in res}) / k)
+            results[partitioned] = (np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000, np.mean(recalls))
+        return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--dim", type=int, default=settings.IMAGE_TEXT_DIM)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--oversample", type=int, default=4, help="post-filter fetches k * oversample results")
+    parser.add_argument("--efs", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", default=["kuzu-hnsw", "numpy-exact", "faiss-hnsw"])
+    args = parser.parse_args()
+
+    if faiss is None:
+        args.backends = [name for name in args.backends if not name.startswith("faiss")]
+
+    print(f"{'rows':>8} {'backend':>12} {'search':>12} {'p50 (ms)':>9} {'p99 (ms)':>9} {'recall':>7}")
+    for n in args.sizes:
+        rows = make_rows(n, args.dim)
+        categories = np.random.default_rng(2).choice(list(CATEGORIES), size=n, p=list(CATEGORIES.values()))
+        for row, category in zip(rows, categories):
+            row["image_category"] = str(category)
+        queries = np.random.default_rng(1).standard_normal((args.queries, args.dim), dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        truth = ground_truth([row for row in rows if row["image_category"] == "bg"], queries, args.k)
+
+        for name in args.backends:
+            results = bench(name, rows, queries, truth, args.k, args.dim, args.oversample, args.efs)
+            for partitioned, (p50, p99, recall) in results.items():
+                label = "partitioned" if partitioned else "post-filter"
+                print(f"{n:>8} {name:>12} {label:>12} {p50:>9.2f} {p99:>9.2f} {recall:>7.3f}")
@@ -0,0 +1,83 @@
+# ------------------------------------------------------------------------
+# Dialogic Validator Benchmark
+#
+# Per-token and per-line overhead of the streaming Dialogic validator, and
+# how many tokens the stub server still sends for an invalid generation
+# once the validator aborts it.
+#
+# Run with: python backend/benchmarks/dialogic_validator.py
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import re
+import time
+import asyncio
+import argparse
+from app.config import settings
+from app.models.llm_wrapper import AsyncOllamaAdapter
+from app.services.rag_engine import GraphRAG
+from app.services.story_graph import StoryGraph
+from app.services.val_engine import ValEngine
+from stub_ollama import StubOllama
+
+LINES = [
+    "John (happy): Lovely to see you again, it has been far too long since the festival.",
+    "narrator: John looks around, noticing the sky in the distance turning orange.",
+    "Mary (worried): We should get inside before the storm reaches the harbour.",
+    "- Follow Mary inside",
+    "- Stay and watch the storm",
+    "- Ask John about the festival"
+]
+
+def tokenize(text: str):
+    """
+    Split into ~4 character tokens with their leading whitespace, like a BPE stream.
+    """
+    return re.findall(r"\s*\S{1,4}|\s+", text)
+
+def time_validator(tokens: list, repeats: int):
+    engine = ValEngine()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        validator = engine.validator(["John", "Mary"])
+        for token in tokens:
+            validator.feed(token)
+        validator.finish()
+    return (time.perf_counter() - start) / repeats
+
+async def stream_invalid(url: str):
+    rag_engine = GraphRAG(llm_adapter=AsyncOllamaAdapter(url=url, model="stub"), story_graph=StoryGraph(":memory:"))
+    async for _ in rag_engine.generate_stream(scene_id="ID0001", context="", active_chars=["John", "Mary"], history=[], user_choice="Wait", options={}):
+        pass
+    await rag_engine.llm_adapter.aclose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=2000)
+    parser.add_argument("--invalid-tokens", type=int, default=200, help="length of the invalid stub generation")
+    args = parser.parse_args()
+
+    # tokens are fed to the validator as they arrive, one line may span many
+    text = "\n".join(LINES * 4)
+    tokens = tokenize(text)
+    n_lines = text.count("\n") + 1
+    seconds = time_validator(tokens, args.repeats)
+    print(f"{len(tokens)} tokens, {n_lines} lines: {seconds * 1e6:.1f} us/response, "
+          f"{seconds / len(tokens) * 1e6:.2f} us/token, {seconds / n_lines * 1e6:.2f} us/line")
+
+    # an unknown speaker is caught at its prefix, before the rest of the line is generated
+    invalid = ["Villain", ": "] + ["Mwa"] * args.invalid_tokens
+    valid = tokenize(LINES[0])
+    settings.VALIDATION_MAX_RETRIES = 1
+    with StubOllama(latency=0.0, responses=[invalid, valid], token_latency=0.01) as stub:
+        start = time.perf_counter()
+        asyncio.run(stream_invalid(stub.url))
+        elapsed = time.perf_counter() - start
+        time.sleep(0.2) # let the aborted handler notice the closed connection
+        wasted = stub.n_tokens_sent - len(valid)
+    print(f"invalid generation: {wasted} of {len(invalid)} tokens sent before the abort, "
+          f"regenerated response done in {elapsed:.2f}s (vs {len(invalid) * 0.01:.2f}s for the invalid one alone)")
@@ -0,0 +1,49 @@
+# ------------------------------------------------------------------------
+# Image Embedding Throughput Benchmark
+#
+# Compare images/sec of ImageTextEmbedder.embed_images across batch sizes.
+#
+# Run with: python backend/benchmarks/embed_throughput.py
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import argparse
+import numpy as np
+from PIL import Image
+from app.models.embeddings import ImageTextEmbedder
+from app.config import settings
+
+def make_images(n: int, size: int = 512, seed: int = 0):
+    """
+    Random RGB images, so the benchmark doesn't depend on local asset packs.
+    """
+    rng = np.random.default_rng(seed)
+    return [
+        Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8))
+        for _ in range(n)
+    ]
+
+def bench(embedder: ImageTextEmbedder, images: list, batch_size: int):
+    embedder.embed_images(images[:batch_size], batch_size=batch_size) # warm up
+    start = time.perf_counter()
+    embedder.embed_images(images, batch_size=batch_size)
+    return len(images) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=64)
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--model_id", type=str, default=settings.IMAGE_TEXT_MODEL_ID)
+    args = parser.parse_args()
+
+    embedder = ImageTextEmbedder(model_id=args.model_id, device=settings.DEVICE)
+    images = make_images(args.n)
+
+    print(f"{'batch_size':>10} {'images/sec':>12}")
+    for batch_size in args.batch_sizes:
+        print(f"{batch_size:>10} {bench(embedder, images, batch_size):>12.2f}")
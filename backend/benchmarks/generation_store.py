@@ -0,0 +1,79 @@
+# ------------------------------------------------------------------------
+# Generation Store Benchmark
+#
+# Plays one story against a stub Ollama server, then rolls back to every
+# scene and replays the same choice, as a player exploring branches would.
+# Reports time to first token for the original turns and the replays, the
+# Ollama requests the replays made, and the store's own get/put latency
+# as it fills.
+#
+# Run with: python backend/benchmarks/generation_store.py --turns 20 --entries 1000 100000
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from app.models.llm_wrapper import AsyncOllamaAdapter
+from app.services.rag_engine import GraphRAG
+from app.services.story_graph import StoryGraph
+from app.services.generation_store import GenerationStore
+from app.services.stream_metrics import StreamMetrics
+from stub_ollama import StubOllama
+from story_graph import percentiles
+
+TOKENS = ["Mary (worried): ", "They say ", "the tide ", "is turning ", "early ", "this year."]
+
+async def play(url: str, turns: int, store: GenerationStore):
+    rag_engine = GraphRAG(llm_adapter=AsyncOllamaAdapter(url=url, model="stub"), story_graph=StoryGraph(":memory:"), generation_store=store)
+    scene_id, history, turns_played = "ID0001", [], []
+    for turn in range(turns):
+        choice = f"Ask about rumour {turn}"
+        turns_played.append((scene_id, list(history), choice))
+        async for chunk in rag_engine.generate_stream(scene_id=scene_id, context=[], active_chars=["Mary"], history=history, user_choice=choice, options={}, story_id="story"):
+            if chunk.is_final:
+                scene_id = chunk.fx["scene_id"]
+        history = history + [f"Player: {choice}", "".join(TOKENS)]
+    original = rag_engine.stream_metrics.summary()["ttft_ms"]
+    rag_engine.stream_metrics = StreamMetrics()
+
+    for scene_id, history, choice in turns_played:
+        async for _ in rag_engine.generate_stream(scene_id=scene_id, context=[], active_chars=["Mary"], history=history, user_choice=choice, options={}, story_id="story", replay=True):
+            pass
+    await rag_engine.llm_adapter.aclose()
+    return original, rag_engine.stream_metrics.summary()["ttft_ms"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub seconds to first token")
+    parser.add_argument("--entries", type=int, nargs="+", default=[1000, 100000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, StubOllama(latency=args.latency, tokens=TOKENS) as stub:
+        original, replayed = asyncio.run(play(stub.url, args.turns, GenerationStore(Path(tmp) / "generations.sqlite")))
+        n_replay_requests = stub.n_requests - args.turns
+    print(f"original ttft p50/p99: {original['p50']:.1f} / {original['p99']:.1f} ms")
+    print(f"replay ttft p50/p99:   {replayed['p50']:.2f} / {replayed['p99']:.2f} ms, {n_replay_requests} Ollama requests for {args.turns} replays")
+
+    print(f"{'entries':>8} {'put p50/p99 (ms)':>17} {'get p50/p99 (ms)':>17} {'file (MB)':>10}")
+    for n_entries in args.entries:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = GenerationStore(Path(tmp) / "generations.sqlite", max_entries=n_entries)
+            text = " ".join(TOKENS) * 8
+            now = time.time() - n_entries # filler is older than anything put below
+            with store._lock:
+                store.conn.executemany("INSERT INTO Generation(key, story_id, text, created, used) VALUES (?, ?, ?, ?, ?)", ((f"fill{i}", "story", text, now, now + i) for i in range(n_entries)))
+                store.conn.commit()
+            keys = [f"key{i}" for i in range(200)]
+            put = percentiles(lambda key: store.put(key, "story", text), keys)
+            get = percentiles(store.get, keys)
+            size = (Path(tmp) / "generations.sqlite").stat().st_size / 1e6
+            print(f"{n_entries:>8} {put[0]:>7.3f} / {put[1]:>7.3f} {get[0]:>7.3f} / {get[1]:>7.3f} {size:>10.1f}")
+            store.close()
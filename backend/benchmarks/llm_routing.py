@@ -0,0 +1,98 @@
+# ------------------------------------------------------------------------
+# LLM Routing Benchmark
+#
+# Players streaming story turns, each with its own growing history, across
+# several stub Ollama servers of different speeds that, like Ollama, serve
+# --parallel requests at once and only prefill the part of a prompt after
+# what's in their KV cache. Compares AsyncRoutingAdapter (least outstanding,
+# story affinity) with round robin over the same endpoints, and with
+# --fail, one endpoint starts failing every request partway through.
+# Reports time to first token, the share of prompt tokens served from the
+# KV cache, requests per endpoint and failed turns.
+#
+# Run with: python backend/benchmarks/llm_routing.py --players 6 --turns 10 --fail
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import asyncio
+import argparse
+import itertools
+import httpx
+import numpy as np
+from app.models.llm_wrapper import AsyncRoutingAdapter
+from stub_ollama import StubOllama
+
+SYSTEM = "You write Dialogic scenes for an interactive story. " * 40
+
+class RoundRobinAdapter(AsyncRoutingAdapter):
+    """
+    Next endpoint in turn, skipping those marked down, ignoring load and sessions.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._turn = itertools.count()
+
+    def _select(self, session, tried):
+        now = time.monotonic()
+        self._schedule_health_check(now)
+        untried = [backend for backend in self.backends if backend not in tried]
+        candidates = [backend for backend in untried if backend.available(now)] or untried
+        return candidates[next(self._turn) % len(candidates)]
+
+async def play(adapter, player: int, turns: int, read: float):
+    messages, ttfts, n_failed = [{"role": "system", "content": SYSTEM}], [], 0
+    for turn in range(turns):
+        messages = messages + [{"role": "user", "content": f"Player {player} picks choice {turn}. " * 8}]
+        start, ttft = time.perf_counter(), None
+        try:
+            async for _ in adapter.chat_stream(messages, session=f"story{player}"):
+                ttft = ttft or time.perf_counter() - start
+            ttfts.append(ttft)
+        except (httpx.TransportError, httpx.HTTPStatusError):
+            n_failed += 1
+        messages = messages + [{"role": "assistant", "content": "narrator: The room is quiet. " * 8}]
+        await asyncio.sleep(read)
+    return ttfts, n_failed
+
+async def players(adapter, n_players: int, turns: int, read: float, fail_stub, fail_after: float):
+    async def fail():
+        await asyncio.sleep(fail_after)
+        fail_stub.error_status = 503
+
+    failing = asyncio.ensure_future(fail()) if fail_stub is not None else None
+    results = await asyncio.gather(*(play(adapter, player, turns, read) for player in range(n_players)))
+    if failing is not None:
+        failing.cancel()
+    await adapter.aclose()
+    return [ttft for ttfts, _ in results for ttft in ttfts], sum(n_failed for _, n_failed in results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=6)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--read", type=float, default=0.2, help="seconds a player reads between turns")
+    parser.add_argument("--latencies", type=float, nargs="+", default=[0.05, 0.1, 0.2], help="stub seconds to first token, one stub each")
+    parser.add_argument("--parallel", type=int, default=2, help="requests each stub serves at once")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0005, help="stub seconds of prefill per uncached prompt token")
+    parser.add_argument("--fail", action="store_true", help="fail the fastest endpoint partway through")
+    parser.add_argument("--fail-after", type=float, default=1.0, help="seconds into the run")
+    args = parser.parse_args()
+
+    print(f"{'router':>11} {'ttft p50/p99 (ms)':>18} {'cached':>7} {'failed':>7} {'failovers':>10}  requests per endpoint")
+    for name, router in (("round robin", RoundRobinAdapter), ("least load", AsyncRoutingAdapter)):
+        stubs = [StubOllama(latency=latency, token_latency=0.01, prompt_token_latency=args.prompt_token_latency, parallel=args.parallel) for latency in args.latencies]
+        for stub in stubs:
+            stub.__enter__()
+        adapter = router(urls=[stub.url for stub in stubs], model="stub", health_interval=0.5, retry_after=2.0)
+        fail_stub = stubs[int(np.argmin(args.latencies))] if args.fail else None
+        ttfts, n_failed = asyncio.run(players(adapter, args.players, args.turns, args.read, fail_stub, args.fail_after))
+        for stub in stubs:
+            stub.__exit__(None, None, None)
+        cached = sum(stub.n_cached_tokens for stub in stubs) / sum(stub.n_cached_tokens + stub.n_prompt_tokens for stub in stubs)
+        requests = " / ".join(str(backend["requests"]) for backend in adapter.stats()["backends"])
+        print(f"{name:>11} {np.percentile(ttfts, 50) * 1000:>8.1f} / {np.percentile(ttfts, 99) * 1000:>7.1f} {cached:>7.0%} {n_failed:>7} {adapter.n_failovers:>10}  {requests}")
@@ -0,0 +1,74 @@
+# ------------------------------------------------------------------------
+# LLM Scheduling Benchmark
+#
+# Players streaming story turns while a captioning run (as load_assets
+# with infer_metadata) hammers the same stub Ollama server, which like
+# Ollama serves --parallel requests at once and queues the rest in arrival
+# order. Compares players' time to first token and caption throughput
+# with requests sent straight to the server and through LLMScheduler,
+# and reports the scheduler's queue wait per class.
+#
+# Run with: python backend/benchmarks/llm_scheduling.py --players 4 --captions 64
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import asyncio
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from app.models.llm_wrapper import OllamaAdapter, AsyncOllamaAdapter
+from app.services.llm_scheduler import LLMScheduler, ScheduledAdapter, AsyncScheduledAdapter
+from stub_ollama import StubOllama
+
+async def play(adapter, turns: int, read: float):
+    ttfts = []
+    for turn in range(turns):
+        start, ttft = time.perf_counter(), None
+        async for _ in adapter.chat_stream([{"role": "user", "content": f"turn {turn}"}]):
+            ttft = ttft or time.perf_counter() - start
+        ttfts.append(ttft)
+        await asyncio.sleep(read)
+    return ttfts
+
+async def players(adapter, n_players: int, turns: int, read: float):
+    ttfts = await asyncio.gather(*(play(adapter, turns, read) for _ in range(n_players)))
+    await adapter.aclose()
+    return [ttft for player in ttfts for ttft in player]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--read", type=float, default=0.3, help="seconds a player reads between turns")
+    parser.add_argument("--captions", type=int, default=64)
+    parser.add_argument("--caption-concurrency", type=int, default=8, help="captioning threads")
+    parser.add_argument("--parallel", type=int, default=4, help="requests the stub serves at once")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub seconds to first token")
+    parser.add_argument("--token-latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    print(f"{'scheduler':>9} {'ttft p50/p99 (ms)':>18} {'captions/s':>11} {'interactive wait p99 (ms)':>26} {'caption wait p50 (ms)':>22}")
+    for scheduled in (False, True):
+        scheduler = LLMScheduler(max_in_flight=args.parallel, reserved=1, limits={"caption": args.parallel - 1}, max_queued={})
+        with StubOllama(latency=args.latency, token_latency=args.token_latency, parallel=args.parallel) as stub:
+            captioner = OllamaAdapter(url=stub.url, model="stub")
+            story = AsyncOllamaAdapter(url=stub.url, model="stub")
+            if scheduled:
+                captioner = ScheduledAdapter(captioner, scheduler, "caption")
+                story = AsyncScheduledAdapter(story, scheduler, "interactive")
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.caption_concurrency) as executor:
+                captions = [executor.submit(captioner.chat_chunk, [{"role": "user", "content": f"caption {i}"}], {}, None) for i in range(args.captions)]
+                time.sleep(0.1) # the captioning run is already going when players arrive
+                ttfts = asyncio.run(players(story, args.players, args.turns, args.read))
+                for caption in captions:
+                    caption.result()
+            caption_rate = args.captions / (time.perf_counter() - start)
+        stats = scheduler.stats()["classes"]
+        waits = (f"{stats['interactive']['wait_ms']['p99']:>26.1f} {stats['caption']['wait_ms']['p50']:>22.1f}" if scheduled else f"{'-':>26} {'-':>22}")
+        print(f"{str(scheduled):>9} {np.percentile(ttfts, 50) * 1000:>8.1f} / {np.percentile(ttfts, 99) * 1000:>7.1f} {caption_rate:>11.1f} {waits}")
@@ -0,0 +1,80 @@
+# ------------------------------------------------------------------------
+# Prompt Cache Benchmark
+#
+# Successive turns of one story against a stub Ollama server that, like
+# Ollama, only prefills the part of a prompt after its common prefix with
+# the previous one. Compares the previous prompt layout (retrieved context
+# inside the system prompt, the repr of the whole history in the user
+# message) with PromptBuilder's stable prefix and token budget, reporting
+# the prompt tokens prefilled, their share served from the cache and the
+# prefill time per turn.
+#
+# Run with: python backend/benchmarks/prompt_cache.py --turns 30
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import asyncio
+import argparse
+import numpy as np
+from app.models.llm_wrapper import AsyncOllamaAdapter
+from app.services.rag_engine import GraphRAG
+from app.services.story_graph import StoryGraph
+from app.services.prompt_builder import INSTRUCTIONS
+from stub_ollama import StubOllama
+
+CHARACTERS = {
+    "John": "A retired knight who guards the harbour town. " * 12,
+    "Mary": "The baker, who knows every rumour in town. " * 12
+}
+
+class LegacyGraphRAG(GraphRAG):
+    """
+    The prompt layout before PromptBuilder.
+    """
+    def _messages(self, scene_id, context, active_chars, history, user_choice, story_id):
+        retrieved_context = self.retrieve(scene_id, context, user_choice, active_chars)
+        return [
+            {"role": "system", "content": f"{INSTRUCTIONS}\n\nThe context for the story is as follows:\n{retrieved_context}"},
+            {"role": "user", "content": f"History: \n{history}\nUser: {user_choice}"}
+        ]
+
+async def play(rag_class, url: str, turns: int, stub: StubOllama):
+    rag_engine = rag_class(llm_adapter=AsyncOllamaAdapter(url=url, model="stub"), story_graph=StoryGraph(":memory:"))
+    for name, description in CHARACTERS.items():
+        rag_engine.story_graph.add_character(name, description)
+        rag_engine.story_graph.add_lore(f"{name}_lore", f"Something about {name}. " * 10, characters=[name])
+
+    scene_id, history, per_turn = "ID0001", [], []
+    for turn in range(turns):
+        n_prompt, n_cached = stub.n_prompt_tokens, stub.n_cached_tokens
+        generated = []
+        async for chunk in rag_engine.generate_stream(scene_id=scene_id, context=[], active_chars=list(CHARACTERS), history=history, user_choice=f"Ask about rumour {turn}", options={}):
+            generated.append(chunk.text)
+            if chunk.is_final:
+                scene_id = chunk.fx["scene_id"]
+        history = history + [f"Player: Ask about rumour {turn}", "".join(generated).strip()]
+        per_turn.append((stub.n_prompt_tokens - n_prompt, stub.n_cached_tokens - n_cached))
+    await rag_engine.llm_adapter.aclose()
+    return rag_engine, per_turn
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0005, help="stub prefill seconds per token")
+    args = parser.parse_args()
+
+    tokens = ["Mary (worried): ", "They say ", "the tide ", "is turning ", "early ", "this year."]
+    print(f"{'layout':>8} {'prefill p50 (ms)':>17} {'last turn (ms)':>15} {'prefilled/turn':>15} {'cached share':>13} {'last prompt (tok)':>18}")
+    for name, rag_class in [("legacy", LegacyGraphRAG), ("builder", GraphRAG)]:
+        with StubOllama(latency=0.0, tokens=tokens, prompt_token_latency=args.prompt_token_latency) as stub:
+            rag_engine, per_turn = asyncio.run(play(rag_class, stub.url, args.turns, stub))
+        prefilled = np.array([n_prompt for n_prompt, _ in per_turn[1:]])
+        cached = np.array([n_cached for _, n_cached in per_turn[1:]])
+        summary = rag_engine.stream_metrics.summary()
+        last_prompt = per_turn[-1][0] + per_turn[-1][1]
+        print(f"{name:>8} {summary['prefill_ms']['p50']:>17.1f} {prefilled[-1] * args.prompt_token_latency * 1000:>15.1f} "
+              f"{prefilled.mean():>15.0f} {cached.sum() / (cached.sum() + prefilled.sum()):>13.0%} {last_prompt:>18}")
@@ -0,0 +1,105 @@
+# ------------------------------------------------------------------------
+# Query Encoder Benchmark
+#
+# Compare the full image-text model against the text-tower-only encoder
+# (fp32 and int8) for per-query latency, resident memory, and agreement
+# with the full model's embeddings and top-k retrieval.
+#
+# Run with: python backend/benchmarks/query_encoder.py
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import argparse
+import multiprocessing as mp
+import numpy as np
+from app.config import settings
+
+QUERIES = [
+    "dark kitchen", "school rooftop at sunset", "messy red kitchen at night", "quiet library",
+    "crowded train station", "rainy city street", "hospital corridor", "beach at dawn",
+    "classroom after school", "abandoned warehouse", "shrine in the forest", "neon arcade",
+    "snowy mountain cabin", "office at midnight", "festival with lanterns", "empty swimming pool"
+]
+
+# stand-in index, embedded by the reference (first) mode like captions in the db
+CORPUS = QUERIES + [
+    "bright modern kitchen", "rooftop garden", "old bedroom", "school gym", "airport lounge",
+    "park with cherry blossoms", "underground parking lot", "cafe interior", "bus stop in the rain",
+    "living room with a fireplace", "convenience store at night", "temple courtyard", "harbor at dusk",
+    "hotel lobby", "bridge over a river", "desert road"
+]
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS"):
+                return int(line.split()[1]) / 1024
+
+def run_mode(mode: str, model_id: str, repeats: int, queue):
+    """
+    Load one encoder in a fresh process so resident memory isn't shared.
+    """
+    from app.models.embeddings import ImageTextEmbedder, TextEmbedder
+    baseline = rss_mb()
+    start = time.perf_counter()
+    if mode == "full":
+        encoder = ImageTextEmbedder(model_id=model_id, device=settings.DEVICE)
+    else:
+        encoder = TextEmbedder(model_id=model_id, device=settings.DEVICE, quantize="int8" if mode == "text_int8" else None)
+    load_seconds = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(repeats):
+        for query in QUERIES:
+            start = time.perf_counter()
+            encoder.embed_text(query)
+            latencies.append(time.perf_counter() - start)
+
+    queries = np.concatenate([encoder.embed_text(q).float().numpy() for q in QUERIES])
+    corpus = np.concatenate([encoder.embed_text(c).float().numpy() for c in CORPUS])
+    queue.put({
+        "load_seconds": load_seconds,
+        "rss_mb": rss_mb() - baseline,
+        "p50_ms": 1000 * np.percentile(latencies, 50),
+        "p99_ms": 1000 * np.percentile(latencies, 99),
+        "queries": queries,
+        "corpus": corpus
+    })
+
+def normalize(x):
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_id", type=str, default=settings.IMAGE_TEXT_MODEL_ID)
+    parser.add_argument("--modes", type=str, nargs="+", default=["full", "text", "text_int8"])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    results = {}
+    for mode in args.modes:
+        queue = ctx.Queue()
+        process = ctx.Process(target=run_mode, args=(mode, args.model_id, args.repeats, queue))
+        process.start()
+        results[mode] = queue.get()
+        process.join()
+
+    reference = results[args.modes[0]]
+    corpus = normalize(reference["corpus"])
+    reference_topk = np.argsort(-normalize(reference["queries"]) @ corpus.T, axis=1)[:, :args.k]
+
+    print(f"reference: {args.modes[0]}")
+    print(f"{'mode':>10} {'load (s)':>9} {'rss (MB)':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'cos':>6} {f'recall@{args.k}':>9}")
+    for mode, result in results.items():
+        queries = normalize(result["queries"])
+        cos = np.mean(np.sum(queries * normalize(reference["queries"]), axis=1))
+        topk = np.argsort(-queries @ corpus.T, axis=1)[:, :args.k]
+        recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(topk, reference_topk)])
+        print(f"{mode:>10} {result['load_seconds']:>9.2f} {result['rss_mb']:>9.0f} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {cos:>6.3f} {recall:>9.3f}")
@@ -0,0 +1,89 @@
+# ------------------------------------------------------------------------
+# Scene Retrieval Benchmark
+#
+# Latency the VLM query rewrite adds to scene asset retrieval, comparing
+# the blocking path (build_asset_request, then search), the speculative
+# path (retrieve_scene_assets with a deadline) and a rewrite cache hit,
+# against a stub VLM at several latencies.
+#
+# Run with: python backend/benchmarks/scene_retrieval.py --db numpy
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import argparse
+import tempfile
+import numpy as np
+from pathlib import Path
+from app.config import settings
+from app.models.api_schemas import AssetRequest
+from app.models.embeddings import TextEmbedder
+from app.models.llm_wrapper import OllamaAdapter
+from batch_search import make_asset_manager, clear_caches
+from query_encoder import QUERIES
+from stub_ollama import StubOllama
+
+REWRITE_TOKENS = ['{"image_query": "dark red kitchen", ', '"audio_query": "quiet tension"}']
+
+def timed(fn, n: int, before=None):
+    """
+    Return the median milliseconds of n calls to fn, calling before() untimed first.
+    """
+    latencies = []
+    for i in range(n):
+        if before:
+            before()
+        start = time.perf_counter()
+        fn(QUERIES[i % len(QUERIES)])
+        latencies.append(time.perf_counter() - start)
+    return np.median(latencies) * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-id", default=settings.IMAGE_TEXT_MODEL_ID)
+    parser.add_argument("--db", default=settings.DB_TYPE, choices=["kuzu", "numpy"])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--vlm-latencies", type=float, nargs="+", default=[0.2, 1.0, 3.0])
+    parser.add_argument("--deadline", type=float, default=settings.REWRITE_DEADLINE)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    encoder = TextEmbedder(model_id=args.model_id, device=settings.DEVICE)
+    settings.DB_TYPE = args.db
+    settings.IMAGE_TEXT_DIM = encoder.model.config.hidden_size
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asset_manager = make_asset_manager(Path(tmp), encoder, args.rows)
+
+        def clear_all():
+            clear_caches(asset_manager)
+            asset_manager._rewrite_cache.clear()
+
+        def blocking(query):
+            assets = asset_manager.build_asset_request(query)
+            asset_manager.search_image_assets(assets["image"], k=args.k)
+
+        def speculative(query):
+            asset_manager.retrieve_scene_assets(query, k=args.k, deadline=args.deadline)
+
+        def raw_only(query):
+            asset_manager.search_image_assets(AssetRequest(asset_type="image", query=query, asset_category="bg"), k=args.k)
+
+        # the raw search alone is the baseline the rewrite stage adds latency to
+        search_ms = timed(raw_only, args.repeats, before=clear_all)
+        print(f"raw-query search: {search_ms:.1f} ms, deadline {args.deadline * 1000:.0f} ms")
+        print(f"{'vlm (ms)':>9} {'blocking (ms)':>14} {'speculative (ms)':>17} {'cached (ms)':>12}")
+        for latency in args.vlm_latencies:
+            with StubOllama(latency=latency, tokens=REWRITE_TOKENS) as stub:
+                asset_manager.vlm_adapter = OllamaAdapter(url=stub.url, model="stub")
+                blocking_ms = timed(blocking, args.repeats, before=clear_all)
+                speculative_ms = timed(speculative, args.repeats, before=clear_all)
+                # only the search caches are cleared, the rewrite is reused
+                blocking(QUERIES[0])
+                cached_ms = timed(lambda query: speculative(QUERIES[0]), args.repeats, before=lambda: clear_caches(asset_manager))
+            print(f"{latency * 1000:>9.0f} {blocking_ms:>14.1f} {speculative_ms:>17.1f} {cached_ms:>12.1f}")
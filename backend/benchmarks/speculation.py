@@ -0,0 +1,59 @@
+# ------------------------------------------------------------------------
+# Speculation Benchmark
+#
+# One story played against a stub Ollama server, every scene ending in a
+# set of choices. The player reads each scene for a while, then picks one
+# of the offered choices (or, with --off-menu, sometimes types their own).
+# Compares time to first token with and without speculative generation,
+# and reports the hit rate and the tokens generated for choices that were
+# never picked.
+#
+# Run with: python backend/benchmarks/speculation.py --turns 20 --read 1.0
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import asyncio
+import argparse
+import numpy as np
+from app.models.llm_wrapper import AsyncOllamaAdapter
+from app.services.rag_engine import GraphRAG
+from app.services.story_graph import StoryGraph
+from stub_ollama import StubOllama
+
+CHOICES = ["Follow the tide", "Ask Mary", "Go home"]
+TOKENS = ["narrator: ", "The ", "harbour ", "bell ", "rings ", "twice.", "\n"] + [token for choice in CHOICES for token in (f"- {choice}", "\n")]
+
+async def play(url: str, turns: int, read: float, off_menu: float, speculate: bool, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    rag_engine = GraphRAG(llm_adapter=AsyncOllamaAdapter(url=url, model="stub"), story_graph=StoryGraph(":memory:"), speculate=speculate)
+    scene_id, choice = "ID0001", "Begin"
+    for turn in range(turns):
+        async for chunk in rag_engine.generate_stream(scene_id=scene_id, context=[], active_chars=["Mary"], history=[], user_choice=choice, options={}):
+            if chunk.is_final:
+                scene_id = chunk.fx["scene_id"]
+        await asyncio.sleep(read)
+        choice = f"Something else {turn}" if rng.random() < off_menu else str(rng.choice(CHOICES))
+    await rag_engine.llm_adapter.aclose()
+    return rag_engine
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--read", type=float, default=1.0, help="seconds the player reads each scene")
+    parser.add_argument("--off-menu", type=float, default=0.0, help="share of turns the player types their own choice")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub seconds to first token")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="stub seconds per token")
+    args = parser.parse_args()
+
+    print(f"{'speculate':>9} {'ttft p50/p99 (ms)':>18} {'hit rate':>9} {'requests':>9} {'spec tokens':>12} {'wasted':>7}")
+    for speculate in (False, True):
+        with StubOllama(latency=args.latency, tokens=TOKENS, token_latency=args.token_latency) as stub:
+            rag_engine = asyncio.run(play(stub.url, args.turns, args.read, args.off_menu, speculate))
+            n_requests = stub.n_requests
+        ttft = rag_engine.stream_metrics.summary()["ttft_ms"]
+        stats = rag_engine.speculator.stats() if speculate else {"hit_rate": 0.0, "tokens": 0, "wasted_tokens": 0}
+        print(f"{str(speculate):>9} {ttft['p50']:>8.1f} / {ttft['p99']:>7.1f} {stats['hit_rate']:>9.0%} {n_requests:>9} {stats['tokens']:>12} {stats['wasted_tokens']:>7}")
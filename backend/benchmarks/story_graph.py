@@ -0,0 +1,89 @@
+# ------------------------------------------------------------------------
+# Story Graph Benchmark
+#
+# Retrieval latency on synthetic story graphs: a cold ancestor walk
+# through Kuzu, a memoized ancestor lookup, entering a new scene (which
+# extends its parent's memoized context) and a full GraphRAG.retrieve with
+# characters and lore.
+#
+# Run with: python backend/benchmarks/story_graph.py --nodes 10000 100000 1000000
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import argparse
+import tempfile
+import numpy as np
+import pyarrow as pa
+from pathlib import Path
+from app.services.story_graph import StoryGraph
+from app.services.rag_engine import GraphRAG
+
+CHARACTERS = ["John", "Mary", "Sky", "Mugen"]
+
+def build_graph(path: Path, n_nodes: int, depth: int, branch_prob: float = 0.1, seed: int = 0):
+    """
+    Bulk load n_nodes scenes: each continues the previous scene, or with
+    branch_prob forks from a random earlier one, so the graph holds many
+    long playthroughs sharing prefixes.
+    """
+    rng = np.random.default_rng(seed)
+    parents = np.arange(-1, n_nodes - 1)
+    forks = rng.random(n_nodes) < branch_prob
+    forks[0] = False
+    parents[forks] = (rng.random(forks.sum()) * np.arange(n_nodes)[forks]).astype(np.int64)
+    depths = np.zeros(n_nodes, dtype=np.int64)
+    for i in range(1, n_nodes):
+        depths[i] = depths[parents[i]] + 1
+
+    graph = StoryGraph(path, max_depth=depth)
+    ids = [f"s{i}" for i in range(n_nodes)]
+    graph.db.bulk_insert("Scene", [
+        {"id": ids[i], "story_id": "s0", "parent_id": ids[parents[i]] if i else "", "choice": f"choice {i}", "text": f"narrator: Scene {i}.", "depth": int(depths[i])}
+        for i in range(n_nodes)
+    ], chunk_size=200000)
+    graph.conn.execute("COPY Next FROM $rows", {"rows": pa.table({
+        "from": [ids[parent] for parent in parents[1:]],
+        "to": ids[1:],
+        "choice": [f"choice {i}" for i in range(1, n_nodes)]
+    })})
+    for name in CHARACTERS:
+        graph.add_character(name, f"{name} is a character.")
+        graph.add_lore(f"{name}_lore", f"Something about {name}.", characters=[name])
+    return graph, ids
+
+def percentiles(fn, args: list):
+    latencies = []
+    for arg in args:
+        start = time.perf_counter()
+        fn(arg)
+        latencies.append(time.perf_counter() - start)
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--depth", type=int, default=8)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>8} {'build (s)':>10} {'cold p50/p99 (ms)':>18} {'memo p50/p99 (ms)':>18} {'enter p50/p99 (ms)':>19} {'retrieve p50/p99 (ms)':>22}")
+    for n_nodes in args.nodes:
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            graph, ids = build_graph(Path(tmp) / "story.kuzu", n_nodes, args.depth)
+            build_seconds = time.perf_counter() - start
+            rag_engine = GraphRAG(llm_adapter=None, story_graph=graph)
+            scenes = [ids[i] for i in np.random.default_rng(1).choice(n_nodes, size=args.queries, replace=False)]
+
+            graph._context_cache.clear()
+            cold = percentiles(graph.ancestors, scenes)
+            memo = percentiles(graph.ancestors, scenes)
+            # each new scene's context comes from its (cached) parent
+            enter = percentiles(lambda scene_id: graph.enter_scene(scene_id, "onwards", f"narrator: After {scene_id}.", CHARACTERS[:2]), scenes)
+            retrieve = percentiles(lambda scene_id: rag_engine.retrieve(scene_id, "", "onwards", CHARACTERS[:2]), scenes)
+            print(f"{n_nodes:>8} {build_seconds:>10.1f} {cold[0]:>8.2f} / {cold[1]:>7.2f} {memo[0]:>8.3f} / {memo[1]:>7.3f} {enter[0]:>9.2f} / {enter[1]:>7.2f} {retrieve[0]:>11.2f} / {retrieve[1]:>8.2f}")
@@ -0,0 +1,70 @@
+# ------------------------------------------------------------------------
+# Story API Load Test
+#
+# Simulate many concurrent players streaming from /api/story/generate_stream
+# against a stub Ollama server, and report per-request and total latency
+# along with the server's time to first token and tokens/sec (the ASGI test
+# transport buffers whole responses, so TTFT can't be measured client-side).
+#
+# Run with: python backend/benchmarks/story_load.py
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import asyncio
+import argparse
+import numpy as np
+import httpx
+from fastapi import FastAPI
+from benchmarks.stub_ollama import StubOllama
+from app.services.stream_metrics import StreamMetrics
+from app.services.components import warm_up
+
+async def player(client: httpx.AsyncClient, i: int):
+    start = time.perf_counter()
+    async with client.stream("POST", "/api/story/generate_stream", json={
+        "scene_id": f"ID{i:04d}",
+        "active_chars": [{"name": "char1"}],
+        "context": [],
+        "user_choice": "Look around"
+    }) as response:
+        async for _ in response.aiter_bytes():
+            pass
+    return time.perf_counter() - start
+
+async def run(app: FastAPI, players: int):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*[player(client, i) for i in range(players)])
+        return time.perf_counter() - start, latencies
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, nargs="+", default=[1, 16, 64, 128])
+    parser.add_argument("--latency", type=float, default=0.5, help="stub time to first token (s)")
+    parser.add_argument("--token_latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    with StubOllama(latency=args.latency, tokens=["narrator: "] + ["tok "] * 49, token_latency=args.token_latency) as stub:
+        # point the story router at the stub before it builds its adapter, and
+        # keep the scenes it generates out of the real story graph
+        os.environ["OLLAMA_URL"] = stub.url
+        os.environ["STORY_DB_PATH"] = ":memory:"
+        from app.routers import story_api
+
+        warm_up(story_api.rag_engine.components())
+
+        app = FastAPI()
+        app.include_router(story_api.router, prefix="/api/story")
+
+        print(f"{'players':>8} {'total (s)':>10} {'p50 (s)':>8} {'p99 (s)':>8} {'ttft p50 (ms)':>14} {'ttft p99 (ms)':>14} {'tok/s p50':>10}")
+        for players in args.players:
+            story_api.rag_engine.stream_metrics = StreamMetrics()
+            total, latencies = asyncio.run(run(app, players))
+            summary = story_api.rag_engine.stream_metrics.summary()
+            print(f"{players:>8} {total:>10.2f} {np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 99):>8.2f} {summary['ttft_ms']['p50']:>14.1f} {summary['ttft_ms']['p99']:>14.1f} {summary['tokens_per_second']['p50']:>10.1f}")
@@ -0,0 +1,82 @@
+# ------------------------------------------------------------------------
+# Story Memory Benchmark
+#
+# Prompt size and GraphRAG.retrieve latency as one story grows, with
+# long-term memory on, the memory search on its own, and how fast scenes
+# are entered and embedded in the background. Scenes are embedded with a
+# bag-of-words stand-in by default, pass --model to use the real text
+# embedder (its encode time is then part of search and retrieve).
+#
+# Run with: python backend/benchmarks/story_memory.py --scenes 100 1000 10000
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import zlib
+import argparse
+import tempfile
+import numpy as np
+from pathlib import Path
+from app.config import settings
+from app.models.embeddings import TextEmbedder
+from app.services.rag_engine import GraphRAG
+from app.services.story_graph import StoryGraph
+from story_graph import percentiles
+
+WORDS = "dragon sword harbour storm festival knight cave tide bread letter ghost crown river map lantern bell".split()
+
+class HashingEmbedder:
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed_texts(self, texts: list):
+        embeddings = np.full((len(texts), self.dim), 1e-3, dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().replace(".", " ").split():
+                embeddings[i, zlib.crc32(word.encode()) % self.dim] += 1.0
+        return embeddings
+
+def scene_text(rng, i: int):
+    return f"narrator: Scene {i}, the {' and the '.join(rng.choice(WORDS, size=3, replace=False))}."
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--model", action="store_true", help=f"embed with {settings.IMAGE_TEXT_MODEL_ID}")
+    args = parser.parse_args()
+
+    dim = settings.IMAGE_TEXT_DIM
+    embedder = TextEmbedder(settings.IMAGE_TEXT_MODEL_ID) if args.model else HashingEmbedder(dim)
+    characters = ["John", "Mary"]
+
+    print(f"{'scenes':>7} {'ingest (scenes/s)':>18} {'search p50/p99 (ms)':>20} {'retrieve p50/p99 (ms)':>22} {'prompt (chars)':>15} {'context items':>14}")
+    for n_scenes in args.scenes:
+        rng = np.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as tmp:
+            graph = StoryGraph(Path(tmp) / "story.kuzu", embedding_dim=dim)
+            rag_engine = GraphRAG(llm_adapter=None, story_graph=graph, text_embedder=embedder)
+            memory = rag_engine.story_memory
+
+            # scenes are queued as they're entered, and embedded behind the story
+            start = time.perf_counter()
+            scene_ids, scene_id = [], "ID0001"
+            for i in range(n_scenes):
+                scene_id = rag_engine._enter_scene(scene_id, f"choice {i}", scene_text(rng, i), characters, story_id="ID0001")
+                scene_ids.append(scene_id)
+                if i % 50 == 0:
+                    rag_engine.mark_important(scene_id)
+            memory.flush()
+            embed_rate = n_scenes / (time.perf_counter() - start)
+
+            queries = [scene_ids[i] for i in rng.choice(n_scenes, size=min(args.queries, n_scenes), replace=False)]
+            choices = iter(f"Ask about the {word}" for word in rng.choice(WORDS, size=len(queries) * 2))
+            search = percentiles(lambda choice: memory.search("ID0001", choice), [f"Ask about the {word}" for word in rng.choice(WORDS, size=len(queries))])
+            retrieve = percentiles(lambda scene_id: rag_engine.retrieve(scene_id, "", next(choices), characters), queries)
+            retrieved = rag_engine.retrieve(scene_ids[-1], "", next(choices), characters)
+            prompt = sum(len(message["content"]) for message in rag_engine.prompt_builder.build(retrieved, [], "Onwards"))
+            print(f"{n_scenes:>7} {embed_rate:>18.0f} {search[0]:>9.2f} / {search[1]:>8.2f} {retrieve[0]:>11.2f} / {retrieve[1]:>8.2f} {prompt:>15} {len(retrieved):>14}")
@@ -0,0 +1,161 @@
+# ------------------------------------------------------------------------
+# Stub Ollama Server
+#
+# Minimal local stand-in for the Ollama chat API with a fixed latency, used
+# by benchmarks and tests so they don't need a GPU or a running model.
+# Like Ollama, it keeps the last prompt of each parallel slot "in its KV
+# cache". A prompt continuing one of them only prefills the rest, any
+# other takes over the least recently used slot.
+# ------------------------------------------------------------------------
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class StubOllama:
+    """
+    Serve /api/chat (streamed and non-streamed) and /api/tags on localhost.
+
+    Args:
+        latency: Seconds to wait before the first token
+        tokens: Tokens to return, one per streamed line
+        token_latency: Seconds between streamed tokens
+        responses: Token lists returned by successive requests instead of
+            tokens, the last one repeating
+        prompt_token_latency: Seconds of prefill per uncached prompt token
+            (~4 characters), on top of latency
+        parallel: Requests served at once, like OLLAMA_NUM_PARALLEL, the
+            rest queue in arrival order. None serves all at once.
+    """
+    def __init__(self, latency: float = 0.1, tokens: list = None, token_latency: float = 0.0, responses: list = None, prompt_token_latency: float = 0.0, parallel: int = None):
+        self.latency = latency
+        self.responses = responses or [tokens or ["narrator: ", "The ", "room ", "is ", "quiet."]]
+        self.token_latency = token_latency
+        self.prompt_token_latency = prompt_token_latency
+        self.n_requests = 0
+        self.n_tokens_sent = 0
+        self.n_prompt_tokens = 0 # prefilled
+        self.n_cached_tokens = 0 # reused from the previous prompt
+        self._cached_prompts = deque([""] * (parallel or 1)) # one per slot, least recently used first
+        self._slots = threading.Semaphore(parallel) if parallel else None
+        self.error_status = None # e.g. 503 to fail every request, like a crashed or overloaded server
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if stub.error_status:
+                    self.send_error(stub.error_status)
+                    return
+                if self.path != "/api/tags":
+                    self.send_error(404)
+                    return
+                self._send_json({"models": [{"name": "stub"}]})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if stub.error_status:
+                    self.send_error(stub.error_status)
+                    return
+                if stub._slots is None:
+                    self._chat(payload)
+                    return
+                with stub._slots:
+                    self._chat(payload)
+
+            def _chat(self, payload):
+                prompt = "".join(f"<{message['role']}>{message['content']}" for message in payload.get("messages", []))
+                with stub._lock:
+                    tokens = stub.responses[min(stub.n_requests, len(stub.responses) - 1)]
+                    stub.n_requests += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    # continue the slot holding this conversation so far, else take the least recently used
+                    slot = max(stub._cached_prompts, key=lambda cached_prompt: prompt.startswith(cached_prompt) and len(cached_prompt))
+                    if not prompt.startswith(slot):
+                        slot = stub._cached_prompts[0]
+                    cached = len(os.path.commonprefix([slot, prompt])) // 4
+                    prompt_eval_count = max(len(prompt) // 4 - cached, 1)
+                    stub._cached_prompts.remove(slot)
+                    stub._cached_prompts.append(prompt)
+                    stub.n_prompt_tokens += prompt_eval_count
+                    stub.n_cached_tokens += cached
+                try:
+                    prefill = prompt_eval_count * stub.prompt_token_latency
+                    time.sleep(stub.latency + prefill)
+                    stats = {"prompt_eval_count": prompt_eval_count, "prompt_eval_duration": int(prefill * 1e9), "eval_count": len(tokens)}
+                    if payload.get("stream", True):
+                        self._stream(payload, tokens, stats)
+                    else:
+                        self._send_json({
+                            "model": payload.get("model"),
+                            "message": {"role": "assistant", "content": "".join(tokens)},
+                            "done": True,
+                            **stats
+                        })
+                except (BrokenPipeError, ConnectionResetError):
+                    pass # client gave up (timeout, cancelled stream)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+            def _stream(self, payload, tokens, stats):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for token in tokens:
+                    self._write_chunk({
+                        "model": payload.get("model"),
+                        "message": {"role": "assistant", "content": token},
+                        "done": False
+                    })
+                    with stub._lock:
+                        stub.n_tokens_sent += 1
+                    time.sleep(stub.token_latency)
+                self._write_chunk({
+                    "model": payload.get("model"),
+                    "message": {"role": "assistant", "content": ""},
+                    "done": True,
+                    **stats
+                })
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, obj):
+                data = json.dumps(obj).encode() + b"\n"
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_json(self, obj):
+                data = json.dumps(obj).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -0,0 +1,118 @@
+# ------------------------------------------------------------------------
+# Vector Backend Benchmark
+#
+# Compare kuzu's HNSW index against NumpyDB's exact search and FAISS
+# HNSW/IVF indexes at each embedding storage precision: on-disk size (and
+# for float16/int8, without the float32 copy kept for re-ranking), index
+# build time, p50/p99 query latency and recall@k against exact ground truth.
+#
+# kuzu can only index DOUBLE/FLOAT columns, NumpyDB stores DOUBLE as float32.
+#
+# Run with: python backend/benchmarks/vector_backends.py
+# ------------------------------------------------------------------------
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+import time
+import argparse
+import tempfile
+import numpy as np
+from pathlib import Path
+from app.database import KuzuDB, NumpyDB, faiss, embedding_column_type
+from app.config import settings
+from bulk_insert import image_schema, make_rows
+
+PRECISIONS = ["float64", "float32", "float16", "int8"]
+
+BACKENDS = {
+    "kuzu-hnsw": (lambda path: KuzuDB(path / "bench.kuzu"), {}),
+    "numpy-exact": (lambda path: NumpyDB(path / "numpy"), {"index_type": "exact"}),
+    "faiss-hnsw": (lambda path: NumpyDB(path / "numpy"), {"index_type": "hnsw"}),
+    "faiss-ivf": (lambda path: NumpyDB(path / "numpy"), {"index_type": "ivf"}),
+}
+
+def ground_truth(rows: list, queries, k: int):
+    embeddings = np.array([row["image_embedding"] for row in rows], dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    scores = queries @ embeddings.T
+    return [{rows[i]["image_path"] for i in np.argsort(-score)[:k]} for score in scores]
+
+def supports(name: str, precision: str):
+    if name.startswith("kuzu"):
+        return precision in ("float64", "float32")
+    return precision != "float64"
+
+def dir_size(path: Path):
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+def float32_copy_size(db, precision: str):
+    """
+    Bytes of the float32 rows NumpyDB keeps on disk beside compact rows.
+    """
+    if not isinstance(db, NumpyDB) or precision not in ("float16", "int8"):
+        return 0
+    return db._vectors["Image"]["image_embedding"].full.path.stat().st_size
+
+def index_size(db, path: Path):
+    """
+    Bytes a NumpyDB query reads: the (compact) vectors, or the FAISS index.
+    """
+    if not isinstance(db, NumpyDB):
+        return float("nan")
+    faiss_files = list(path.rglob("*.faiss"))
+    if faiss_files:
+        return sum(f.stat().st_size for f in faiss_files)
+    return db._vectors["Image"]["image_embedding"].nbytes
+
+def bench(name: str, precision: str, rows: list, queries, truth: list, k: int, dim: int, efs: int):
+    make_db, index_params = BACKENDS[name]
+    with tempfile.TemporaryDirectory() as tmp:
+        db = make_db(Path(tmp))
+        column_type = f"DOUBLE[{dim}]" if precision == "float64" else embedding_column_type(dim, precision)
+        db.create_schema({**image_schema(dim), "image_embedding": column_type})
+        db.bulk_insert("Image", rows)
+
+        start = time.perf_counter()
+        db.create_vector_index("Image", "image_index", "image_embedding", **index_params)
+        build_time = time.perf_counter() - start
+
+        latencies, recalls = [], []
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            res = db.query_vector_index("Image", "image_index", query.tolist(), k, columns=["image_path"], efs=efs)
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len(expected & {row["image_path"] for row in res}) / k)
+
+        disk = dir_size(Path(tmp))
+        size = disk / 2**20, (disk - float32_copy_size(db, precision)) / 2**20, index_size(db, Path(tmp)) / 2**20
+        return size, build_time, np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000, np.mean(recalls)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--dim", type=int, default=settings.IMAGE_TEXT_DIM)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--efs", type=int, default=200)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    parser.add_argument("--precisions", nargs="+", default=PRECISIONS)
+    args = parser.parse_args()
+
+    if faiss is None:
+        args.backends = [name for name in args.backends if not name.startswith("faiss")]
+
+    print(f"{'rows':>8} {'backend':>12} {'precision':>9} {'disk (MB)':>10} {'no f32 (MB)':>11} {'index (MB)':>10} {'build (s)':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'recall':>7}")
+    for n in args.sizes:
+        rows = make_rows(n, args.dim)
+        queries = np.random.default_rng(1).standard_normal((args.queries, args.dim), dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        truth = ground_truth(rows, queries, args.k)
+        for name in args.backends:
+            for precision in args.precisions:
+                if not supports(name, precision):
+                    continue
+                size, build_time, p50, p99, recall = bench(name, precision, rows, queries, truth, args.k, args.dim, args.efs)
+                print(f"{n:>8} {name:>12} {precision:>9} {size[0]:>10.1f} {size[1]:>11.1f} {size[2]:>10.1f} {build_time:>10.2f} {p50:>9.2f} {p99:>9.2f} {recall:>7.3f}")
@@ -2,41 +2,101 @@
 # FastAPI Orchestrator
 # ------------------------------------------------------------------------
 
+import asyncio
+import threading
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routers import story_api
-from app.routers import asset_api
+from fastapi.responses import JSONResponse
+from app.config import settings
+from app.services.components import warm_up
+from app.services.llm_scheduler import get_llm_scheduler
 
 version = "0.0.1"
 
+# components reported by /ready, filled in as routers are included
+components = []
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start loading models and db connections in the background, so the port
+    is bound immediately and /ready reports progress.
+    """
+    tasks = []
+    # cancelling the task leaves its thread running, this stops it before the next component
+    stop_warm_up = threading.Event()
+    if settings.WARMUP:
+        tasks.append(asyncio.create_task(asyncio.to_thread(warm_up, components, stop_warm_up)))
+    if "asset" in settings.SERVICES and settings.WATCH_ASSETS:
+        asset_api.asset_manager.start_watching(interval=settings.WATCH_INTERVAL)
+    yield
+    stop_warm_up.set()
+    for task in tasks:
+        task.cancel()
+
 app = FastAPI(
     title="GenVN Engine",
     description="Backend orchestrator for GenVN application.",
-    version=version
+    version=version,
+    lifespan=lifespan
 )
 
 # --------------------------- Include Routers ---------------------------
 
-app.include_router(
-    story_api.router, 
-    prefix=f"/api/story", 
-    tags=["story"]
-)
+if "story" in settings.SERVICES:
+    from app.routers import story_api
+    app.include_router(
+        story_api.router, 
+        prefix=f"/api/story", 
+        tags=["story"]
+    )
+    components.extend(story_api.rag_engine.components())
 
-app.include_router(
-    asset_api.router,
-    prefix=f"/api/asset",
-    tags=["asset"]
-)
+if "asset" in settings.SERVICES:
+    from app.routers import asset_api
+    app.include_router(
+        asset_api.router,
+        prefix=f"/api/asset",
+        tags=["asset"]
+    )
+    components.extend(asset_api.asset_manager.components())
 
 # --------------------------- Health Check ---------------------------
 @app.get("/health")
 def health_check():
+    """
+    Liveness, the process is up (models may still be loading).
+    """
     return {
         "status": "ok",
         "version": version
     }
 
+@app.get("/ready")
+def readiness_check():
+    """
+    Readiness, every component is loaded. Returns 503 until then.
+    """
+    statuses = {component.name: component.status() for component in components}
+    ready = all(status["loaded"] for status in statuses.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "loading",
+            "services": settings.SERVICES,
+            "components": statuses
+        }
+    )
+
+@app.get("/llm_stats")
+def llm_stats():
+    """
+    Requests in flight, queued and rejected per LLM priority class, and
+    their queue wait percentiles (see LLMScheduler).
+    """
+    return get_llm_scheduler().stats()
+
 # --------------------------- Run App ---------------------------
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=8000)
@@ -0,0 +1,181 @@
+# ------------------------------------------------------------------------
+# Database Tests
+#
+# Run with: pytest -v -s backend/tests/database_test.py
+# ------------------------------------------------------------------------
+
+import pytest
+import numpy as np
+from pydantic import ValidationError
+from app.config import Settings
+from app.database import KuzuDB, NumpyDB, faiss, embedding_column_type
+
+IMAGE_SCHEMA = {
+    "table_name": "Image",
+    "image_id": "SERIAL PRIMARY KEY",
+    "image_path": "STRING",
+    "image_embedding": "DOUBLE[4]"
+}
+
+@pytest.fixture
+def kuzu_db(tmp_path):
+    db = KuzuDB(tmp_path / "test.kuzu")
+    db.create_schema(IMAGE_SCHEMA)
+    return db
+
+@pytest.fixture
+def numpy_db(tmp_path):
+    db = NumpyDB(tmp_path / "numpy")
+    db.create_schema(IMAGE_SCHEMA)
+    return db
+
+def random_rows(n, seed=0):
+    embeddings = np.random.default_rng(seed).normal(size=(n, 4))
+    return [{"image_path": f"{i}.webp", "image_embedding": embedding.tolist()} for i, embedding in enumerate(embeddings)]
+
+def test_bulk_insert(kuzu_db):
+    rows = [{"image_path": f"{i}.webp", "image_embedding": [float(i), 0.0, 0.0, 1.0]} for i in range(25)]
+    kuzu_db.bulk_insert("Image", rows, chunk_size=10)
+
+    response = kuzu_db.conn.execute("MATCH (n:Image) RETURN n.image_path, n.image_embedding ORDER BY n.image_id")
+    result = response.get_all()
+    assert len(result) == 25
+    assert result[3] == ["3.webp", [3.0, 0.0, 0.0, 1.0]]
+
+def test_bulk_insert_empty(kuzu_db):
+    kuzu_db.bulk_insert("Image", [])
+    assert kuzu_db.conn.execute("MATCH (n:Image) RETURN COUNT(*)").get_next()[0] == 0
+
+def test_kuzu_query_vector_index(kuzu_db):
+    kuzu_db.bulk_insert("Image", random_rows(50))
+    kuzu_db.create_vector_index("Image", "image_index", "image_embedding")
+
+    query = random_rows(50)[7]["image_embedding"]
+    res = kuzu_db.query_vector_index("Image", "image_index", query, 3, columns=["image_path"])
+    assert res[0]["image_path"] == "7.webp"
+    assert res[0]["distance"] == pytest.approx(0.0, abs=1e-5)
+    assert [row["distance"] for row in res] == sorted(row["distance"] for row in res)
+
+@pytest.mark.parametrize("backend", ["kuzu_db", "numpy_db"])
+def test_query_vector_index_filters(backend, request):
+    db = request.getfixturevalue(backend)
+    db.create_schema({**IMAGE_SCHEMA, "table_name": "Asset", "image_category": "STRING"})
+    rows = [{**row, "image_category": "bg" if i % 10 == 0 else "cg"} for i, row in enumerate(random_rows(200))]
+    db.bulk_insert("Asset", rows)
+    if backend == "numpy_db":
+        db.create_vector_index("Asset", "asset_index", "image_embedding", index_type="exact")
+    else:
+        db.create_vector_index("Asset", "asset_index", "image_embedding")
+
+    query = rows[7]["image_embedding"]
+    res = db.query_vector_index("Asset", "asset_index", query, 5, columns=["image_path", "image_category"], filters={"image_category": "bg"})
+    assert len(res) == 5
+    assert all(row["image_category"] == "bg" for row in res)
+
+    # rows added after the first filtered search are still picked up
+    db.bulk_insert("Asset", [{"image_path": "new.webp", "image_embedding": query, "image_category": "bg"}])
+    res = db.query_vector_index("Asset", "asset_index", query, 1, columns=["image_path"], filters={"image_category": "bg"})
+    assert res[0]["image_path"] == "new.webp"
+
+def test_numpy_exact_search_matches_brute_force(numpy_db):
+    rows = random_rows(200)
+    numpy_db.bulk_insert("Image", rows[:120])
+    numpy_db.bulk_insert("Image", rows[120:])
+    numpy_db.create_vector_index("Image", "image_index", "image_embedding", index_type="exact")
+
+    embeddings = np.array([row["image_embedding"] for row in rows])
+    query = np.array([1.0, -0.5, 0.25, 0.0])
+    similarity = embeddings @ query / np.linalg.norm(embeddings, axis=1) / np.linalg.norm(query)
+    expected = [f"{i}.webp" for i in np.argsort(-similarity)[:5]]
+
+    res = numpy_db.query_vector_index("Image", "image_index", query.tolist(), 5, columns=["image_path"])
+    assert [row["image_path"] for row in res] == expected
+    assert res[0]["distance"] == pytest.approx(1 - similarity.max(), abs=1e-5)
+
+def test_numpy_rows_delete_update_and_reopen(numpy_db, tmp_path):
+    numpy_db.bulk_insert("Image", random_rows(10))
+    numpy_db.create_vector_index("Image", "image_index", "image_embedding", index_type="exact")
+    numpy_db.delete_rows("Image", "image_path", ["3.webp"])
+    numpy_db.update_rows("Image", "image_path", [{"key": "4.webp", "image_path": "moved.webp"}])
+    numpy_db.set_checkpoint("image_ingest", "complete", 10)
+
+    db = NumpyDB(tmp_path / "numpy")
+    assert db.count("Image") == 9
+    assert "3.webp" not in db.get_column("Image", "image_path")
+    assert db.get_rows("Image", ["image_path", "image_embedding"])[3]["image_path"] == "moved.webp"
+    assert db.get_checkpoint("image_ingest") == {"status": "complete", "n_done": 10}
+
+    query = random_rows(10)[3]["image_embedding"]
+    res = db.query_vector_index("Image", "image_index", query, 9, columns=["image_path"])
+    assert len(res) == 9
+    assert "3.webp" not in [row["image_path"] for row in res]
+
+@pytest.mark.skipif(faiss is None, reason="faiss not installed")
+@pytest.mark.parametrize("precision", ["float32", "int8"])
+@pytest.mark.parametrize("index_type", ["hnsw", "ivf"])
+def test_numpy_faiss_index(tmp_path, index_type, precision):
+    numpy_db = NumpyDB(tmp_path / "numpy")
+    numpy_db.create_schema({**IMAGE_SCHEMA, "image_embedding": embedding_column_type(4, precision)})
+    rows = random_rows(500)
+    numpy_db.bulk_insert("Image", rows[:400])
+    numpy_db.create_vector_index("Image", "image_index", "image_embedding", index_type=index_type, nlist=4)
+    numpy_db.bulk_insert("Image", rows[400:])
+    numpy_db.delete_rows("Image", "image_path", ["450.webp"])
+
+    res = numpy_db.query_vector_index("Image", "image_index", rows[420]["image_embedding"], 5, columns=["image_path"], efs=400)
+    assert res[0]["image_path"] == "420.webp"
+    res = numpy_db.query_vector_index("Image", "image_index", rows[450]["image_embedding"], 5, columns=["image_path"], efs=400)
+    assert "450.webp" not in [row["image_path"] for row in res]
+
+    odd = [row["image_path"] for row in rows[1::2]]
+    numpy_db.update_rows("Image", "image_path", [{"key": path, "image_path": f"odd/{path}"} for path in odd])
+    res = numpy_db.query_vector_index("Image", "image_index", rows[420]["image_embedding"], 5, columns=["image_path"], efs=400, filters={"image_path": "odd/421.webp"})
+    assert [row["image_path"] for row in res] == ["odd/421.webp"]
+
+@pytest.mark.skipif(faiss is None, reason="faiss not installed")
+def test_numpy_faiss_index_written_on_flush(tmp_path):
+    db = NumpyDB(tmp_path / "numpy")
+    db.create_schema(IMAGE_SCHEMA)
+    rows = random_rows(300)
+    db.bulk_insert("Image", rows[:200])
+    db.create_vector_index("Image", "image_index", "image_embedding", index_type="hnsw")
+    path = tmp_path / "numpy" / "Image.image_index.faiss"
+    written = path.read_bytes()
+
+    db.bulk_insert("Image", rows[200:250])
+    assert path.read_bytes() == written
+    db.flush()
+    assert path.read_bytes() != written
+
+    # rows inserted after the last flush are added back when the index is loaded
+    db.bulk_insert("Image", rows[250:])
+    db = NumpyDB(tmp_path / "numpy")
+    res = db.query_vector_index("Image", "image_index", rows[280]["image_embedding"], 1, columns=["image_path"], efs=400)
+    assert res[0]["image_path"] == "280.webp"
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+def test_numpy_compact_precision(tmp_path, precision):
+    db = NumpyDB(tmp_path / "numpy")
+    db.create_schema({**IMAGE_SCHEMA, "image_embedding": embedding_column_type(4, precision)})
+    rows = random_rows(300)
+    db.bulk_insert("Image", rows)
+    db.create_vector_index("Image", "image_index", "image_embedding", index_type="exact")
+
+    # searched in compact form, re-ranked and read back at float32
+    column = db._vectors["Image"]["image_embedding"]
+    assert column.compact.matrix.dtype == np.dtype(precision)
+    embedding = rows[5]["image_embedding"]
+    assert db.get_rows("Image", ["image_embedding"])[5]["image_embedding"] == pytest.approx(embedding, rel=1e-6)
+    res = db.query_vector_index("Image", "image_index", rows[42]["image_embedding"], 5, columns=["image_path"])
+    assert res[0]["image_path"] == "42.webp"
+    assert res[0]["distance"] == pytest.approx(0.0, abs=1e-6)
+
+def test_kuzu_rejects_compact_precision(tmp_path):
+    db = KuzuDB(tmp_path / "test.kuzu")
+    with pytest.raises(NotImplementedError):
+        db.create_schema({**IMAGE_SCHEMA, "image_embedding": embedding_column_type(4, "int8")})
+
+def test_settings_reject_kuzu_compact_precision():
+    with pytest.raises(ValidationError):
+        Settings(DB_TYPE="kuzu", EMBEDDING_PRECISION="int8")
+    assert Settings(DB_TYPE="numpy", EMBEDDING_PRECISION="int8").EMBEDDING_PRECISION == "int8"
@@ -0,0 +1,98 @@
+# ------------------------------------------------------------------------
+# Embedding Tests
+#
+# Run with: pytest -v -s backend/tests/models/embeddings_test.py
+# ------------------------------------------------------------------------
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import Siglip2Config, Siglip2Model, Siglip2ImageProcessor, PreTrainedTokenizerFast
+from app.models.embeddings import ImageTextEmbedder, TextEmbedder
+
+def tiny_config():
+    """
+    Randomly initialized SigLIP2 so tests don't download the real weights.
+    """
+    return Siglip2Config(
+        text_config=dict(hidden_size=32, intermediate_size=64, num_hidden_layers=1, num_attention_heads=2, vocab_size=100),
+        vision_config=dict(hidden_size=32, intermediate_size=64, num_hidden_layers=1, num_attention_heads=2, num_patches=64, patch_size=16)
+    )
+
+@pytest.fixture
+def tiny_model_dir(tmp_path):
+    """
+    Tiny SigLIP2 checkpoint and word-level tokenizer saved to disk.
+    """
+    torch.manual_seed(0)
+    model = Siglip2Model(tiny_config()).eval()
+    model.save_pretrained(tmp_path)
+
+    vocab = {word: i for i, word in enumerate(["[UNK]", "[PAD]", "dark", "kitchen", "school", "rooftop", "at", "sunset"])}
+    tokenizer = Tokenizer(models.WordLevel(vocab=vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]", pad_token="[PAD]").save_pretrained(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def tiny_embedder():
+    embedder = ImageTextEmbedder.__new__(ImageTextEmbedder)
+    embedder.model_id = "tiny-siglip2"
+    embedder.device = "cpu"
+    embedder.model = Siglip2Model(tiny_config()).eval()
+    embedder.processor = Siglip2ImageProcessor(max_num_patches=64)
+    return embedder
+
+@pytest.fixture
+def sample_images():
+    rng = np.random.default_rng(0)
+    return [Image.fromarray(rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)) for _ in range(5)]
+
+def test_embed_images(tiny_embedder, sample_images):
+    embeddings = tiny_embedder.embed_images(sample_images, batch_size=2)
+
+    assert embeddings.shape == (5, 32)
+    assert embeddings.dtype == np.float32
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-5)
+
+def test_embed_images_matches_single(tiny_embedder, sample_images):
+    embeddings = tiny_embedder.embed_images(sample_images, batch_size=4)
+    single = torch.nn.functional.normalize(tiny_embedder.embed_image(sample_images[3]), dim=-1)
+
+    assert np.allclose(embeddings[3], single.numpy()[0], atol=1e-5)
+
+def test_embed_images_empty(tiny_embedder):
+    assert tiny_embedder.embed_images([]).shape == (0, 32)
+
+def test_text_embedder_matches_full_model(tiny_model_dir):
+    full = Siglip2Model.from_pretrained(tiny_model_dir).eval()
+    tokenizer = PreTrainedTokenizerFast.from_pretrained(tiny_model_dir)
+    inputs = tokenizer(["dark kitchen"], return_tensors="pt")
+    with torch.no_grad():
+        features = full.get_text_features(**inputs)
+        expected = getattr(features, "pooler_output", features)
+
+    text_only = TextEmbedder(model_id=str(tiny_model_dir))
+    assert torch.allclose(text_only.embed_text("dark kitchen"), expected, atol=1e-5)
+
+def test_text_embedder_int8(tiny_model_dir):
+    fp32 = TextEmbedder(model_id=str(tiny_model_dir)).embed_text("school rooftop at sunset")
+    int8 = TextEmbedder(model_id=str(tiny_model_dir), quantize="int8").embed_text("school rooftop at sunset")
+
+    assert torch.nn.functional.cosine_similarity(fp32, int8).item() > 0.95
+
+def test_embed_texts_matches_single(tiny_model_dir):
+    texts = ["dark kitchen", "school rooftop at sunset", "kitchen"]
+    full = ImageTextEmbedder.__new__(ImageTextEmbedder)
+    full.device = "cpu"
+    full.model = Siglip2Model.from_pretrained(tiny_model_dir).eval()
+    full.tokenizer = PreTrainedTokenizerFast.from_pretrained(tiny_model_dir)
+    text_only = TextEmbedder(model_id=str(tiny_model_dir))
+
+    for embedder in (full, text_only):
+        batch = embedder.embed_texts(texts)
+        assert batch.shape == (3, 32)
+        for i, text in enumerate(texts):
+            assert torch.allclose(batch[i], embedder.embed_text(text)[0], atol=1e-5)
@@ -0,0 +1,165 @@
+# ------------------------------------------------------------------------
+# LLM Wrapper Tests
+#
+# Run with: pytest -v -s backend/tests/models/llm_wrapper_test.py
+# ------------------------------------------------------------------------
+
+import json
+import time
+import asyncio
+import httpx
+import pytest
+from app.models.llm_wrapper import AsyncOllamaAdapter, AsyncRoutingAdapter
+from benchmarks.stub_ollama import StubOllama
+
+def test_async_chat_stream():
+    async def collect(url):
+        adapter = AsyncOllamaAdapter(url=url, model="stub")
+        lines = [line async for line in adapter.chat_stream([{"role": "user", "content": "hi"}])]
+        await adapter.aclose()
+        return lines
+
+    with StubOllama(latency=0.0, tokens=["a", "b"]) as stub:
+        lines = asyncio.run(collect(stub.url))
+
+    assert [json.loads(line)["message"]["content"] for line in lines] == ["a", "b", ""]
+    assert json.loads(lines[-1])["done"]
+
+def test_async_chat_chunk_concurrent():
+    async def run(url, n):
+        adapter = AsyncOllamaAdapter(url=url, model="stub")
+        responses = await asyncio.gather(*[
+            adapter.chat_chunk([{"role": "user", "content": "hi"}]) for _ in range(n)
+        ])
+        await adapter.aclose()
+        return responses
+
+    with StubOllama(latency=0.2, tokens=["hello"]) as stub:
+        start = time.perf_counter()
+        responses = asyncio.run(run(stub.url, 10))
+        elapsed = time.perf_counter() - start
+
+    assert all(response["message"]["content"] == "hello" for response in responses)
+    assert elapsed < 1.0 # not serialized (10 * 0.2s)
+
+def test_async_client_closed_with_its_loop():
+    async def chat(adapter):
+        return await adapter.chat_chunk([{"role": "user", "content": "hi"}])
+
+    with StubOllama(latency=0.0) as stub:
+        adapter = AsyncOllamaAdapter(url=stub.url, model="stub")
+        asyncio.run(chat(adapter))
+        first = adapter._client
+        # the loop closed its client on shutdown, a new loop gets a new one
+        assert first.is_closed
+        asyncio.run(chat(adapter))
+        assert adapter._client is not first
+
+def test_async_retries_then_raises():
+    async def run():
+        # nothing listens on port 9, so every attempt fails to connect
+        adapter = AsyncOllamaAdapter(url="http://127.0.0.1:9", model="stub", max_retries=2, backoff=0.01)
+        try:
+            await adapter.chat_chunk([{"role": "user", "content": "hi"}])
+        finally:
+            await adapter.aclose()
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(run())
+
+def test_async_timeout():
+    async def run(url):
+        adapter = AsyncOllamaAdapter(url=url, model="stub", timeout=0.1, max_retries=0)
+        try:
+            await adapter.chat_chunk([{"role": "user", "content": "hi"}])
+        finally:
+            await adapter.aclose()
+
+    with StubOllama(latency=1.0) as stub, pytest.raises(httpx.ReadTimeout):
+        asyncio.run(run(stub.url))
+
+def test_routing_spreads_least_outstanding():
+    async def run(urls):
+        adapter = AsyncRoutingAdapter(urls=urls, model="stub")
+        await asyncio.gather(*(adapter.chat_chunk([{"role": "user", "content": f"hi {i}"}]) for i in range(6)))
+        await adapter.aclose()
+        return adapter
+
+    with StubOllama(latency=0.1) as a, StubOllama(latency=0.1) as b, StubOllama(latency=0.1) as c:
+        adapter = asyncio.run(run([a.url, b.url, c.url]))
+        assert [stub.n_requests for stub in (a, b, c)] == [2, 2, 2]
+    assert all(backend["outstanding"] == 0 for backend in adapter.stats()["backends"])
+
+def test_routing_session_affinity():
+    async def run(urls):
+        adapter = AsyncRoutingAdapter(urls=urls, model="stub", affinity_slack=0)
+        # "a" holds the first endpoint, so "b" starts on the second
+        held = asyncio.ensure_future(adapter.chat_chunk([{"role": "user", "content": "a"}], session="a"))
+        await asyncio.sleep(0.05)
+        history = [{"role": "user", "content": "b " * 200}]
+        for turn in range(4):
+            await adapter.chat_chunk(history, session="b")
+            history = history + [{"role": "assistant", "content": "ok"}, {"role": "user", "content": f"turn {turn}"}]
+        await held
+        await adapter.aclose()
+        return adapter
+
+    with StubOllama(latency=0.2) as a, StubOllama(latency=0.0) as b:
+        adapter = asyncio.run(run([a.url, b.url]))
+        assert a.n_requests == 1 and b.n_requests == 4
+        assert b.n_cached_tokens > b.n_prompt_tokens # later turns reuse the story's prefix
+    assert adapter.stats()["affinity_hits"] == 3
+
+def test_routing_failover_and_recovery():
+    async def stream(adapter):
+        return [json.loads(line)["message"]["content"] async for line in adapter.chat_stream([{"role": "user", "content": "hi"}], session="story")]
+
+    async def run(urls, down):
+        adapter = AsyncRoutingAdapter(urls=urls, model="stub", health_interval=60.0, retry_after=60.0)
+        tokens = await stream(adapter)
+        health = await adapter.check_health()
+        down.error_status = None
+        recovered = await adapter.check_health()
+        await adapter.aclose()
+        return adapter, tokens, health, recovered
+
+    with StubOllama(latency=0.0, tokens=["a", "b"]) as a, StubOllama(latency=0.0, tokens=["a", "b"]) as b:
+        a.error_status = 503
+        adapter, tokens, health, recovered = asyncio.run(run([a.url, b.url], a))
+        assert tokens == ["a", "b", ""]
+        assert a.n_requests == 0 and b.n_requests == 1
+    stats = adapter.stats()
+    assert stats["failovers"] == 1 and stats["backends"][0]["failures"] == 1
+    assert health == {a.url: False, b.url: True}
+    assert recovered == {a.url: True, b.url: True}
+
+def test_routing_all_endpoints_down_raises():
+    async def run(urls):
+        adapter = AsyncRoutingAdapter(urls=urls, model="stub")
+        try:
+            with pytest.raises(httpx.HTTPStatusError):
+                await adapter.chat_chunk([{"role": "user", "content": "hi"}])
+        finally:
+            await adapter.aclose()
+        return adapter
+
+    with StubOllama(latency=0.0) as a, StubOllama(latency=0.0) as b:
+        a.error_status = b.error_status = 503
+        adapter = asyncio.run(run([a.url, b.url]))
+    assert [backend["healthy"] for backend in adapter.stats()["backends"]] == [False, False]
+
+def test_routing_favours_faster_endpoint():
+    async def run(urls):
+        adapter = AsyncRoutingAdapter(urls=urls, model="stub")
+
+        async def player(i):
+            for turn in range(5):
+                await adapter.chat_chunk([{"role": "user", "content": f"{i} {turn}"}])
+
+        await asyncio.gather(*(player(i) for i in range(4)))
+        await adapter.aclose()
+
+    with StubOllama(latency=0.2, parallel=1) as slow, StubOllama(latency=0.02, parallel=1) as fast:
+        asyncio.run(run([slow.url, fast.url]))
+        assert slow.n_requests + fast.n_requests == 20
+        assert fast.n_requests > 2 * slow.n_requests
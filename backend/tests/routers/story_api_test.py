@@ -4,8 +4,10 @@
 # Run with: pytest -v -s backend/tests/routers/story_api_test.py
 # ------------------------------------------------------------------------
 
+import asyncio
 import requests
-from app.models.api_schemas import StoryRequest
+from app.models.api_schemas import StoryRequest, Chunk
+from app.routers.story_api import sse_events
 
 def test_generate_stream(sample_story_request):
     url = "http://localhost:8000/api/story/generate_stream"
@@ -21,4 +23,27 @@ def test_generate_chunk(sample_story_request):
     response = requests.post(url, json=story_request.model_dump())
     print(response.text)
 
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+
+def test_sse_events_frame_chunks():
+    chunks = [Chunk(text='John (happy): "Hi"\n'), Chunk(text="café ✨", fx={"bg": "kitchen"}), Chunk(text="", is_final=True)]
+
+    async def frames():
+        async def source():
+            for chunk in chunks:
+                yield chunk
+        return [event async for event in sse_events(source())]
+
+    assert asyncio.run(frames()) == [f"data: {chunk.model_dump_json()}\n\n" for chunk in chunks]
+
+def test_sse_events_end_with_error():
+    async def frames():
+        async def source():
+            yield Chunk(text="John: ")
+            raise RuntimeError("Ollama error: model crashed")
+        return [event async for event in sse_events(source())]
+
+    events = asyncio.run(frames())
+    error = Chunk.model_validate_json(events[-1].removeprefix("data: "))
+    assert len(events) == 2
+    assert error.is_final and error.fx == {"error": "Ollama error: model crashed"}
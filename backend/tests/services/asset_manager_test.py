@@ -0,0 +1,294 @@
+# ------------------------------------------------------------------------
+# Asset Manager Tests
+#
+# Run with: pytest -v -s backend/tests/services/asset_manager_test.py
+# ------------------------------------------------------------------------
+
+import time
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from pydantic import ValidationError
+from app.services.asset_manager import AssetManager
+from app.models.api_schemas import AssetRequest
+from app.models.llm_wrapper import OllamaAdapter
+from app.config import settings
+from benchmarks.stub_ollama import StubOllama
+
+class FakeImageTextEmbedder:
+    """
+    Deterministic stand-in for SigLIP2, optionally failing after n images.
+    """
+    def __init__(self, fail_after: int = None):
+        self.fail_after = fail_after
+        self.n_embedded = 0
+
+    def embed_images(self, images, batch_size: int = 16):
+        if self.fail_after is not None and self.n_embedded + len(images) > self.fail_after:
+            raise RuntimeError("simulated crash")
+        self.n_embedded += len(images)
+        embeddings = np.zeros((len(images), settings.IMAGE_TEXT_DIM), dtype=np.float32)
+        for i, image in enumerate(images):
+            embeddings[i, :3] = np.asarray(image).mean(axis=(0, 1))
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    def embed_text(self, text):
+        embedding = torch.zeros((1, settings.IMAGE_TEXT_DIM))
+        embedding[0, len(text) % settings.IMAGE_TEXT_DIM] = 1.0
+        return embedding
+
+    def embed_texts(self, texts):
+        self.n_text_batches = getattr(self, "n_text_batches", 0) + 1
+        return torch.cat([self.embed_text(text) for text in texts])
+
+@pytest.fixture
+def asset_dir(tmp_path):
+    asset_path = tmp_path / "backend" / "data" / "assets"
+    (asset_path / "bg").mkdir(parents=True)
+    for i in range(10):
+        Image.new("RGB", (8, 8), color=(10 * i + 1, 5, 200)).save(asset_path / "bg" / f"{i}.jpg")
+    return asset_path
+
+def make_asset_manager(tmp_path, asset_path, embedder, cache_path=None):
+    tmp_path.mkdir(exist_ok=True)
+    asset_manager = AssetManager(
+        db_path=tmp_path / "vdb.kuzu", 
+        asset_path=asset_path, 
+        cache_path=cache_path or tmp_path / "cache"
+    )
+    asset_manager.image_text_embedder = embedder
+    asset_manager.vlm_adapter = None
+    return asset_manager
+
+def test_load_assets(tmp_path, asset_dir):
+    asset_manager = make_asset_manager(tmp_path, asset_dir, FakeImageTextEmbedder())
+    asset_manager.load_assets(infer_metadata=False, batch_size=3)
+
+    assert asset_manager._db.count("Image") == 10
+    assert asset_manager._db.get_checkpoint("image_ingest") == {"status": "complete", "n_done": 10}
+
+def test_load_assets_resumes(tmp_path, asset_dir):
+    asset_manager = make_asset_manager(tmp_path, asset_dir, FakeImageTextEmbedder(fail_after=7))
+    with pytest.raises(RuntimeError):
+        asset_manager.load_assets(infer_metadata=False, batch_size=3)
+    assert asset_manager._db.get_checkpoint("image_ingest") == {"status": "running", "n_done": 6}
+
+    # only the remaining 4 images should be embedded on the second run
+    asset_manager.image_text_embedder = FakeImageTextEmbedder()
+    asset_manager.load_assets(infer_metadata=False, batch_size=3)
+
+    paths = asset_manager._db.get_column("Image", "image_path")
+    assert asset_manager.image_text_embedder.n_embedded == 4
+    assert sorted(paths) == sorted(set(paths)) and len(paths) == 10
+    assert asset_manager._db.get_checkpoint("image_ingest")["status"] == "complete"
+
+def test_load_assets_uses_embedding_cache(tmp_path, asset_dir):
+    asset_manager = make_asset_manager(tmp_path, asset_dir, FakeImageTextEmbedder())
+    asset_manager.load_assets(infer_metadata=False, batch_size=4)
+    expected = asset_manager._db.get_column("Image", "image_embedding")
+
+    # rebuild from an empty db, sharing the same cache
+    rebuilt = make_asset_manager(tmp_path / "rebuild", asset_dir, FakeImageTextEmbedder(), cache_path=tmp_path / "cache")
+    rebuilt.load_assets(infer_metadata=False, batch_size=4)
+
+    assert rebuilt.image_text_embedder.n_embedded == 0
+    assert sorted(rebuilt._db.get_column("Image", "image_embedding")) == sorted(expected)
+
+def test_reindex_assets(tmp_path, asset_dir):
+    asset_manager = make_asset_manager(tmp_path, asset_dir, FakeImageTextEmbedder())
+    asset_manager.load_assets(infer_metadata=False, batch_size=4)
+    moved_embedding = dict(zip(
+        asset_manager._db.get_column("Image", "image_path"),
+        asset_manager._db.get_column("Image", "image_embedding")
+    ))[str(asset_dir / "bg" / "1.jpg")]
+
+    (asset_dir / "bg" / "0.jpg").unlink()
+    (asset_dir / "bg" / "1.jpg").rename(asset_dir / "bg" / "1_moved.jpg")
+    Image.new("RGB", (8, 8), color=(250, 250, 250)).save(asset_dir / "bg" / "new.jpg")
+
+    asset_manager.image_text_embedder = FakeImageTextEmbedder()
+    summary = asset_manager.reindex_assets(infer_metadata=False)
+
+    rows = {row['image_path']: row for row in asset_manager._db.get_rows("Image", ["image_path", "image_embedding"])}
+    assert summary == {"added": 1, "removed": 1, "moved": 1, "updated": 0}
+    assert asset_manager.image_text_embedder.n_embedded == 1
+    assert len(rows) == 10
+    assert str(asset_dir / "bg" / "0.jpg") not in rows
+    assert rows[str(asset_dir / "bg" / "1_moved.jpg")]['image_embedding'] == moved_embedding
+
+def test_add_assets(tmp_path, asset_dir):
+    asset_manager = make_asset_manager(tmp_path, asset_dir, FakeImageTextEmbedder())
+    asset_manager.load_assets(infer_metadata=False, batch_size=4)
+
+    (asset_dir / "bg" / "pack2").mkdir()
+    for i in range(3):
+        Image.new("RGB", (8, 8), color=(i, 100, 7)).save(asset_dir / "bg" / "pack2" / f"{i}.jpg")
+    summary = asset_manager.add_assets(asset_dir / "bg" / "pack2", infer_metadata=False)
+
+    assert summary["added"] == 3
+    assert asset_manager._db.count("Image") == 13
+
+def test_load_assets_captions_concurrently(tmp_path, asset_dir):
+    asset_manager = make_asset_manager(tmp_path, asset_dir, FakeImageTextEmbedder())
+    with StubOllama(latency=0.05, tokens=["a ", "kitchen"]) as stub:
+        asset_manager.vlm_adapter = OllamaAdapter(url=stub.url, model="stub")
+        assets = asset_manager.embed_image_assets(
+            asset_manager.parse_image_assets(), 
+            infer_metadata=True, 
+            batch_size=4, 
+            caption_concurrency=3
+        )
+
+    assert stub.n_requests == 10
+    assert 1 < stub.max_in_flight <= 3
+    assert [asset['image_path'] for asset in assets] == [asset['image_path'] for asset in asset_manager.parse_image_assets()]
+    assert all(asset['image_metadata'] == "a kitchen" for asset in assets)
+
+def test_asset_manager_is_lazy(tmp_path, asset_dir):
+    asset_manager = AssetManager(db_path=tmp_path / "vdb.kuzu", asset_path=asset_dir, cache_path=tmp_path / "cache")
+
+    assert not any(component.loaded for component in asset_manager.components())
+    assert not (tmp_path / "vdb.kuzu").exists()
+
+def test_search_cache_invalidated_on_reindex(tmp_path, asset_dir):
+    asset_manager = make_asset_manager(tmp_path, asset_dir, FakeImageTextEmbedder())
+    asset_manager.load_assets(infer_metadata=False)
+    request = AssetRequest(asset_type="image", query="Dark  Kitchen")
+
+    first = asset_manager.search_image_assets(request, k=3)
+    second = asset_manager.search_image_assets(AssetRequest(asset_type="image", query="dark kitchen"), k=3)
+    stats = asset_manager.cache_stats()
+    assert [row['node.image_path'] for row in first] == [row['node.image_path'] for row in second]
+    assert second[0]['query'] == "dark kitchen"
+    assert stats["search_results"]["hits"] == 1
+    assert stats["query_embedding"]["misses"] == 1
+
+    (asset_dir / "bg" / "0.jpg").unlink()
+    asset_manager.reindex_assets(infer_metadata=False)
+    asset_manager.search_image_assets(request, k=3)
+    stats = asset_manager.cache_stats()
+    assert stats["search_results"]["misses"] == 2
+    assert stats["query_embedding"]["hits"] == 1 # embeddings don't depend on the index
+
+def test_search_during_reindex_not_cached(tmp_path, asset_dir):
+    asset_manager = make_asset_manager(tmp_path, asset_dir, FakeImageTextEmbedder())
+    asset_manager.load_assets(infer_metadata=False)
+    request = AssetRequest(asset_type="image", query="kitchen")
+
+    class SearchingEmbedder(FakeImageTextEmbedder):
+        def embed_images(self, images, batch_size: int = 16):
+            # a player searches after the old rows changed, before the new one lands
+            self.during = asset_manager.search_image_assets(request, k=20)
+            return super().embed_images(images, batch_size)
+
+    Image.new("RGB", (8, 8), color=(250, 250, 250)).save(asset_dir / "bg" / "new.jpg")
+    asset_manager.image_text_embedder = SearchingEmbedder()
+    asset_manager.reindex_assets(infer_metadata=False)
+
+    assert len(asset_manager.image_text_embedder.during) == 10
+    assert len(asset_manager.search_image_assets(request, k=20)) == 11
+
+def test_asset_request_bounds_efs():
+    assert AssetRequest(asset_type="image", query="kitchen").efs is None
+    for efs in (0, settings.HNSW_MAX_EFS + 1):
+        with pytest.raises(ValidationError):
+            AssetRequest(asset_type="image", query="kitchen", efs=efs)
+
+def test_search_filters_by_category(tmp_path, asset_dir):
+    (asset_dir / "cg").mkdir()
+    for i in range(10):
+        Image.new("RGB", (8, 8), color=(10 * i + 1, 5, 200)).save(asset_dir / "cg" / f"{i}.jpg")
+    asset_manager = make_asset_manager(tmp_path, asset_dir, FakeImageTextEmbedder())
+    asset_manager.load_assets(infer_metadata=False)
+
+    categories = asset_manager._db.get_column("Image", "image_category")
+    assert sorted(set(categories)) == ["bg", "cg"]
+
+    for category in ["bg", "cg"]:
+        res = asset_manager.search_image_assets(AssetRequest(asset_type="image", query="kitchen", asset_category=category), k=5)
+        assert len(res) == 5
+        assert all(f"/{category}/" in row['node.image_path'] for row in res)
+    res = asset_manager.search_image_assets(AssetRequest(asset_type="image", query="kitchen"), k=20)
+    assert len(res) == 20
+
+def test_search_batch_matches_single(tmp_path, asset_dir):
+    embedder = FakeImageTextEmbedder()
+    asset_manager = make_asset_manager(tmp_path, asset_dir, embedder)
+    asset_manager.load_assets(infer_metadata=False)
+    requests = [
+        AssetRequest(asset_type="image", query=query, asset_category=category)
+        for query, category in [("kitchen", "bg"), ("dark school", None), ("Kitchen", "bg"), ("rooftop at dusk", "bg")]
+    ]
+
+    batch = asset_manager.search_image_assets_batch(requests, k=3)
+    assert embedder.n_text_batches == 1
+    assert asset_manager.cache_stats()["query_embedding"]["misses"] == 3 # "kitchen" is encoded once
+
+    asset_manager._search_cache.clear()
+    for request, res in zip(requests, batch):
+        single = asset_manager.search_image_assets(request, k=3)
+        assert [row['node.image_path'] for row in res] == [row['node.image_path'] for row in single]
+        assert res[0]['query'] == request.query
+
+REWRITE_TOKENS = ['{"image_query": "dark red kitchen", ', '"audio_query": "quiet tension"}']
+
+def test_build_asset_request_caches_rewrites(tmp_path, asset_dir):
+    asset_manager = make_asset_manager(tmp_path, asset_dir, FakeImageTextEmbedder())
+    with StubOllama(latency=0.0, tokens=REWRITE_TOKENS) as stub:
+        asset_manager.vlm_adapter = OllamaAdapter(url=stub.url, model="stub")
+        first = asset_manager.build_asset_request("He walked into the  kitchen.")
+        second = asset_manager.build_asset_request("he walked into the kitchen.")
+
+    assert stub.n_requests == 1
+    assert first["image"].query == second["image"].query == "dark red kitchen"
+    assert first["image"].asset_category == "bg"
+    assert first["audio"].query == "quiet tension"
+    assert asset_manager.cache_stats()["query_rewrites"]["hits"] == 1
+
+def test_retrieve_scene_assets_speculates(tmp_path, asset_dir):
+    asset_manager = make_asset_manager(tmp_path, asset_dir, FakeImageTextEmbedder())
+    asset_manager.load_assets(infer_metadata=False)
+    line = "He walked into the kitchen."
+
+    with StubOllama(latency=0.5, tokens=REWRITE_TOKENS) as stub:
+        asset_manager.vlm_adapter = OllamaAdapter(url=stub.url, model="stub")
+
+        # rewrite misses the deadline, the raw line's results are served
+        start = time.perf_counter()
+        raw = asset_manager.retrieve_scene_assets(line, k=3, deadline=0.05)
+        assert time.perf_counter() - start < 0.4
+        assert not raw["refined"]
+        assert raw["image_query"] == line and raw["audio_query"] is None
+        assert [row['query'] for row in raw["image_assets"]] == [line] * 3
+
+        # the late rewrite is cached, so the next request is refined without waiting
+        asset_manager._rewrite_executor.shutdown(wait=True)
+        refined = asset_manager.retrieve_scene_assets(line, k=3, deadline=0.05)
+        assert refined["refined"]
+        assert refined["audio_query"] == "quiet tension"
+        assert [row['query'] for row in refined["image_assets"]] == ["dark red kitchen"] * 3
+        assert stub.n_requests == 1
+
+def test_retrieve_scene_assets_refines_within_deadline(tmp_path, asset_dir):
+    asset_manager = make_asset_manager(tmp_path, asset_dir, FakeImageTextEmbedder())
+    asset_manager.load_assets(infer_metadata=False)
+
+    with StubOllama(latency=0.05, tokens=REWRITE_TOKENS) as stub:
+        asset_manager.vlm_adapter = OllamaAdapter(url=stub.url, model="stub")
+        res = asset_manager.retrieve_scene_assets("He walked into the kitchen.", k=3, deadline=5.0)
+
+    assert res["refined"]
+    assert res["image_query"] == "dark red kitchen"
+    assert all("/bg/" in row['node.image_path'] for row in res["image_assets"])
+
+def test_retrieve_scene_assets_falls_back_on_rewrite_error(tmp_path, asset_dir):
+    asset_manager = make_asset_manager(tmp_path, asset_dir, FakeImageTextEmbedder())
+    asset_manager.load_assets(infer_metadata=False)
+
+    with StubOllama(latency=0.0, tokens=["not json"]) as stub:
+        asset_manager.vlm_adapter = OllamaAdapter(url=stub.url, model="stub")
+        res = asset_manager.retrieve_scene_assets("He walked into the kitchen.", k=3, deadline=5.0)
+
+    assert not res["refined"]
+    assert len(res["image_assets"]) == 3
@@ -0,0 +1,46 @@
+# ------------------------------------------------------------------------
+# Lazy Component Tests
+#
+# Run with: pytest -v -s backend/tests/services/components_test.py
+# ------------------------------------------------------------------------
+
+import threading
+import pytest
+from app.services.components import LazyComponent, warm_up
+
+def test_lazy_component_loads_once():
+    calls = []
+    component = LazyComponent("model", lambda: calls.append(1) or "loaded")
+    assert not component.loaded
+
+    threads = [threading.Thread(target=component.get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert component.get() == "loaded"
+    assert len(calls) == 1
+    assert component.status()["loaded"] and component.status()["load_seconds"] is not None
+
+def test_warm_up_records_errors():
+    def broken():
+        raise RuntimeError("no weights")
+    ok = LazyComponent("ok", lambda: 1)
+    failed = LazyComponent("broken", broken)
+
+    warm_up([failed, ok])
+
+    assert ok.loaded
+    assert failed.status() == {"loaded": False, "load_seconds": None, "error": "no weights"}
+    with pytest.raises(RuntimeError):
+        failed.get()
+
+def test_warm_up_stops():
+    stop = threading.Event()
+    first = LazyComponent("first", lambda: stop.set() or 1)
+    second = LazyComponent("second", lambda: 2)
+
+    warm_up([first, second], stop)
+
+    assert first.loaded and not second.loaded
@@ -0,0 +1,36 @@
+# ------------------------------------------------------------------------
+# Embedding Cache Tests
+#
+# Run with: pytest -v -s backend/tests/services/embedding_cache_test.py
+# ------------------------------------------------------------------------
+
+import numpy as np
+from app.services.embedding_cache import EmbeddingCache, file_hash
+
+def test_put_get_persists(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache", dim=4, model_id="m", grow_by=2)
+    keys = []
+    for i in range(5): # forces the memmap to grow
+        (tmp_path / f"{i}.jpg").write_bytes(f"image {i}".encode())
+        keys.append(cache.key(file_hash(tmp_path / f"{i}.jpg"), "prompt"))
+        cache.put(keys[-1], np.full(4, i, dtype=np.float32), f"caption {i}")
+    cache.flush()
+
+    reopened = EmbeddingCache(tmp_path / "cache", dim=4, model_id="m")
+    embedding, caption = reopened.get(keys[3])
+    assert len(reopened) == 5
+    assert np.array_equal(embedding, np.full(4, 3, dtype=np.float32))
+    assert caption == "caption 3"
+
+def test_key_depends_on_content_model_and_prompt(tmp_path):
+    (tmp_path / "a.jpg").write_bytes(b"same")
+    (tmp_path / "b.jpg").write_bytes(b"same")
+    (tmp_path / "c.jpg").write_bytes(b"different")
+    cache = EmbeddingCache(tmp_path / "cache", dim=4, model_id="m")
+    other_model = EmbeddingCache(tmp_path / "cache2", dim=4, model_id="m2")
+
+    assert cache.key(file_hash(tmp_path / "a.jpg")) == cache.key(file_hash(tmp_path / "b.jpg"))
+    assert cache.key(file_hash(tmp_path / "a.jpg")) != cache.key(file_hash(tmp_path / "c.jpg"))
+    assert cache.key(file_hash(tmp_path / "a.jpg")) != cache.key(file_hash(tmp_path / "a.jpg"), "prompt")
+    assert cache.key(file_hash(tmp_path / "a.jpg")) != other_model.key(file_hash(tmp_path / "a.jpg"))
+    assert cache.get(cache.key(file_hash(tmp_path / "a.jpg"))) is None
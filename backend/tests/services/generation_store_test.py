@@ -0,0 +1,49 @@
+# ------------------------------------------------------------------------
+# Generation Store Tests
+#
+# Run with: pytest -v -s backend/tests/services/generation_store_test.py
+# ------------------------------------------------------------------------
+
+import time
+from app.services.generation_store import GenerationStore, deterministic
+
+MESSAGES = [{"role": "system", "content": "Tell a story."}, {"role": "user", "content": "Player chose: Wait"}]
+
+def test_generation_store_persists(tmp_path):
+    store = GenerationStore(tmp_path / "generations.sqlite")
+    key = store.key("story", "gemma3", {"temperature": 0}, MESSAGES)
+    assert store.get(key) is None
+    store.put(key, "story", "narrator: Time passes.")
+    store.close()
+
+    # another worker or session of the story
+    store = GenerationStore(tmp_path / "generations.sqlite")
+    assert store.get(key) == "narrator: Time passes."
+    assert store.stats()["hits"] == 1 and store.stats()["entries"] == 1
+
+def test_generation_store_key_is_exact(tmp_path):
+    store = GenerationStore(tmp_path / "generations.sqlite")
+    key = store.key("story", "gemma3", {}, MESSAGES)
+    assert key == store.key("story", "gemma3", {}, [dict(message) for message in MESSAGES])
+    changed = [MESSAGES[0], {"role": "user", "content": "Player chose: Wait "}]
+    assert len({key, store.key("other", "gemma3", {}, MESSAGES), store.key("story", "llama3", {}, MESSAGES), store.key("story", "gemma3", {"seed": 1}, MESSAGES), store.key("story", "gemma3", {}, changed)}) == 5
+
+def test_generation_store_evicts_least_recently_used(tmp_path):
+    store = GenerationStore(tmp_path / "generations.sqlite", max_entries=2)
+    for name in ("a", "b"):
+        store.put(name, "story", f"narrator: {name}")
+        time.sleep(0.01)
+    store.get("a")
+    store.put("c", "story", "narrator: c")
+    assert store.get("b") is None
+    assert store.get("a") == "narrator: a" and store.get("c") == "narrator: c"
+    assert len(store) == 2 and store.stats()["evicted"] == 1
+
+    store.forget("story")
+    assert len(store) == 0
+
+def test_deterministic():
+    assert deterministic({"temperature": 0})
+    assert deterministic({"temperature": 0.8, "seed": 42})
+    assert not deterministic({})
+    assert not deterministic({"temperature": 0.8})
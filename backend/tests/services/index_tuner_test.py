@@ -0,0 +1,62 @@
+# ------------------------------------------------------------------------
+# Index Tuner Tests
+#
+# Run with: pytest -v -s backend/tests/services/index_tuner_test.py
+# ------------------------------------------------------------------------
+
+import numpy as np
+import pytest
+from app.database import KuzuDB, NumpyDB, faiss
+from app.services.index_tuner import sample_queries, exact_neighbours, tune, choose_operating_point, save_to_env
+
+def make_db(db_type, tmp_path, n=300):
+    db = KuzuDB(tmp_path / "test.kuzu") if db_type == "kuzu" else NumpyDB(tmp_path / "numpy")
+    db.create_schema({
+        "table_name": "Image",
+        "image_id": "SERIAL PRIMARY KEY",
+        "image_path": "STRING",
+        "image_embedding": "FLOAT[8]"
+    })
+    embeddings = np.random.default_rng(0).normal(size=(n, 8))
+    db.bulk_insert("Image", [{"image_path": f"{i}.webp", "image_embedding": embedding.tolist()} for i, embedding in enumerate(embeddings)])
+    return db
+
+@pytest.mark.parametrize("db_type", ["kuzu", pytest.param("numpy", marks=pytest.mark.skipif(faiss is None, reason="faiss not installed"))])
+def test_tune(db_type, tmp_path):
+    db = make_db(db_type, tmp_path)
+    embeddings, queries, rows = sample_queries(db, "Image", "image_embedding", 20)
+    paths = db.get_column("Image", "image_path")
+    truth = [{paths[i] for i in neighbours} for neighbours in exact_neighbours(embeddings, queries, 5, exclude=rows)]
+    grid = [{"mu": 8, "ml": 16, "efc": 50}] if db_type == "kuzu" else [{"index_type": "hnsw", "M": 8, "efc": 50}]
+
+    results = tune(db, "Image", "image_embedding", "image_path", queries, truth, 5, grid=grid, efs_grid=[8, 300], exclude=[paths[i] for i in rows])
+
+    assert [result["efs"] for result in results] == [8, 300]
+    assert results[-1]["recall"] >= results[0]["recall"]
+    if db_type == "numpy":
+        # faiss builds the same graph every run; kuzu's build is randomized, a poor one misses at any efs
+        assert results[-1]["recall"] >= 0.95 # efs above the row count is close to exhaustive
+    assert "index_type" not in results[0]["params"]
+    # scratch indexes don't clash across runs
+    tune(db, "Image", "image_embedding", "image_path", queries, truth, 5, grid=grid, efs_grid=[8], exclude=[paths[i] for i in rows])
+
+def test_choose_operating_point():
+    results = [
+        {"params": {"mu": 15}, "efs": 32, "recall": 0.90, "p50_ms": 1.0, "build_seconds": 1.0},
+        {"params": {"mu": 15}, "efs": 128, "recall": 0.97, "p50_ms": 2.0, "build_seconds": 1.0},
+        {"params": {"mu": 60}, "efs": 32, "recall": 0.96, "p50_ms": 1.5, "build_seconds": 4.0},
+    ]
+    assert choose_operating_point(results, 0.95) == results[2]
+    assert choose_operating_point(results, 0.99) == results[1]
+
+def test_save_to_env(tmp_path):
+    env_path = tmp_path / ".env"
+    env_path.write_text("OLLAMA_URL=http://gpu:11434\nHNSW_EFS=550\n")
+
+    save_to_env({"HNSW_EFS": 128, "VECTOR_INDEX_PARAMS": {"mu": 30, "ml": 60, "efc": 200}}, env_path)
+
+    assert env_path.read_text().splitlines() == [
+        "OLLAMA_URL=http://gpu:11434",
+        "HNSW_EFS=128",
+        'VECTOR_INDEX_PARAMS={"mu": 30, "ml": 60, "efc": 200}'
+    ]
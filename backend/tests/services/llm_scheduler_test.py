@@ -0,0 +1,97 @@
+# ------------------------------------------------------------------------
+# LLM Scheduler Tests
+#
+# Run with: pytest -v -s backend/tests/services/llm_scheduler_test.py
+# ------------------------------------------------------------------------
+
+import time
+import asyncio
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from app.models.llm_wrapper import OllamaAdapter, AsyncOllamaAdapter
+from app.services.llm_scheduler import LLMScheduler, LLMBusyError, ScheduledAdapter, AsyncScheduledAdapter
+from benchmarks.stub_ollama import StubOllama
+
+def test_scheduler_grants_by_priority():
+    async def run():
+        scheduler, order = LLMScheduler(max_in_flight=1, reserved=0, limits={}, max_queued={}), []
+
+        async def request(priority, hold=0.0):
+            async with scheduler.aslot(priority):
+                order.append(priority)
+                await asyncio.sleep(hold)
+
+        first = asyncio.ensure_future(request("caption", hold=0.05))
+        await asyncio.sleep(0.01)
+        queued = [asyncio.ensure_future(request(priority)) for priority in ("caption", "speculative", "rewrite", "interactive")]
+        await asyncio.gather(first, *queued)
+        return scheduler, order
+
+    scheduler, order = asyncio.run(run())
+    assert order == ["caption", "interactive", "rewrite", "speculative", "caption"]
+    stats = scheduler.stats()["classes"]
+    assert stats["caption"]["admitted"] == 2 and stats["interactive"]["wait_ms"]["p50"] >= 30
+    assert all(stats[priority]["in_flight"] == 0 and stats[priority]["queued"] == 0 for priority in stats)
+
+def test_scheduler_limits_and_reserved_slots():
+    scheduler = LLMScheduler(max_in_flight=3, reserved=1, limits={"caption": 1}, max_queued={})
+    peak = {"caption": 0, "rewrite": 0, "total": 0}
+    in_flight = {"caption": 0, "rewrite": 0, "total": 0}
+    lock = threading.Lock()
+
+    def request(priority):
+        with scheduler.slot(priority):
+            with lock:
+                for key in (priority, "total"):
+                    in_flight[key] += 1
+                    peak[key] = max(peak[key], in_flight[key])
+            time.sleep(0.02)
+            with lock:
+                for key in (priority, "total"):
+                    in_flight[key] -= 1
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(request, ["caption"] * 4 + ["rewrite"] * 4))
+    # captions are capped by their own limit, background requests leave the reserved slot free
+    assert peak["caption"] == 1 and peak["total"] == 2
+
+def test_scheduler_rejects_past_max_queued():
+    async def run():
+        scheduler = LLMScheduler(max_in_flight=1, reserved=0, limits={}, max_queued={"rewrite": 1})
+        async with scheduler.aslot("interactive"):
+            queued = asyncio.ensure_future(scheduler.aslot("rewrite").__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(LLMBusyError):
+                async with scheduler.aslot("rewrite"):
+                    pass
+            queued.cancel()
+            await asyncio.sleep(0)
+        return scheduler
+
+    stats = asyncio.run(run()).stats()["classes"]["rewrite"]
+    # the cancelled request gave up its place without ever running
+    assert stats["rejected"] == 1 and stats["admitted"] == 0 and stats["queued"] == 0
+
+def test_interactive_stream_skips_caption_backlog():
+    async def stream(adapter):
+        start, ttft = time.perf_counter(), None
+        async for line in adapter.chat_stream([{"role": "user", "content": "hi"}]):
+            ttft = ttft or time.perf_counter() - start
+        await adapter.aclose()
+        return ttft
+
+    scheduler = LLMScheduler(max_in_flight=2, reserved=1, limits={"caption": 2}, max_queued={})
+    with StubOllama(latency=0.2, parallel=2) as stub:
+        captioner = ScheduledAdapter(OllamaAdapter(url=stub.url, model="stub"), scheduler, "caption")
+        story = AsyncScheduledAdapter(AsyncOllamaAdapter(url=stub.url, model="stub"), scheduler, "interactive")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            captions = [executor.submit(captioner.chat_chunk, [{"role": "user", "content": f"caption {i}"}]) for i in range(6)]
+            time.sleep(0.05)
+            ttft = asyncio.run(stream(story))
+            assert all(caption.result()["done"] for caption in captions)
+        assert stub.max_in_flight == 2
+
+    # straight into the reserved slot, rather than behind 6 captions at 0.2s each
+    assert ttft < 0.5
+    assert scheduler.stats()["classes"]["caption"]["wait_ms"]["p99"] >= 800
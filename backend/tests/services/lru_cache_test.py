@@ -0,0 +1,25 @@
+# ------------------------------------------------------------------------
+# LRU Cache Tests
+#
+# Run with: pytest -v -s backend/tests/services/lru_cache_test.py
+# ------------------------------------------------------------------------
+
+from app.services.lru_cache import LRUCache
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a") # b is now least recently used
+    cache.put("c", 3)
+
+    assert "a" in cache and "c" in cache and "b" not in cache
+    assert len(cache) == 2
+
+def test_lru_stats():
+    cache = LRUCache(maxsize=4)
+    cache.put("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("missing") is None
+
+    assert cache.stats() == {"size": 1, "maxsize": 4, "hits": 1, "misses": 1, "hit_rate": 0.5}
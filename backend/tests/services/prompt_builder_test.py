@@ -0,0 +1,47 @@
+# ------------------------------------------------------------------------
+# Prompt Builder Tests
+#
+# Run with: pytest -v -s backend/tests/services/prompt_builder_test.py
+# ------------------------------------------------------------------------
+
+from app.services.prompt_builder import PromptBuilder, INSTRUCTIONS, estimate_tokens
+
+CHARACTERS = [
+    {"role": "character", "content": "Mary: A baker."},
+    {"role": "character", "content": "John: A retired knight."}
+]
+
+def test_prefix_is_stable():
+    builder = PromptBuilder()
+    first = builder.build(CHARACTERS + [{"role": "scene", "content": "narrator: Dawn."}], ["John: Hi"], "Wave", story_id="story")
+    second = builder.build(CHARACTERS[::-1] + [{"role": "lore", "content": "Bread is scarce."}, {"role": "scene", "content": "narrator: Noon."}], [], "Eat", story_id="story")
+
+    assert first[0] == second[0]
+    assert first[0]["content"] == INSTRUCTIONS + "\n\nCharacters (only they and the narrator speak):\nJohn: A retired knight.\nMary: A baker."
+    assert second[1]["content"] == "Lore:\nBread is scarce.\n\nRecent scenes:\nnarrator: Noon.\n\nPlayer chose: Eat"
+    assert builder.stats()["prefix_hits"] == 1
+
+def test_context_trimmed_to_budget():
+    builder = PromptBuilder(token_budget=estimate_tokens(INSTRUCTIONS) + 50)
+    scenes = [{"role": "scene", "content": f"narrator: Scene {i} " + "x" * 40} for i in range(3)]
+    messages = builder.build(scenes + [{"role": "memory", "content": "narrator: Long ago " + "y" * 40}], [], "Run")
+
+    # the latest scene is kept first, then older ones while they fit
+    user = messages[1]["content"]
+    assert user.startswith("Recent scenes:\nnarrator: Scene 1") and "narrator: Scene 2" in user
+    assert "Scene 0" not in user and "Long ago" not in user
+    assert estimate_tokens(messages[0]["content"]) + estimate_tokens(user) <= builder.token_budget
+    assert builder.stats()["trimmed"] == 1
+
+def test_history_trimmed_in_pages():
+    builder = PromptBuilder(token_budget=estimate_tokens(INSTRUCTIONS) + 90)
+    history = [f"John: line {i}" for i in range(40)]
+    users = [builder.build([], history[:n], "Run")[1]["content"] for n in range(24, 41, 2)]
+
+    # the cut only moves once a whole page no longer fits
+    assert users[0].startswith("History:\n(16 earlier lines omitted)\nJohn: line 16\n")
+    assert users[-1].startswith("History:\n(32 earlier lines omitted)\nJohn: line 32\n")
+    cuts = [user.split("\n")[1] for user in users]
+    assert len(set(cuts)) == 2 and cuts == sorted(cuts, key=lambda cut: int(cut[1:3]))
+    assert all(user.endswith("\n\nPlayer chose: Run") for user in users)
+    assert all(estimate_tokens(INSTRUCTIONS) + estimate_tokens(user) <= builder.token_budget for user in users)
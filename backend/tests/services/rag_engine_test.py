@@ -4,8 +4,15 @@
 # Run with: pytest -v -s backend/tests/services/rag_engine_test.py
 # ------------------------------------------------------------------------
 
+import time
+import numpy as np
+import asyncio
 from app.services.rag_engine import GraphRAG
-from app.models.api_schemas import StoryRequest
+from app.services.story_graph import StoryGraph
+from app.services.generation_store import GenerationStore
+from app.models.api_schemas import StoryRequest, Chunk
+from app.models.llm_wrapper import AsyncOllamaAdapter
+from benchmarks.stub_ollama import StubOllama
 
 def test_retrieve(sample_scene_id, sample_context, sample_characters):
     rag_engine = GraphRAG()
@@ -32,3 +39,211 @@ def test_generate_chunk(sample_context, sample_user_choice):
         user_choice=sample_user_choice
     )
     # assert response == "Context: ['this is my context1', 'this is my context2'], User Choice: user_choice"
+
+def test_generate_stream_yields_chunks(sample_context, sample_characters, sample_user_choice):
+    async def collect(url):
+        rag_engine = GraphRAG(llm_adapter=AsyncOllamaAdapter(url=url, model="stub"), story_graph=StoryGraph(":memory:"))
+        chunks = [chunk async for chunk in rag_engine.generate_stream(
+            scene_id="ID0001", context=sample_context, active_chars=sample_characters,
+            history=sample_context, user_choice=sample_user_choice, options={}
+        )]
+        await rag_engine.llm_adapter.aclose()
+        return rag_engine, chunks
+
+    with StubOllama(latency=0.05, tokens=["narrator: ", "The ", "room."], token_latency=0.01) as stub:
+        rag_engine, chunks = asyncio.run(collect(stub.url))
+
+    assert all(isinstance(chunk, Chunk) for chunk in chunks)
+    assert [chunk.text for chunk in chunks] == ["narrator: ", "The ", "room.", ""]
+    assert [chunk.is_final for chunk in chunks] == [False, False, False, True]
+
+    # the generated scene is stored as a child of the requested one
+    new_scene_id = chunks[-1].fx["scene_id"]
+    retrieved = rag_engine.retrieve(new_scene_id, sample_context, "Next", sample_characters)
+    assert retrieved == [
+        {"role": "character", "content": "char1"},
+        {"role": "character", "content": "char2"},
+        {"role": "scene", "content": f"(Player chose: {sample_user_choice})\nnarrator: The room."}
+    ]
+
+    summary = rag_engine.stream_metrics.summary()
+    assert summary["requests"] == 1 and summary["tokens"] == 3
+    assert summary["ttft_ms"]["p50"] >= 50
+    assert summary["tokens_per_second"]["p50"] > 0
+
+def test_prompt_lists_allowed_speakers():
+    rag_engine = GraphRAG(llm_adapter=None, story_graph=StoryGraph(":memory:"))
+    rag_engine.story_graph.add_character("Bob", "A fisherman.")
+    messages = rag_engine._messages("ID0001", [], ["Alice", "Bob"], [], "Wave", None)
+
+    # the stream validator only accepts these speakers, so the model must know them
+    assert messages[0]["content"].endswith("speak):\nAlice\nBob: A fisherman.")
+
+def test_generate_stream_regenerates_invalid_output(sample_context, sample_characters, sample_user_choice):
+    async def collect(url):
+        rag_engine = GraphRAG(llm_adapter=AsyncOllamaAdapter(url=url, model="stub"), story_graph=StoryGraph(":memory:"))
+        chunks = [chunk async for chunk in rag_engine.generate_stream(
+            scene_id="ID0001", context=sample_context, active_chars=sample_characters,
+            history=sample_context, user_choice=sample_user_choice, options={}
+        )]
+        await rag_engine.llm_adapter.aclose()
+        return rag_engine, chunks
+
+    responses = [
+        ["Villain", ": ", "Mwa"] + ["ha"] * 200, # unknown character, caught at its prefix
+        ["char1 ", "(happy)", ": ", "Hi!", "\n", "- a", "\n", "- b", "\n", "- c", "\n", "- d", "\n", "- e", "\n"], # too many choices
+        ["char2: ", "Welcome ", "back."]
+    ]
+    with StubOllama(latency=0.0, responses=responses, token_latency=0.005) as stub:
+        start = time.perf_counter()
+        rag_engine, chunks = asyncio.run(collect(stub.url))
+        elapsed = time.perf_counter() - start
+
+    assert stub.n_requests == 3
+    assert elapsed < 0.5 # the first response (1s of tokens) was aborted
+    assert "Villain" not in "".join(chunk.text for chunk in chunks)
+    # the second attempt's first lines were released before the fifth choice arrived
+    regenerate = [i for i, chunk in enumerate(chunks) if chunk.fx and "event" in chunk.fx]
+    assert len(regenerate) == 1 and chunks[regenerate[0]].fx["event"] == "regenerate"
+    assert "".join(chunk.text for chunk in chunks[regenerate[0] + 1:]) == "char2: Welcome back."
+    assert rag_engine.story_graph.ancestors(chunks[-1].fx["scene_id"])[-1].text == "char2: Welcome back."
+    assert rag_engine.stream_metrics.summary()["retries"] == 2
+
+def test_retrieve_long_term_memory(sample_characters):
+    class FakeTextEmbedder:
+        def embed_texts(self, texts):
+            embeddings = np.full((len(texts), 8), 1e-3, dtype=np.float32)
+            for i, text in enumerate(texts):
+                embeddings[i, 0 if "dragon" in text else 1 + len(text) % 7] += 1.0
+            return embeddings
+
+    async def play(url, turns):
+        rag_engine = GraphRAG(llm_adapter=AsyncOllamaAdapter(url=url, model="stub"), story_graph=StoryGraph(":memory:", max_depth=3, embedding_dim=8), text_embedder=FakeTextEmbedder())
+        scene_ids, scene_id = [], "ID0001"
+        for i in range(turns):
+            response = await rag_engine.generate_chunk(scene_id=scene_id, context=[], active_chars=sample_characters, history=[], user_choice=f"choice {i}", options={}, story_id="story")
+            scene_id = response["scene_id"]
+            scene_ids.append(scene_id)
+        await rag_engine.llm_adapter.aclose()
+        return rag_engine, scene_ids
+
+    responses = [["narrator: A dragon wakes."]] + [[f"narrator: Turn {i}."] for i in range(1, 12)]
+    with StubOllama(latency=0.0, responses=responses) as stub:
+        rag_engine, scene_ids = asyncio.run(play(stub.url, 12))
+    rag_engine.story_memory.flush()
+    rag_engine.mark_important(scene_ids[1])
+
+    retrieved = rag_engine.retrieve(scene_ids[-1], [], "Fight the dragon", sample_characters)
+    roles = [item["role"] for item in retrieved]
+    assert roles == ["character"] * 2 + ["important"] + ["memory"] * 4 + ["scene"] * 3
+    assert retrieved[2]["content"] == "(Player chose: choice 1)\nnarrator: Turn 1."
+    assert retrieved[3]["content"] == "narrator: A dragon wakes."
+    assert rag_engine.story_graph.story_of(scene_ids[-1]) == "story"
+
+def test_memory_search_does_not_block_event_loop(sample_characters):
+    class SlowTextEmbedder:
+        delay = 0.0
+
+        def embed_texts(self, texts):
+            time.sleep(self.delay)
+            return np.ones((len(texts), 8), dtype=np.float32)
+
+    async def play(url):
+        text_embedder = SlowTextEmbedder()
+        rag_engine = GraphRAG(llm_adapter=AsyncOllamaAdapter(url=url, model="stub"), story_graph=StoryGraph(":memory:", embedding_dim=8), text_embedder=text_embedder)
+        response = await rag_engine.generate_chunk(scene_id="ID0001", context=[], active_chars=sample_characters, history=[], user_choice="choice 0", options={}, story_id="story")
+        text_embedder.delay = 0.5
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await rag_engine.generate_chunk(scene_id=response["scene_id"], context=[], active_chars=sample_characters, history=[], user_choice="choice 1", options={})
+        ticker.cancel()
+        await rag_engine.llm_adapter.aclose()
+        return ticks
+
+    with StubOllama(latency=0.0) as stub:
+        ticks = asyncio.run(play(stub.url))
+    # other requests kept being served while the query was embedded
+    assert ticks >= 20
+
+def test_successive_turns_reuse_prompt_prefix(sample_characters):
+    async def play(url, turns):
+        rag_engine = GraphRAG(llm_adapter=AsyncOllamaAdapter(url=url, model="stub"), story_graph=StoryGraph(":memory:"))
+        for name in ("char1", "char2"):
+            rag_engine.story_graph.add_character(name, f"{name} is a character. " * 40)
+        scene_id = "ID0001"
+        for i in range(turns):
+            async for chunk in rag_engine.generate_stream(scene_id=scene_id, context=[], active_chars=sample_characters, history=[f"turn {j}" for j in range(i)], user_choice=f"choice {i}", options={}):
+                scene_id = chunk.fx["scene_id"] if chunk.is_final else scene_id
+        await rag_engine.llm_adapter.aclose()
+        return rag_engine
+
+    with StubOllama(latency=0.0, tokens=["narrator: ", "Onwards."], prompt_token_latency=0.0001) as stub:
+        rag_engine = asyncio.run(play(stub.url, 4))
+        # only the first turn prefills the instructions and character sheets
+        assert stub.n_cached_tokens > 3 * stub.n_prompt_tokens / 4 / 2
+
+    summary = rag_engine.stream_metrics.summary()
+    assert summary["prompt_tokens"]["p50"] < summary["prompt_tokens"]["p99"] / 3
+    assert summary["prefill_ms"]["p99"] > 0
+    assert rag_engine.prompt_builder.stats()["prefix_hits"] == 3
+
+def test_generate_stream_serves_speculated_choice(sample_characters):
+    async def play(url):
+        rag_engine = GraphRAG(llm_adapter=AsyncOllamaAdapter(url=url, model="stub"), story_graph=StoryGraph(":memory:"), speculate=True)
+        chunks = [chunk async for chunk in rag_engine.generate_stream(scene_id="ID0001", context=[], active_chars=sample_characters, history=[], user_choice="Start", options={})]
+        while rag_engine.speculator.stats()["pending"]:
+            await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        served = [chunk async for chunk in rag_engine.generate_stream(scene_id=chunks[-1].fx["scene_id"], context=[], active_chars=sample_characters, history=[], user_choice="Go right", options={})]
+        elapsed = time.perf_counter() - start
+        await rag_engine.llm_adapter.aclose()
+        return rag_engine, served, elapsed
+
+    responses = [
+        ["narrator: ", "Which way?", "\n", "- Go left", "\n", "- Go right"],
+        ["narrator: ", "A wall."],
+        ["char1: ", "Over ", "here!"]
+    ]
+    with StubOllama(latency=0.1, responses=responses) as stub:
+        rag_engine, served, elapsed = asyncio.run(play(stub.url))
+        assert stub.n_requests == 3
+
+    assert elapsed < 0.1
+    assert "".join(chunk.text for chunk in served) == "char1: Over here!"
+    ancestors = rag_engine.story_graph.ancestors(served[-1].fx["scene_id"])
+    assert [(entry.choice, entry.text) for entry in ancestors[-2:]] == [("Start", "narrator: Which way?\n- Go left\n- Go right"), ("Go right", "char1: Over here!")]
+    assert rag_engine.speculator.stats()["hits"] == 1
+
+def test_replay_served_from_generation_store(tmp_path, sample_characters):
+    async def play(url, store, **kwargs):
+        rag_engine = GraphRAG(llm_adapter=AsyncOllamaAdapter(url=url, model="stub"), story_graph=StoryGraph(":memory:"), generation_store=store)
+        texts = []
+        for _ in range(2):
+            # a session rolls back to the story's first scene and replays the same choice
+            chunks = [chunk async for chunk in rag_engine.generate_stream(scene_id="ID0001", context=[], active_chars=sample_characters, history=["Player: Hello"], user_choice="Wait", story_id="story", **kwargs)]
+            texts.append("".join(chunk.text for chunk in chunks))
+        response = await rag_engine.generate_chunk(scene_id="ID0001", context=[], active_chars=sample_characters, history=["Player: Hello"], user_choice="Wait", story_id="story", **kwargs)
+        await rag_engine.llm_adapter.aclose()
+        return texts + [response["message"]["content"]]
+
+    store = GenerationStore(tmp_path / "generations.sqlite")
+    responses = [["narrator: ", "The ", "tide ", "turns."], ["narrator: ", "Gulls ", "cry."]] * 4
+    with StubOllama(latency=0.0, responses=responses) as stub:
+        sampled = asyncio.run(play(stub.url, store, options={"temperature": 0.8}))
+        assert stub.n_requests == 3
+        replayed = asyncio.run(play(stub.url, store, options={"temperature": 0.8}, replay=True))
+        assert stub.n_requests == 3
+        # a new session of the story, with greedy sampling
+        greedy = asyncio.run(play(stub.url, GenerationStore(tmp_path / "generations.sqlite"), options={"temperature": 0}))
+        assert stub.n_requests == 4
+
+    assert sampled == ["narrator: The tide turns.", "narrator: Gulls cry.", "narrator: The tide turns."]
+    assert replayed == ["narrator: The tide turns."] * 3 # the chunk request stored it last
+    assert greedy == ["narrator: Gulls cry."] * 3
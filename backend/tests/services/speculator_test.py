@@ -0,0 +1,121 @@
+# ------------------------------------------------------------------------
+# Speculator Tests
+#
+# Run with: pytest -v -s backend/tests/services/speculator_test.py
+# ------------------------------------------------------------------------
+
+import pytest
+import asyncio
+from app.services.speculator import Speculator, SpeculationError
+
+def fake_generate(started: list, n_tokens: int = 5, token_latency: float = 0.01):
+    async def generate(choice):
+        started.append(choice)
+        for i in range(n_tokens):
+            await asyncio.sleep(token_latency)
+            yield f"{choice} {i}. "
+    return generate
+
+async def collect(speculated):
+    return None if speculated is None else "".join([text async for text in speculated])
+
+async def settle(speculator: Speculator):
+    while speculator.stats()["pending"]:
+        await asyncio.sleep(0.01)
+
+def test_speculator_hit_and_cancel_siblings():
+    async def run():
+        speculator, started = Speculator(concurrency=2, max_choices=3), []
+        speculator.offer("scene", ["Go left", "Go right", "Wait", "Run"], fake_generate(started))
+        await settle(speculator)
+        text = await collect(await speculator.take("scene", "  go   LEFT "))
+        missed = await collect(await speculator.take("other", "Go left"))
+        return speculator, started, text, missed
+
+    speculator, started, text, missed = asyncio.run(run())
+    assert started == ["Go left", "Go right", "Wait"]
+    assert text == "Go left 0. Go left 1. Go left 2. Go left 3. Go left 4. "
+    assert missed is None
+    stats = speculator.stats()
+    assert stats["offered"] == 3 and stats["lookups"] == 1 and stats["hits"] == 1 and stats["hit_rate"] == 1.0
+    assert stats["tokens"] == 15 and stats["wasted_tokens"] == 10
+
+def test_speculator_joins_running_and_cancels_queued():
+    async def run():
+        speculator, started = Speculator(concurrency=1), []
+        speculator.offer("scene", ["a", "b"], fake_generate(started, n_tokens=10))
+        await asyncio.sleep(0.03)
+        text = await collect(await speculator.take("scene", "a")) # running, streamed as it generates
+        speculator.offer("scene2", ["c", "d"], fake_generate(started, n_tokens=10))
+        await asyncio.sleep(0.03)
+        queued = await collect(await speculator.take("scene2", "d")) # queued behind c, generated interactively
+        await asyncio.sleep(0)
+        return speculator, started, text, queued
+
+    speculator, started, text, queued = asyncio.run(run())
+    assert text.startswith("a 0. ") and text.endswith("a 9. ")
+    assert queued is None
+    assert started == ["a", "c"]
+    stats = speculator.stats()
+    assert stats["joined"] == 1 and stats["hits"] == 0 and stats["lookups"] == 2 and stats["hit_rate"] == 0.5
+    assert stats["cancelled"] == 3 and stats["pending"] == 0
+
+def test_speculator_yields_to_interactive_generation():
+    async def run():
+        speculator, started = Speculator(concurrency=1), []
+        speculator.offer("scene", ["a"], fake_generate(started, n_tokens=5))
+        await asyncio.sleep(0.025)
+        async with speculator.interactive():
+            await asyncio.sleep(0.05)
+            paused = list(started)
+        await settle(speculator)
+        return speculator, started, paused, await collect(await speculator.take("scene", "a"))
+
+    speculator, started, paused, text = asyncio.run(run())
+    # preempted mid-generation, and only restarted once the player was served
+    assert paused == ["a"] and started == ["a", "a"]
+    assert text == "a 0. a 1. a 2. a 3. a 4. "
+    stats = speculator.stats()
+    assert stats["preempted"] == 1 and stats["hits"] == 1
+    assert stats["tokens"] > 5 and stats["wasted_tokens"] == stats["tokens"] - 5
+
+def test_speculator_discards_failed_generation():
+    async def fail(choice):
+        yield "narrator: "
+        raise ValueError("invalid")
+
+    async def run():
+        speculator = Speculator()
+        speculator.offer("scene", ["a"], fail)
+        await settle(speculator)
+        return speculator, await collect(await speculator.take("scene", "a"))
+
+    speculator, text = asyncio.run(run())
+    assert text is None
+    assert speculator.stats()["failed"] == 1 and speculator.stats()["hit_rate"] == 0.0
+
+def test_speculator_streams_claimed_generation():
+    async def fail(choice):
+        yield "narrator: "
+        await asyncio.sleep(0.05)
+        raise ValueError("invalid")
+
+    async def run():
+        speculator, started = Speculator(concurrency=1), []
+        speculator.offer("scene", ["a"], fake_generate(started, n_tokens=5))
+        await asyncio.sleep(0.025)
+        speculated = await speculator.take("scene", "a")
+        first = await anext(speculated)
+        # another player's request doesn't preempt a continuation someone waits on
+        async with speculator.interactive():
+            rest = await collect(speculated)
+        speculator.offer("scene2", ["b"], fail)
+        await asyncio.sleep(0.01)
+        with pytest.raises(SpeculationError):
+            await collect(await speculator.take("scene2", "b"))
+        return speculator, first + rest
+
+    speculator, text = asyncio.run(run())
+    assert text == "a 0. a 1. a 2. a 3. a 4. "
+    stats = speculator.stats()
+    assert stats["preempted"] == 0 and stats["joined"] == 2 and stats["failed"] == 1
@@ -0,0 +1,85 @@
+# ------------------------------------------------------------------------
+# Story Graph Tests
+#
+# Run with: pytest -v -s backend/tests/services/story_graph_test.py
+# ------------------------------------------------------------------------
+
+from app.services.story_graph import StoryGraph
+
+def play(graph: StoryGraph, scene_id: str, turns: int, branch: str = ""):
+    for i in range(turns):
+        scene_id = graph.enter_scene(scene_id, f"choice {branch}{i}", f"narrator: Scene {branch}{i}.", ["John"])
+    return scene_id
+
+def test_ancestors_bounded_and_memoized(tmp_path):
+    graph = StoryGraph(tmp_path / "story.kuzu", max_depth=4)
+    scene_id = play(graph, "ID0001", 10)
+
+    context = graph.ancestors(scene_id)
+    assert [entry.text for entry in context] == [f"narrator: Scene {i}." for i in range(6, 10)]
+    assert context[0].choice == "choice 6"
+    assert graph.cache_stats()["misses"] == 0 # every turn extended its parent's cached context
+
+    # a cold walk through the graph (e.g. after a restart) gives the same context
+    graph._context_cache.clear()
+    assert graph.ancestors(scene_id) == context
+    assert StoryGraph(tmp_path / "story.kuzu", max_depth=4).ancestors(scene_id) == context
+
+def test_branches():
+    graph = StoryGraph(":memory:", max_depth=8)
+    fork = play(graph, "ID0001", 2)
+    left, right = play(graph, fork, 2, "left "), play(graph, fork, 2, "right ")
+    assert [entry.text for entry in graph.ancestors(left)][-2:] == ["narrator: Scene left 0.", "narrator: Scene left 1."]
+    assert "narrator: Scene left 0." not in [entry.text for entry in graph.ancestors(right)]
+
+    # the same continuation of the same scene is the same node
+    assert graph.enter_scene(fork, "choice left 0", "narrator: Scene left 0.") == graph.ancestors(left)[-2].scene_id
+
+    # the same text after another scene is a new one, with that branch's context
+    repeat = graph.enter_scene(right, "choice left 1", "narrator: Scene left 1.")
+    graph._context_cache.clear()
+    assert repeat != left
+    assert [entry.text for entry in graph.ancestors(repeat)][-2:] == ["narrator: Scene right 1.", "narrator: Scene left 1."]
+    assert graph.ancestors(left)[-2].text == "narrator: Scene left 0."
+
+def test_lore_and_characters():
+    graph = StoryGraph(":memory:")
+    scene_id = play(graph, "ID0001", 1)
+    graph.add_character("John", "A retired knight.")
+    graph.add_lore("sword", "John's sword was forged by his father.", characters=["John"])
+    graph.add_lore("cave", "The cave floods at high tide.", scenes=[scene_id])
+    graph.add_lore("city", "The city has no walls.", characters=["Mary"])
+
+    assert graph.characters(["John", "Mary", "Nobody"]) == {"John": "A retired knight.", "Mary": ""}
+    assert graph.lore(["John"]) == ["John's sword was forged by his father."]
+    assert graph.ancestors(scene_id)[-1].lore == ("The cave floods at high tide.",)
+
+def test_important_scenes():
+    graph = StoryGraph(":memory:", max_depth=2)
+    first = graph.enter_scene("ID0001", "Open the door", "narrator: The door creaks.")
+    scene_id = play(graph, first, 5)
+    other = play(graph, "ID0002", 2)
+    graph.mark_important(first)
+    graph.mark_important(other)
+
+    assert graph.story_of(scene_id) == "ID0001"
+    assert [(entry.scene_id, entry.choice, entry.text) for entry in graph.important("ID0001")] == [(first, "Open the door", "narrator: The door creaks.")]
+    graph.mark_important(first, False)
+    assert graph.important("ID0001") == []
+
+def test_memories_stored_per_story():
+    graph = StoryGraph(":memory:", embedding_dim=4)
+    scene_id = play(graph, "ID0001", 2)
+    other = play(graph, "ID0002", 1, "other ")
+    story = [entry.scene_id for entry in graph.ancestors(scene_id)[1:]]
+    rows = [
+        {"id": story[0], "story_id": "ID0001", "text": "a", "embedding": [1.0, 0.0, 0.0, 0.0]},
+        {"id": other, "story_id": "ID0002", "text": "c", "embedding": [0.0, 1.0, 0.0, 0.0]}
+    ]
+    assert graph.add_memories(rows) == rows
+    # inserting twice is a no-op
+    assert graph.add_memories([{"id": story[0], "story_id": "ID0001", "text": "a", "embedding": [1.0, 0.0, 0.0, 0.0]}]) == []
+    graph.add_memories([{"id": story[1], "story_id": "ID0001", "text": "b", "embedding": [0.0, 0.0, 1.0, 0.0]}])
+
+    assert sorted(row[1] for row in graph.memories("ID0001")) == ["a", "b"]
+    assert graph.memories("ID0002") == [[other, "c", [0.0, 1.0, 0.0, 0.0]]]
@@ -0,0 +1,92 @@
+# ------------------------------------------------------------------------
+# Story Memory Tests
+#
+# Run with: pytest -v -s backend/tests/services/story_memory_test.py
+# ------------------------------------------------------------------------
+
+import zlib
+import numpy as np
+from app.services.story_graph import StoryGraph
+from app.services.story_memory import StoryMemory, StoryIndex
+
+DIM = 64
+
+class FakeTextEmbedder:
+    """
+    Deterministic bag-of-words embeddings, so texts sharing words are close.
+    """
+    def __init__(self):
+        self.n_batches = 0
+
+    def embed_texts(self, texts: list):
+        self.n_batches += 1
+        embeddings = np.full((len(texts), DIM), 1e-3, dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().replace(".", " ").split():
+                embeddings[i, zlib.crc32(word.encode()) % DIM] += 1.0
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+def test_scenes_embedded_in_batches():
+    graph = StoryGraph(":memory:", embedding_dim=DIM)
+    embedder = FakeTextEmbedder()
+    memory = StoryMemory(graph, embedder.embed_texts, batch_size=8, interval=0.2)
+    scene_id = "ID0001"
+    for i in range(20):
+        scene_id = graph.enter_scene(scene_id, f"choice {i}", f"narrator: Scene {i}.")
+        memory.add(scene_id, "ID0001", f"narrator: Scene {i}.")
+    memory.add(scene_id, "ID0001", " ") # nothing to embed
+    memory.flush()
+
+    stats = memory.stats()
+    assert (stats["embedded"], stats["batches"], stats["failed"], stats["queued"]) == (20, 3, 0, 0)
+    assert embedder.n_batches == 3
+    assert graph.db.count("Memory") == 20
+
+def test_search_relevant_scenes():
+    graph = StoryGraph(":memory:", embedding_dim=DIM)
+    memory = StoryMemory(graph, FakeTextEmbedder().embed_texts, interval=0.0)
+    texts = ["narrator: The dragon sleeps in the mountain.", "narrator: Mary buys bread.", "narrator: John sharpens his sword."]
+    scene_ids = []
+    scene_id = "ID0001"
+    for text in texts:
+        scene_id = graph.enter_scene(scene_id, "onwards", text)
+        scene_ids.append(scene_id)
+        memory.add(scene_id, "ID0001", text)
+    other = graph.enter_scene("ID0002", "onwards", "narrator: Another dragon sleeps in the mountain.")
+    memory.add(other, "ID0002", "narrator: Another dragon sleeps in the mountain.")
+    memory.flush()
+
+    results = memory.search("ID0001", "Wake the dragon in the mountain", k=1)
+    assert [entry.scene_id for entry in results] == [scene_ids[0]]
+    # scenes already in context are skipped
+    results = memory.search("ID0001", "Wake the dragon in the mountain", k=1, exclude={scene_ids[0]})
+    assert results[0].scene_id in scene_ids[1:]
+
+    # scenes added after the story's index was loaded are appended to it
+    scene_id = graph.enter_scene(scene_id, "onwards", "narrator: Mary wakes the dragon in the mountain.")
+    memory.add(scene_id, "ID0001", "narrator: Mary wakes the dragon in the mountain.")
+    memory.flush()
+    assert memory.search("ID0001", "Mary wakes the dragon", k=1)[0].scene_id == scene_id
+
+    # a restarted server reloads the story from the graph
+    reloaded = StoryMemory(graph, FakeTextEmbedder().embed_texts)
+    assert reloaded.search("ID0001", "Mary wakes the dragon", k=1)[0].scene_id == scene_id
+
+def test_failed_batches_counted():
+    def fail(texts):
+        raise RuntimeError("no model")
+    memory = StoryMemory(StoryGraph(":memory:", embedding_dim=DIM), fail, interval=0.0)
+    memory.add("s1", "ID0001", "narrator: Hello.")
+    memory.flush()
+    assert memory.stats()["failed"] == 1
+
+def test_story_index_grows_without_rebuilding():
+    index = StoryIndex()
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(100, 8)).astype(np.float32)
+    for i in range(0, 100, 7):
+        index.add([f"s{j}" for j in range(i, min(i + 7, 100))], [""] * len(vectors[i:i + 7]), vectors[i:i + 7])
+    assert len(index) == 100
+    hits = index.search(vectors[42], k=3)
+    assert hits[0][0] == 42 and abs(hits[0][1] - 1.0) < 1e-5
+    assert [score for _, score in hits] == sorted((score for _, score in hits), reverse=True)
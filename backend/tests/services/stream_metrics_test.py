@@ -0,0 +1,33 @@
+# ------------------------------------------------------------------------
+# Stream Metrics Tests
+#
+# Run with: pytest -v -s backend/tests/services/stream_metrics_test.py
+# ------------------------------------------------------------------------
+
+from app.services.stream_metrics import StreamMetrics
+
+def test_stream_metrics_window():
+    metrics = StreamMetrics(window=2)
+    metrics.record(ttft=None, n_tokens=0, decode_seconds=0.0) # client gave up before any token
+    metrics.record(ttft=0.1, n_tokens=10, decode_seconds=0.5)
+    metrics.record(ttft=0.3, n_tokens=30, decode_seconds=0.5)
+
+    summary = metrics.summary()
+    assert summary["requests"] == 3
+    assert summary["window"] == 2
+    assert summary["tokens"] == 40
+    assert summary["ttft_ms"]["p50"] == 200.0
+    assert summary["tokens_per_second"]["p50"] == 40.0
+
+def test_stream_metrics_empty():
+    assert StreamMetrics().summary()["ttft_ms"] == {"p50": None, "p90": None, "p99": None}
+
+def test_stream_metrics_prefill():
+    metrics = StreamMetrics()
+    metrics.record(ttft=0.1, n_tokens=10, decode_seconds=0.5, prefill_seconds=0.08, prompt_tokens=800)
+    metrics.record(ttft=0.1, n_tokens=10, decode_seconds=0.5, prefill_seconds=0.002, prompt_tokens=20)
+    metrics.record(ttft=0.1, n_tokens=10, decode_seconds=0.5) # no prefill stats in the response
+
+    summary = metrics.summary()
+    assert summary["prefill_ms"]["p50"] == 41.0
+    assert summary["prompt_tokens"]["p50"] == 410.0
@@ -0,0 +1,57 @@
+# ------------------------------------------------------------------------
+# Validation Engine Tests
+#
+# Run with: pytest -v -s backend/tests/services/val_engine_test.py
+# ------------------------------------------------------------------------
+
+import pytest
+from app.services.val_engine import ValEngine, DialogicSyntaxError
+
+@pytest.mark.parametrize("response", [
+    "John (happy): Lovely to see you!",
+    "narrator: John looks around, noticing the sky in the distance.",
+    "- I don't know\n- This is why...\n- I give up",
+    "john: Hi.\n\nnarrator: It's 3:00.\n"
+])
+def test_validate_response_accepts(response):
+    assert ValEngine().validate_response(response, ["John"]) is None
+
+@pytest.mark.parametrize("response, reason", [
+    ("Bob: Hi.", "unknown character"),
+    ("**John**: Hi.", "not a speaker"),
+    ("The room is quiet.", "not a speaker"),
+    ("John (): Hi.", "empty emotion"),
+    ("John:", "empty dialogue"),
+    ("narrator (sad): Rain.", "narrator can't have an emotion"),
+    ("- a\n- b\n- c\n- d\n- e", "more than 4 choices"),
+    ("- only one", "fewer than 2 choices")
+])
+def test_validate_response_rejects(response, reason):
+    assert ValEngine().validate_response(response, ["John"]).startswith(reason)
+
+def test_validate_characters():
+    assert ValEngine().validate_characters("Bob: x\nJohn: y\nnarrator: z\nbob: w", ["John"]) == ["Bob"]
+
+def test_validator_holds_back_prefix():
+    validator = ValEngine().validator(["John"])
+    tokens = ["Jo", "hn", " (ha", "ppy)", ": Hello", " there", "\n", "- ", "yes", "\n", "- no"]
+    assert [validator.feed(token) for token in tokens] == ["", "", "", "", "John (happy): Hello", " there", "\n", "- ", "yes", "\n", "- no"]
+    assert validator.finish() == ""
+
+def test_validator_fails_on_prefix():
+    validator = ValEngine().validator(["John"])
+    assert validator.feed("Vil") == ""
+    with pytest.raises(DialogicSyntaxError, match="unknown character"):
+        validator.feed("lain: Mwahaha")
+
+def test_choices_counted_per_set():
+    engine = ValEngine()
+    choices = "- a\n- b\n- c\n"
+    assert engine.validate_response(f"{choices}narrator: Later.\n{choices}", ["John"]) is None
+    assert engine.validate_response("- a\nnarrator: Later.\n- b\n- c", ["John"]).startswith("fewer than 2 choices")
+
+def test_choices():
+    engine = ValEngine()
+    assert engine.choices("narrator: Which way?\n- Go left\n-  Go right \n") == ["Go left", "Go right"]
+    assert engine.choices("- a\n- b\nnarrator: Too late.") == []
+    assert engine.choices("- a\n- b\nnarrator: Again?\n\n- c\n- d") == ["c", "d"]